@@ -0,0 +1,132 @@
+"""Chart benchmark: charts per second from the render pool and the content-addressed cache.
+
+Renders `--charts` distinct fraud trend / risk distribution / order pattern
+charts (varying data, as different periods and stores would) through the real
+ChartRenderer at each worker count, then repeats the same views to measure
+disk-cache and memory-cache hits, and fires identical concurrent requests to
+show they share one render.
+
+    python benchmarks/charts.py --charts 60 --workers 1 2 4 --format png
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def fraud_trends(seed: int, days: int = 30) -> dict:
+    rng = random.Random(seed)
+    today = date.today()
+    return {
+        "period": f"{days}d",
+        "total_fraud_attempts": rng.randint(20, 100),
+        "fraud_types": {
+            name: rng.randint(1, 40) for name in ("payment_fraud", "account_takeover", "friendly_fraud", "identity_theft")
+        },
+        "daily_trends": [
+            {
+                "date": (today - timedelta(days=days - i - 1)).isoformat(),
+                "fraud_attempts": rng.randint(0, 10),
+                "blocked": rng.randint(0, 8),
+                "reviewed": rng.randint(0, 3)
+            }
+            for i in range(days)
+        ],
+        "risk_distribution": {"low_risk": rng.randint(60, 80), "medium_risk": rng.randint(15, 30), "high_risk": rng.randint(5, 15)}
+    }
+
+
+def order_patterns(seed: int) -> dict:
+    rng = random.Random(seed)
+    return {
+        "period": "30d",
+        "patterns": {
+            "time_distribution": {name: rng.randint(5, 40) for name in ("morning", "afternoon", "evening", "night")},
+            "day_distribution": {
+                name: rng.randint(10, 25)
+                for name in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+            },
+            "value_distribution": {name: rng.randint(10, 60) for name in ("low_value", "medium_value", "high_value")}
+        }
+    }
+
+
+def views(count: int) -> list:
+    charts = ("fraud_trends", "risk_distribution", "order_patterns")
+    return [
+        (charts[i % 3], order_patterns(i) if charts[i % 3] == "order_patterns" else fraud_trends(i))
+        for i in range(count)
+    ]
+
+
+async def render_all(renderer, views: list, format: str, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(chart, data):
+        async with semaphore:
+            await renderer.render(chart, data, format)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(chart, data) for chart, data in views))
+    return time.perf_counter() - started
+
+
+async def warm_up(renderer, workers: int, format: str):
+    """Start every worker process (and its matplotlib import) before timing"""
+    await asyncio.gather(*(renderer.render("fraud_trends", fraud_trends(-1 - i), format) for i in range(workers)))
+
+
+async def run(cache_dir: str, workers: int, charts: list, format: str) -> dict:
+    from services.charts import ChartRenderer
+
+    renderer = ChartRenderer(cache_dir, max_workers=workers, memory_items=len(charts) + 16)
+    try:
+        await warm_up(renderer, workers, format)
+        cold = await render_all(renderer, charts, format, concurrency=workers * 2)
+        memory = await render_all(renderer, charts, format, concurrency=workers * 2)
+    finally:
+        renderer.shutdown()
+
+    # A fresh renderer over the same directory: every view is a disk hit
+    disk_renderer = ChartRenderer(cache_dir, max_workers=workers)
+    disk = await render_all(disk_renderer, charts, format, concurrency=workers * 2)
+
+    # Identical concurrent requests share one render
+    coalesce_renderer = ChartRenderer(tempfile.mkdtemp(dir=cache_dir), max_workers=1)
+    try:
+        chart, data = "fraud_trends", fraud_trends(10_000_000 + workers)
+        await asyncio.gather(*(coalesce_renderer.render(chart, data, format) for _ in range(50)))
+        coalesced = coalesce_renderer.renders
+    finally:
+        coalesce_renderer.shutdown()
+    return {"cold": cold, "disk": disk, "memory": memory, "coalesced": coalesced}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--charts", type=int, default=60)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    args = parser.parse_args()
+
+    charts = views(args.charts)
+    print(f"cpus={os.cpu_count()} charts={args.charts} format={args.format}")
+    print(f"{'workers':<9}{'cold/s':>9}{'disk/s':>10}{'memory/s':>12}{'50 same -> renders':>20}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            result = asyncio.run(run(cache_dir, workers, charts, args.format))
+        print(
+            f"{workers:<9}{args.charts / result['cold']:>9.1f}{args.charts / result['disk']:>10.0f}"
+            f"{args.charts / result['memory']:>12.0f}{result['coalesced']:>20}"
+        )
+
+
+if __name__ == "__main__":
+    main()
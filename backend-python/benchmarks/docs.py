@@ -0,0 +1,63 @@
+"""Docs benchmark: cost of serving /docs-dark, /docs-custom and /openapi.json.
+
+Drives the app in-process (no network) with a browser-like Accept-Encoding,
+with no compression, and as revalidations with If-None-Match, reporting
+requests per second and bytes sent per response.
+
+    python benchmarks/docs.py --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+PATHS = ("/docs-dark", "/docs-custom", "/openapi.json")
+CLIENTS = (
+    ("browser", {"Accept-Encoding": "gzip, deflate, br"}),
+    ("identity", {"Accept-Encoding": "identity"}),
+    ("revalidate", {"Accept-Encoding": "gzip, deflate, br"})
+)
+
+
+async def measure(app, requests: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'path':<16}{'client':<12}{'req/s':>9}{'bytes':>9}")
+        for path in PATHS:
+            etag = (await client.get(path)).headers["etag"]
+            for name, headers in CLIENTS:
+                if name == "revalidate":
+                    headers = {**headers, "If-None-Match": etag}
+                size = int((await client.get(path, headers=headers)).headers.get("content-length", 0))
+                started = time.perf_counter()
+                for _ in range(requests):
+                    await client.get(path, headers=headers)
+                rate = requests / (time.perf_counter() - started)
+                print(f"{path:<16}{name:<12}{rate:>9.0f}{size:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ANALYSIS_DB_PATH"] = os.path.join(tmp, "analyses.db")
+        from fastapi.testclient import TestClient
+
+        import main as app_main
+
+        # Entering the TestClient runs the startup handlers, which build the assets
+        with TestClient(app_main.app):
+            asyncio.run(measure(app_main.app, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Event table benchmark: memory per order and the cost of appends and rescoring.
+
+Appends `--orders` synthetic scored orders to an OrderEventTable, then rescores
+a tenth of them. Reports the table's own accounting (memory_bytes, which
+includes the order index and the customer and store dictionaries) next to the
+Python heap growth measured by tracemalloc, so nothing held by the table is
+left out. Finally checks that retracting every rescored order's previous
+values leaves the running revenue total exact.
+
+    python benchmarks/event_table.py --orders 1000000 --customers 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from services.event_table import OrderEventTable  # noqa: E402
+
+
+def order(i: int, customers: int, now: float):
+    features = {
+        "created_at": now - random.uniform(0, 90 * 86400),
+        "store_id": f"store_{i % 50}",
+        "customer_id": f"customer_{random.randrange(customers)}",
+        "order_value": round(random.uniform(5, 2000), 2),
+        "new_customer": random.random() < 0.2,
+        "high_value": random.random() < 0.1
+    }
+    analysis = {
+        "order_id": f"order_{i}",
+        "risk_score": random.random(),
+        "risk_level": random.choice(("low", "medium", "high", "critical")),
+        "recommendation": random.choice(("allow", "review", "block"))
+    }
+    return features, analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    args = parser.parse_args()
+
+    random.seed(7)
+    now = time.time()
+    events = [order(i, args.customers, now) for i in range(args.orders)]
+
+    # Built once under tracemalloc for the heap figure, then again untraced for timings
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    table = OrderEventTable()
+    for features, analysis in events:
+        table.append(features, analysis)
+    table.flush()
+    heap = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    accounted = table.memory_bytes()
+    del table
+
+    table = OrderEventTable()
+    revenue = 0.0
+    started = time.perf_counter()
+    for features, analysis in events:
+        table.append(features, analysis)
+        revenue += features["order_value"]
+    append_seconds = time.perf_counter() - started
+
+    rescored = events[::10]
+    started = time.perf_counter()
+    for features, analysis in rescored:
+        updated = dict(features, order_value=round(features["order_value"] * 1.1, 2))
+        previous_features, _ = table.append(updated, analysis)
+        revenue += updated["order_value"] - previous_features["order_value"]
+    rescore_seconds = time.perf_counter() - started
+    expected = float(table.columns()["order_value"].sum())
+
+    print(f"orders:               {len(table):,}")
+    print(f"memory_bytes:         {accounted / 2 ** 20:,.1f} MiB ({accounted / len(table):.1f} bytes/order)")
+    print(f"tracemalloc growth:   {heap / 2 ** 20:,.1f} MiB ({heap / len(table):.1f} bytes/order)")
+    print(f"append:               {append_seconds / args.orders * 1e6:.2f} us/order")
+    print(f"rescore:              {rescore_seconds / len(rescored) * 1e6:.2f} us/order")
+    print(f"revenue drift:        {abs(revenue - expected):.6f} after {len(rescored):,} rescores")
+
+
+if __name__ == "__main__":
+    main()
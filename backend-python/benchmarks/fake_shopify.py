@@ -0,0 +1,196 @@
+"""Local stand-in for the Shopify Admin REST API, for offline sync tests and benchmarks.
+
+Serves a deterministic catalogue of orders and customers spread over the last
+`--days` days, with `since_id` / `created_at_min` / `created_at_max`
+filtering, count endpoints, per-request latency, and Shopify's leaky-bucket
+call limit (X-Shopify-Shop-Api-Call-Limit header, 429 + Retry-After when full).
+
+    python benchmarks/fake_shopify.py --orders 500000 --port 8081
+
+Point the API at it with SHOPIFY_API_BASE_URL=http://127.0.0.1:8081.
+"""
+import argparse
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Header, Query
+from fastapi.responses import JSONResponse
+
+ID_BASE = 5_000_000_000
+COUNTRIES = ("US", "US", "US", "CA", "GB", "DE", "NG", "BR")
+GATEWAYS = ("shopify_payments", "paypal", "manual")
+
+
+class Catalogue:
+    """`count` records evenly spaced in time, generated on demand from their index"""
+
+    def __init__(self, count: int, days: int, id_offset: int):
+        self.count = count
+        self.end = datetime.now(timezone.utc)
+        self.start = self.end - timedelta(days=days)
+        self.step = (self.end - self.start).total_seconds() / max(count, 1)
+        self.id_offset = id_offset
+
+    def created_at(self, index: int) -> datetime:
+        return self.start + timedelta(seconds=(index + 0.5) * self.step)
+
+    def first_index_at(self, moment: datetime) -> int:
+        """Lowest index created at or after `moment`"""
+        offset = (moment - self.start).total_seconds() / self.step - 0.5
+        return min(self.count, max(0, math.ceil(offset)))
+
+    def page(self, since_id: int, created_at_min, created_at_max, limit: int) -> range:
+        low = self.first_index_at(created_at_min) if created_at_min else 0
+        high = self.first_index_at(created_at_max) if created_at_max else self.count
+        low = max(low, since_id - self.id_offset + 1)
+        return range(low, min(high, low + limit))
+
+    def matching(self, created_at_min, created_at_max) -> int:
+        low = self.first_index_at(created_at_min) if created_at_min else 0
+        high = self.first_index_at(created_at_max) if created_at_max else self.count
+        return max(0, high - low)
+
+
+class LeakyBucket:
+    def __init__(self, size: int, leak_rate: float):
+        self.size = size
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+        self.updated = now
+        if self.level + 1 > self.size:
+            return False
+        self.level += 1
+        return True
+
+    def header(self) -> str:
+        return f"{math.ceil(self.level)}/{self.size}"
+
+
+def create_app(orders: int, customers: int, days: int, bucket_size: int, leak_rate: float, latency_ms: float) -> FastAPI:
+    app = FastAPI(title="Fake Shopify Admin API")
+    order_catalogue = Catalogue(orders, days, ID_BASE)
+    customer_catalogue = Catalogue(customers, days, ID_BASE * 2)
+    buckets = {}
+    stats = {"requests": 0, "throttled": 0}
+
+    def order(index: int) -> dict:
+        customer_index = index % max(customers, 1)
+        country = COUNTRIES[index % len(COUNTRIES)]
+        billing_country = COUNTRIES[(index // 7) % len(COUNTRIES)]
+        return {
+            "id": ID_BASE + index,
+            "name": f"#{1000 + index}",
+            "created_at": order_catalogue.created_at(index).isoformat(),
+            "total_price": f"{(index * 7919) % 250000 / 100:.2f}",
+            "currency": "USD",
+            "financial_status": "paid",
+            "browser_ip": f"10.{index % 256}.{(index // 256) % 256}.{(index // 65536) % 256}",
+            "payment_gateway_names": [GATEWAYS[index % len(GATEWAYS)]],
+            "customer": {
+                "id": ID_BASE * 2 + customer_index,
+                "orders_count": index // max(customers, 1) + 1,
+                "created_at": customer_catalogue.created_at(customer_index).isoformat()
+            },
+            "shipping_address": {"address1": f"{index % 997} Main St", "zip": f"{index % 99999:05d}", "country_code": country},
+            "billing_address": {"address1": f"{index % 991} Main St", "zip": f"{index % 99999:05d}", "country_code": billing_country}
+        }
+
+    def customer(index: int) -> dict:
+        return {
+            "id": ID_BASE * 2 + index,
+            "email": f"customer{index}@example.com",
+            "created_at": customer_catalogue.created_at(index).isoformat(),
+            "orders_count": orders // max(customers, 1),
+            "state": "enabled"
+        }
+
+    async def admit(token: str):
+        """(429 response or None, call-limit header)"""
+        stats["requests"] += 1
+        bucket = buckets.setdefault(token, LeakyBucket(bucket_size, leak_rate))
+        if not bucket.take():
+            stats["throttled"] += 1
+            return JSONResponse(
+                {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+                status_code=429,
+                headers={"Retry-After": "1.0", "X-Shopify-Shop-Api-Call-Limit": bucket.header()}
+            ), None
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return None, bucket.header()
+
+    def listing(resource: str, catalogue: Catalogue, render):
+        async def handler(
+            limit: int = Query(50, le=250),
+            since_id: int = 0,
+            created_at_min: datetime = None,
+            created_at_max: datetime = None,
+            status: str = "open",
+            x_shopify_access_token: str = Header("")
+        ):
+            throttled, call_limit = await admit(x_shopify_access_token)
+            if throttled:
+                return throttled
+            records = [render(i) for i in catalogue.page(since_id, created_at_min, created_at_max, limit)]
+            return JSONResponse({resource: records}, headers={"X-Shopify-Shop-Api-Call-Limit": call_limit})
+
+        async def count(
+            created_at_min: datetime = None,
+            created_at_max: datetime = None,
+            status: str = "open",
+            x_shopify_access_token: str = Header("")
+        ):
+            throttled, call_limit = await admit(x_shopify_access_token)
+            if throttled:
+                return throttled
+            return JSONResponse(
+                {"count": catalogue.matching(created_at_min, created_at_max)},
+                headers={"X-Shopify-Shop-Api-Call-Limit": call_limit}
+            )
+
+        app.add_api_route(f"/admin/api/{{version}}/{resource}.json", handler, methods=["GET"])
+        app.add_api_route(f"/admin/api/{{version}}/{resource}/count.json", count, methods=["GET"])
+
+    listing("orders", order_catalogue, order)
+    listing("customers", customer_catalogue, customer)
+
+    @app.get("/_stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=500_000)
+    parser.add_argument("--customers", type=int, default=None, help="default: orders / 5")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--bucket-size", type=int, default=40)
+    parser.add_argument("--leak-rate", type=float, default=2.0, help="calls per second (Shopify Plus: 20)")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(
+        args.orders,
+        args.customers if args.customers is not None else args.orders // 5,
+        args.days,
+        args.bucket_size,
+        args.leak_rate,
+        args.latency_ms
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Cold-start benchmark: time to import the app at a base git revision vs the working tree.
+
+Each run is a fresh interpreter, mirroring a uvicorn worker (re)spawn. The
+base revision's backend is exported with `git archive` into a temporary
+directory, so the comparison needs no checkout.
+
+    python benchmarks/import_time.py --base HEAD~1 --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+started = time.perf_counter()
+import main
+print(time.perf_counter() - started)
+"""
+
+
+def export_revision(revision: str, target: str) -> str:
+    """Extract the app directory as of `revision` into `target`; returns `target`"""
+    # Run from APP_DIR, git archive exports that subtree with paths relative to it
+    archive = os.path.join(target, "tree.tar")
+    subprocess.run(["git", "archive", "--output", archive, revision], cwd=APP_DIR, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return target
+
+
+def measure(app_dir: str, runs: int) -> list:
+    env = dict(os.environ, ANALYSIS_DB_PATH=":memory:")
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=app_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base", default="HEAD~1", help="git revision to compare against")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = export_revision(args.base, tmp)
+        # Alternated, so neither tree always gets the cold first run
+        results = {args.base: [], "working tree": []}
+        for _ in range(args.runs):
+            results[args.base] += measure(base_dir, 1)
+            results["working tree"] += measure(APP_DIR, 1)
+
+    print(f"{'tree':<16}{'median_ms':>12}{'min_ms':>10}{'max_ms':>10}")
+    for tree, timings in results.items():
+        print(
+            f"{tree:<16}{statistics.median(timings) * 1000:>12.1f}"
+            f"{min(timings) * 1000:>10.1f}{max(timings) * 1000:>10.1f}"
+        )
+    base = statistics.median(results[args.base])
+    current = statistics.median(results["working tree"])
+    print(f"working tree vs {args.base}: {(current - base) * 1000:+.1f} ms per worker import ({current / base - 1:+.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""JSON response benchmark: standard vs fast (orjson) serialization.
+
+Drives the app in-process (no network) over customer insights, 90-day fraud
+trends and /openapi.json, first with FastAPI's default JSONResponse and then
+after use_fast_json(), reporting requests and response bytes per second. The
+OpenAPI schema is served precompressed from memory, so its rows time the
+encoder alone on the schema, as for the endpoint payloads.
+
+    python benchmarks/json_responses.py --requests 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+# The app starts in standard mode; fast mode is switched on in place
+os.environ["JSON_RESPONSE_MODE"] = "standard"
+
+from services.json_response import FastJSONResponse  # noqa: E402
+
+PATHS = ("/analytics/customer-insights?limit=100", "/analytics/fraud-trends?period=90d")
+
+
+async def measure_requests(app, requests: int) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in PATHS:
+            await client.get(path)
+            started, size = time.perf_counter(), 0
+            for _ in range(requests):
+                size += len((await client.get(path)).content)
+            results[path] = (requests, size, time.perf_counter() - started)
+    return results
+
+
+def standard_encode(name: str, payload) -> bytes:
+    # What FastAPI does with an endpoint's return value; its schema route skips jsonable_encoder
+    if name != "/openapi.json":
+        payload = jsonable_encoder(payload)
+    return JSONResponse(payload).body
+
+
+def fast_encode(name: str, payload) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def measure_encoder(encode, payloads: dict, requests: int) -> dict:
+    results = {}
+    for name, payload in payloads.items():
+        started, size = time.perf_counter(), 0
+        for _ in range(requests):
+            size += len(encode(name, payload))
+        results[name] = (requests, size, time.perf_counter() - started)
+    return results
+
+
+def report(mode: str, kind: str, results: dict):
+    for name, (count, size, elapsed) in results.items():
+        print(f"{mode:<10}{kind:<9}{name:<42}{count / elapsed:>9.0f}{size / elapsed / 1e6:>9.1f}{size // count:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ANALYSIS_DB_PATH"] = os.path.join(tmp, "analyses.db")
+        # Measure rendering, not the dashboard response cache
+        os.environ["DASHBOARD_CACHE_TTL"] = "0"
+        from fastapi.testclient import TestClient
+
+        import main as app_main
+        from services.json_response import use_fast_json
+
+        with TestClient(app_main.app) as client:
+            payloads = {path: client.get(path).json() for path in PATHS}
+        payloads["/openapi.json"] = app_main.app.openapi()
+
+        print(f"{'mode':<10}{'timing':<9}{'path':<42}{'req/s':>9}{'MB/s':>9}{'bytes':>9}")
+        report("standard", "request", asyncio.run(measure_requests(app_main.app, args.requests)))
+        report("standard", "encode", measure_encoder(standard_encode, payloads, args.requests))
+        use_fast_json(app_main.app)
+        report("fast", "request", asyncio.run(measure_requests(app_main.app, args.requests)))
+        report("fast", "encode", measure_encoder(fast_encode, payloads, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Metrics benchmark: what the /metrics instrumentation costs per request.
+
+Times MetricsMiddleware around a stub endpoint and the scoring counters on a
+single order and a 100-order batch, then serves the app with uvicorn, once
+with METRICS_ENABLED=true and once false, on /health, /fraud/analyze and
+/fraud/analyze/batch. The end-to-end difference is within run-to-run noise,
+so the cost share is also derived from the timed cost and the measured
+throughput.
+
+    python benchmarks/metrics.py --requests 100000 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+ORDER = {"order_value": 420.0, "new_customer": True, "international_shipping": True}
+REQUESTS = (
+    ("GET", "/health", None),
+    ("POST", "/fraud/analyze", ORDER),
+    ("POST", "/fraud/analyze/batch", [dict(ORDER, order_value=float(i)) for i in range(100)])
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server did not come up at {url}")
+
+
+class _Route:
+    path = "/fraud/analyze"
+
+
+async def stub_app(scope, receive, send):
+    """The smallest routed endpoint, so only the middleware's own work is timed"""
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def middleware_cost(middleware, requests: int) -> float:
+    """Seconds MetricsMiddleware adds to each request"""
+    wrapped = middleware(stub_app)
+    scope = {"type": "http", "method": "POST", "path": "/fraud/analyze"}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    timings = {stub_app: [], wrapped: []}
+    for _ in range(5):
+        for app in timings:
+            started = time.perf_counter()
+            for _ in range(requests):
+                await app(dict(scope), receive, send)
+            timings[app].append((time.perf_counter() - started) / requests)
+    return min(timings[wrapped]) - min(timings[stub_app])
+
+
+def scoring_cost(fraud, orders: list, requests: int) -> float:
+    """Seconds the domain counters add to scoring `orders`"""
+    analyses = fraud.analyze_batch(orders)
+    mode = "batch" if len(orders) > 1 else "single"
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(requests):
+            fraud.record_scored(analyses, mode)
+        best = min(best, (time.perf_counter() - started) / requests)
+    return best
+
+
+def hammer(base_url: str, method: str, path: str, payload, seconds: float, clients: int = 1) -> float:
+    counts = [0] * clients
+    deadline = time.monotonic() + seconds
+
+    def run(i):
+        with httpx.Client(base_url=base_url, timeout=30.0) as client:
+            while time.monotonic() < deadline:
+                client.request(method, path, json=payload)
+                counts[i] += 1
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.monotonic() - started)
+
+
+def served(tmp: str, enabled: bool, seconds: float) -> dict:
+    port = free_port()
+    env = dict(os.environ, ANALYSIS_DB_PATH=os.path.join(tmp, "served.db"),
+               METRICS_ENABLED="true" if enabled else "false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=APP_DIR,
+        env=env
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(base_url + "/health")
+        return {path: hammer(base_url, method, path, payload, seconds) for method, path, payload in REQUESTS}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ANALYSIS_DB_PATH"] = os.path.join(tmp, "analyses.db")
+        from routers import fraud
+        from services.metrics import MetricsMiddleware
+
+        request_cost = asyncio.run(middleware_cost(MetricsMiddleware, args.requests))
+        costs = {
+            path: request_cost + (scoring_cost(fraud, payload if isinstance(payload, list) else [payload], 1000)
+                                  if path.startswith("/fraud") else 0.0)
+            for _, path, payload in REQUESTS
+        }
+
+        # Alternated and best-of, so neither configuration always gets the cold first run
+        runs = {False: [], True: []}
+        for enabled in (False, True, True, False):
+            runs[enabled].append(served(tmp, enabled, args.seconds))
+        plain, instrumented = ({path: max(run[path] for run in runs[enabled]) for path in runs[enabled][0]}
+                               for enabled in (False, True))
+        print(f"cpus={os.cpu_count()} middleware={request_cost * 1e6:.2f}us/request")
+        print(f"{'path':<22}{'cost_us':>9}{'plain_rps':>11}{'metrics_rps':>13}{'measured':>10}{'cost_share':>12}")
+        for path in plain:
+            # Every CPU-microsecond spent recording is one taken from serving
+            share = costs[path] * plain[path] / max(1, os.cpu_count())
+            print(f"{path:<22}{costs[path] * 1e6:>9.2f}{plain[path]:>11.0f}{instrumented[path]:>13.0f}"
+                  f"{instrumented[path] / plain[path] - 1:>10.2%}{share:>12.3%}")
+
+
+if __name__ == "__main__":
+    main()
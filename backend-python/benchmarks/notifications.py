@@ -0,0 +1,122 @@
+"""Notification benchmark: deliver an alert spike to a local webhook sink.
+
+Starts benchmarks/webhook_sink.py, submits `--alerts` alerts to the real
+dispatcher in bursts (as the scoring path would) and waits for the backlog to
+drain, reporting how long submission blocked, how many HTTP requests and
+connections the spike cost, retries, and what ended up dead-lettered.
+
+    python benchmarks/notifications.py --alerts 20000 --fail-rate 0.1 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"webhook sink did not start on port {port}")
+
+
+def alert(i: int) -> dict:
+    return {
+        "id": f"bench_{i}",
+        "type": "fraud",
+        "severity": ("high", "critical")[i % 2],
+        "store_id": f"store-{i % 20}",
+        "title": "High risk order detected",
+        "message": f"Order bench-{i} scored high risk",
+        "order_id": f"bench-{i}"
+    }
+
+
+async def spike(dispatcher, url: str, alerts: int, burst: int) -> tuple:
+    """(seconds spent inside submit, seconds until the backlog drained)"""
+    submit_time = 0.0
+    started = time.perf_counter()
+    for offset in range(0, alerts, burst):
+        t0 = time.perf_counter()
+        dispatcher.enqueue(url, [alert(i) for i in range(offset, min(alerts, offset + burst))])
+        submit_time += time.perf_counter() - t0
+        await asyncio.sleep(0)
+    while any(d["pending"] or d["in_flight"] for d in dispatcher.stats()["destinations"].values()):
+        await asyncio.sleep(0.05)
+    drained = time.perf_counter() - started
+    await dispatcher.close()
+    return submit_time, drained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=20_000)
+    parser.add_argument("--burst", type=int, default=50, help="alerts submitted per scoring chunk")
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--max-pending", type=int, default=10_000, help="buffered alerts before overflow is dead-lettered")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(APP_DIR, "benchmarks", "webhook_sink.py"),
+            "--port", str(port), "--fail-rate", str(args.fail_rate), "--latency-ms", str(args.latency_ms)
+        ],
+        cwd=APP_DIR
+    )
+    try:
+        wait_for(port)
+        with tempfile.TemporaryDirectory() as tmp:
+            from services.notifications import NotificationDispatcher
+
+            dispatcher = NotificationDispatcher(
+                os.path.join(tmp, "analyses.db"),
+                max_pending=args.max_pending,
+                max_attempts=args.max_attempts,
+                allowed_hosts=["127.0.0.1"]
+            )
+            url = f"http://127.0.0.1:{port}/hook"
+            submit_time, drained = asyncio.run(spike(dispatcher, url, args.alerts, args.burst))
+            stats = dispatcher.stats()
+            sink = httpx.get(f"http://127.0.0.1:{port}/_stats").json()
+            reasons = {}
+            for letter in dispatcher.dead_letters(limit=1_000_000):
+                reasons[letter["error"]] = reasons.get(letter["error"], 0) + letter["alert_count"]
+
+        print(f"alerts submitted     {args.alerts}")
+        print(f"submit time          {submit_time * 1000:.1f} ms ({submit_time / args.alerts * 1e6:.2f} us/alert)")
+        print(f"drained in           {drained:.2f} s ({args.alerts / drained:.0f} alerts/s)")
+        print(f"http requests        {sink['requests']} ({sink['failed']} failed, {stats['retries_total']} retries)")
+        print(f"peak concurrent      {sink['max_in_flight']}")
+        print(f"alerts delivered     {sink['alerts']}")
+        print(f"alerts dead-lettered {stats['dead_lettered_total']}")
+        for reason, count in sorted(reasons.items()):
+            print(f"  {reason:<19}{count}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
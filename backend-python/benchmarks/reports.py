@@ -0,0 +1,172 @@
+"""Report benchmark: quarterly multi-store reports against a running API.
+
+Seeds `--orders` order analyses spread over 90 days and `--stores` stores,
+starts `uvicorn main:app`, generates each report type and, while it runs,
+probes /health to show whether the event loop stays responsive. Finally
+streams each report's CSV and JSON download.
+
+    python benchmarks/reports.py --orders 1000000 --stores 50
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server did not come up at {url}")
+
+
+RISK_LEVELS = ("low", "low", "low", "medium", "high")
+RECOMMENDATIONS = {"low": "allow", "medium": "review", "high": "block"}
+
+
+def seed(db_path: str, orders: int, stores: int, days: int) -> tuple:
+    """Insert synthetic order analyses; returns the (start, end) they cover"""
+    from services.analysis_store import ORDER_TIME_SCHEMA, SCHEMA
+
+    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start).total_seconds() / orders
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    conn.executescript(ORDER_TIME_SCHEMA)
+    conn.execute("BEGIN")
+    for offset in range(0, orders, 50_000):
+        rows = []
+        for i in range(offset, min(orders, offset + 50_000)):
+            level = RISK_LEVELS[i % len(RISK_LEVELS)]
+            analysis = {
+                "order_id": f"bench-{i}",
+                "customer_id": f"customer-{i % 20000}",
+                "store_id": f"store-{i % stores}",
+                "order_value": (i * 7919) % 250000 / 100,
+                "risk_score": round((i * 37 % 100) / 100, 2),
+                "risk_level": level,
+                "recommendation": RECOMMENDATIONS[level],
+                "fraud_type": "payment_fraud" if level == "high" else None,
+                "factors": []
+            }
+            ordered_at = start.timestamp() + i * step
+            rows.append((analysis["order_id"], analysis["customer_id"], analysis["store_id"],
+                         ordered_at, json.dumps(analysis), ordered_at))
+        conn.executemany(
+            "INSERT INTO order_analyses (order_id, customer_id, store_id, created_at, payload, ordered_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    conn.execute("COMMIT")
+    conn.close()
+    return start, end
+
+
+def probe(base_url: str, stop: threading.Event, latencies: list):
+    with httpx.Client(base_url=base_url, timeout=10.0) as client:
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get("/health")
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.02)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "analyses.db")
+        started = time.perf_counter()
+        start, end = seed(db_path, args.orders, args.stores, args.days)
+        print(f"seeded {args.orders} analyses over {args.stores} stores in {time.perf_counter() - started:.1f}s")
+
+        port = free_port()
+        env = dict(
+            os.environ,
+            ANALYSIS_DB_PATH=db_path,
+            REPORT_DIR=os.path.join(tmp, "reports"),
+            DATA_RETENTION_DAYS=str(args.days + 30)
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=APP_DIR,
+            env=env
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_for(base_url + "/health")
+            client = httpx.Client(base_url=base_url, timeout=60.0)
+            print(f"{'report':<16}{'rows':>10}{'build_s':>9}{'health_p50_ms':>15}{'health_max_ms':>15}"
+                  f"{'csv_MB':>8}{'csv_s':>7}{'json_s':>8}")
+            for report_type in ("fraud_analysis", "store_summary", "orders"):
+                latencies, stop = [], threading.Event()
+                prober = threading.Thread(target=probe, args=(base_url, stop, latencies))
+                prober.start()
+                started = time.perf_counter()
+                report = client.post("/reports/generate", json={
+                    "start_date": start.isoformat(),
+                    "end_date": end.isoformat(),
+                    "report_type": report_type
+                }).json()["data"]
+                while report["status"] in ("queued", "running"):
+                    time.sleep(0.1)
+                    report = client.get(f"/reports/{report['report_id']}").json()
+                build = time.perf_counter() - started
+                stop.set()
+                prober.join()
+                if report["status"] != "completed":
+                    raise RuntimeError(f"report ended {report['status']}: {report.get('error')}")
+
+                timings = {}
+                for format in ("csv", "json"):
+                    started, size = time.perf_counter(), 0
+                    with client.stream("GET", f"/reports/{report['report_id']}/download", params={"format": format}) as r:
+                        for chunk in r.iter_bytes():
+                            size += len(chunk)
+                    timings[format] = (time.perf_counter() - started, size)
+                print(
+                    f"{report_type:<16}{report['row_count']:>10}{build:>9.2f}"
+                    f"{percentile(latencies, 0.5) * 1000:>15.1f}{max(latencies) * 1000:>15.1f}"
+                    f"{timings['csv'][1] / 1e6:>8.1f}{timings['csv'][0]:>7.2f}{timings['json'][0]:>8.2f}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Store sync benchmark: pull a fake shop's history through the real sync pipeline.
+
+Starts benchmarks/fake_shopify.py (with Shopify's leaky-bucket call limit and
+per-request latency) and syncs it at each requested concurrency, scoring every
+order as the API would.
+
+    python benchmarks/store_sync.py --orders 100000 --concurrency 1 4 8
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"fake Shopify server did not start on port {port}")
+
+
+async def run_sync(store_sync, store_id: str, resources: list) -> dict:
+    sync = store_sync.start(store_id, "bench.myshopify.com", "bench-token", resources, 365)
+    while sync["status"] in ("queued", "running"):
+        await asyncio.sleep(0.5)
+        sync = store_sync.get(sync["sync_id"])
+    return sync
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--leak-rate", type=float, default=20.0, help="calls per second (Shopify Plus: 20)")
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--customers", action="store_true", help="sync customers as well as orders")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(APP_DIR, "benchmarks", "fake_shopify.py"),
+            "--orders", str(args.orders), "--port", str(port),
+            "--leak-rate", str(args.leak_rate), "--latency-ms", str(args.latency_ms)
+        ],
+        cwd=APP_DIR
+    )
+    try:
+        wait_for(port)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ.update(
+                ANALYSIS_DB_PATH=os.path.join(tmp, "analyses.db"),
+                SHOPIFY_API_BASE_URL=f"http://127.0.0.1:{port}",
+                SHOPIFY_LEAK_RATE=str(args.leak_rate)
+            )
+            import main as app_main  # noqa: F401  registers the sync handlers
+            from services.store_sync import store_sync
+
+            resources = ["orders", "customers"] if args.customers else ["orders"]
+            print(f"{'concurrency':<13}{'records':>10}{'elapsed_s':>11}{'records/s':>11}{'throttled_s':>13}")
+            for concurrency in args.concurrency:
+                store_sync.concurrency = concurrency
+                sync = asyncio.run(run_sync(store_sync, f"bench-{concurrency}", resources))
+                if sync["status"] != "completed":
+                    raise RuntimeError(f"sync ended {sync['status']}: {sync.get('errors')}")
+                records = sum(progress["fetched"] for progress in sync["progress"].values())
+                print(
+                    f"{concurrency:<13}{records:>10}{sync['elapsed_seconds']:>11.1f}"
+                    f"{records / sync['elapsed_seconds']:>11.0f}{sync['throttled_seconds']:>13.1f}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Local webhook receiver, for offline notification tests and benchmarks.
+
+Accepts alert batches on POST /hook, optionally failing a fraction of them
+with 503 and adding per-request latency, and reports what it received
+(requests, alerts, distinct deliveries, peak concurrent requests) on /_stats.
+
+    python benchmarks/webhook_sink.py --port 8082 --fail-rate 0.2 --latency-ms 50
+
+Then set webhook_url to http://127.0.0.1:8082/hook via PUT /notifications/settings.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(fail_rate: float, latency_ms: float) -> FastAPI:
+    app = FastAPI(title="Webhook Sink")
+    stats = {"requests": 0, "failed": 0, "alerts": 0, "in_flight": 0, "max_in_flight": 0}
+    deliveries = set()
+
+    @app.post("/hook")
+    async def hook(request: Request):
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            body = json.loads(await request.body())
+            if latency_ms:
+                await asyncio.sleep(latency_ms / 1000)
+            if random.random() < fail_rate:
+                stats["failed"] += 1
+                return JSONResponse({"error": "unavailable"}, status_code=503)
+            # Retried deliveries carry the same id; count their alerts once
+            if body["delivery_id"] not in deliveries:
+                deliveries.add(body["delivery_id"])
+                stats["alerts"] += len(body["alerts"])
+            return {"received": len(body["alerts"])}
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.get("/_stats")
+    async def get_stats():
+        return {**stats, "deliveries": len(deliveries)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8082)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args.fail_rate, args.latency_ms), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Multi-worker benchmark: request throughput as uvicorn worker processes are added.
+
+Each run starts `uvicorn main:app --workers N` on a fresh shared SQLite state
+and drives it from several client processes with a mix of order scoring
+(POST /fraud/analyze) and deduplicated webhook intake (POST /analyze-order).
+
+    python benchmarks/workers.py --workers 1 2 4 --clients 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server did not come up at {url}")
+
+
+def order(client_id: int, i: int) -> dict:
+    return {
+        "order_id": f"bench-{client_id}-{i}",
+        "customer_id": f"customer-{i % 5000}",
+        "store_id": f"store-{i % 20}",
+        "total_price": (i * 7919) % 250000 / 100,
+        "currency": "USD",
+        "payment_method": ("card", "paypal", "manual")[i % 3],
+        "shipping_country": ("US", "CA", "GB", "NG")[i % 4],
+        "billing_country": ("US", "CA", "GB", "NG")[(i // 7) % 4],
+        "customer_orders_count": i % 12,
+        "timestamp": "2024-01-01T12:00:00"
+    }
+
+
+async def drive(base_url: str, client_id: int, connections: int, duration: float) -> tuple:
+    """(completed requests, errors) from `connections` concurrent request loops"""
+    completed = errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=10.0) as client:
+        async def loop(offset: int):
+            nonlocal completed, errors
+            i = offset
+            while time.monotonic() < deadline:
+                data = order(client_id, i)
+                if i % 2:
+                    request = client.post("/fraud/analyze", json=data)
+                else:
+                    request = client.post("/analyze-order", json={"order_id": data["order_id"], "order_data": data})
+                try:
+                    response = await request
+                    if response.status_code < 400:
+                        completed += 1
+                    else:
+                        errors += 1
+                except httpx.TransportError:
+                    errors += 1
+                i += connections
+
+        await asyncio.gather(*(loop(offset) for offset in range(connections)))
+    return completed, errors
+
+
+def client_process(args):
+    return asyncio.run(drive(*args))
+
+
+def measure(workers: int, clients: int, connections: int, duration: float) -> tuple:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            ANALYSIS_DB_PATH=os.path.join(tmp, "analyses.db"),
+            MODEL_DIR=os.path.join(tmp, "models"),
+            WEB_CONCURRENCY=str(workers),
+            SHARED_STATE_BACKEND=os.getenv("SHARED_STATE_BACKEND", "sqlite")
+        )
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--port", str(port), "--workers", str(workers), "--log-level", "warning"
+            ],
+            cwd=APP_DIR,
+            env=env
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_for(base_url + "/health")
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.map(
+                    client_process,
+                    [(base_url, client_id, connections, duration) for client_id in range(clients)]
+                )
+        finally:
+            server.terminate()
+            server.wait()
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent requests per client")
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} clients={args.clients}x{args.connections}")
+    print(f"{'workers':<9}{'requests':>10}{'errors':>8}{'req/s':>10}{'speedup':>9}")
+    baseline = None
+    for workers in args.workers:
+        completed, errors = measure(workers, args.clients, args.connections, args.duration)
+        rate = completed / args.duration
+        baseline = baseline or rate
+        print(f"{workers:<9}{completed:>10}{errors:>8}{rate:>10.0f}{rate / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
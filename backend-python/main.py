@@ -1,23 +1,67 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Path
+from fastapi import FastAPI, HTTPException, Depends, Query, Path, Header, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-import uvicorn
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 import os
+import asyncio
+import logging
 from datetime import datetime, timedelta
 import random
 import json
+import time
 from pydantic import BaseModel, ValidationError, EmailStr
 from fastapi import HTTPException
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
+load_dotenv()
+
 # Import routers
 from routers import security, analytics, fraud
+from services.scoring_queue import ScoringQueue, QueueFullError
+from services.analysis_store import analysis_store
+from services.customer_aggregates import customer_aggregates
+from services.velocity import MAX_WINDOW_SECONDS as VELOCITY_WINDOW_SECONDS, velocity_detector
+from services.rollups import rollups
+from services.event_table import order_events
+from services.response_cache import CacheRule, ResponseCacheMiddleware, response_cache
+from services.rule_engine import PatternError, pattern_registry
+from services.model_registry import model_registry
+from services.training import training_runner
+from services.reports import report_engine
+from services.charts import chart_renderer
+from services.docs_assets import docs_assets, read_file
+from services.dedup import idempotency_key, webhook_dedup
+from services.ndjson import NDJSONStreamingResponse, read_ndjson
+from services.store_sync import RESOURCES as SYNC_RESOURCES, SyncError, shop_domain_from_env, store_sync
+from services.shared_state import shared_state, web_concurrency
+from services.alert_store import InvalidCursorError, alert_store
+from services.alert_stream import SubscriberLimitError, alert_broadcaster, sse_event
+from services.notifications import notification_dispatcher
+from services.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, metrics, process_started_at
+)
+from services.json_response import JSON_RESPONSE_MODE, FastJSONResponse, dumps as fast_dumps, use_fast_json
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Bounded queue that absorbs webhook bursts for order/customer analysis
+scoring_queue = ScoringQueue(
+    maxsize=int(os.getenv("SCORING_QUEUE_SIZE", 1000)),
+    workers=int(os.getenv("SCORING_QUEUE_WORKERS", 4))
+)
+metrics.gauge("scoring_queue_depth", "Jobs waiting in the scoring queue", function=lambda: scoring_queue.depth)
+
+# How often each worker picks up patterns, models and order analyses changed by other workers
+SHARED_STATE_POLL_SECONDS = float(os.getenv("SHARED_STATE_POLL_SECONDS", 2))
+# How often each worker picks up alerts raised by other workers for its stream subscribers
+ALERT_STREAM_POLL_SECONDS = float(os.getenv("ALERT_STREAM_POLL_SECONDS", 0.5))
+
+# Bulk NDJSON order import
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 500))
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", 1_048_576))
 
 # Configure CORS
 app = FastAPI(
@@ -60,6 +104,8 @@ app = FastAPI(
         "name": "MIT",
         "url": "https://opensource.org/licenses/MIT",
     },
+    # JSON_RESPONSE_MODE=fast renders responses with orjson (see configure_json_responses)
+    default_response_class=FastJSONResponse if JSON_RESPONSE_MODE == "fast" else JSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
@@ -281,6 +327,19 @@ app = FastAPI(
     """
 )
 
+# Dashboard read endpoints polled by every open frontend tab
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", 5))
+response_cache.rules.update({
+    "/security/dashboard": CacheRule(ttl=DASHBOARD_CACHE_TTL, tags=("analyses",)),
+    "/analytics/overview": CacheRule(ttl=DASHBOARD_CACHE_TTL, tags=("analyses",)),
+    "/analytics/fraud-trends": CacheRule(ttl=DASHBOARD_CACHE_TTL, tags=("analyses",)),
+    "/system/status": CacheRule(ttl=DASHBOARD_CACHE_TTL),
+    "/settings": CacheRule(ttl=60, tags=("settings",)),
+    "/security/patterns": CacheRule(ttl=60, tags=("patterns",))
+})
+# Registered before CORS so it sits inside it and cached bodies never carry per-origin headers
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -290,6 +349,124 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Outermost, so cached responses and CORS preflights are measured too
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# ============================================================================
+# ROUTERS
+# ============================================================================
+
+app.include_router(security.router, prefix="/security", tags=["Security & Fraud"])
+app.include_router(security.lookup_router, prefix="/security", tags=["Security & Fraud"])
+app.include_router(security.lookup_router, tags=["Security & Fraud"])
+app.include_router(fraud.router, prefix="/fraud", tags=["Security & Fraud"])
+app.include_router(analytics.router, prefix="/analytics", tags=["Reports & Analytics"])
+
+# ============================================================================
+# LIFECYCLE
+# ============================================================================
+
+@app.on_event("startup")
+async def configure_json_responses():
+    # Before the docs assets load, and after every route is registered
+    if JSON_RESPONSE_MODE == "fast":
+        logger.info("Fast JSON responses enabled for %d routes", use_fast_json(app))
+
+@app.on_event("startup")
+async def load_docs_assets():
+    # Every route is registered by now, so the OpenAPI schema is complete
+    await asyncio.get_running_loop().run_in_executor(None, docs_assets.load_all)
+
+@app.on_event("startup")
+async def start_scoring_queue():
+    scoring_queue.start()
+
+@app.on_event("startup")
+async def load_models():
+    model_registry.load()
+
+@app.on_event("startup")
+async def purge_expired_analyses():
+    analysis_store.purge_expired()
+
+@app.on_event("startup")
+async def rebuild_aggregates():
+    # Rollups, customer aggregates and the event table live in memory; refill them from stored analyses
+    started = time.perf_counter()
+    app.state.analysis_position, replayed = replay_analyses(0)
+    if replayed:
+        logger.info("Rebuilt aggregates from %d stored analyses in %.1fs", replayed, time.perf_counter() - started)
+
+@app.on_event("startup")
+async def start_worker_refresh():
+    app.state.worker_refresh = asyncio.create_task(refresh_worker_state())
+
+async def refresh_worker_state():
+    """Reload fraud patterns, model artifacts and order analyses written by other workers"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SHARED_STATE_POLL_SECONDS)
+        try:
+            pattern_registry.refresh()
+            await loop.run_in_executor(None, model_registry.refresh)
+            if shared_state.shared:
+                app.state.analysis_position, replayed = replay_analyses(app.state.analysis_position)
+                if replayed:
+                    response_cache.invalidate("analyses")
+        except Exception:
+            logger.exception("Worker state refresh failed")
+
+@app.on_event("shutdown")
+async def stop_scoring_queue():
+    await scoring_queue.stop()
+
+@app.on_event("startup")
+async def start_alert_relay():
+    # With several workers, alerts are fanned out by tailing the shared alert store
+    app.state.alert_relay = None
+    if shared_state.shared:
+        app.state.alert_relay = asyncio.create_task(alert_broadcaster.relay(alert_store, ALERT_STREAM_POLL_SECONDS))
+
+@app.on_event("shutdown")
+async def stop_worker_refresh():
+    app.state.worker_refresh.cancel()
+
+@app.on_event("shutdown")
+async def stop_alert_relay():
+    if app.state.alert_relay is not None:
+        app.state.alert_relay.cancel()
+
+@app.on_event("shutdown")
+async def stop_notifications():
+    # Undelivered alerts are kept in the dead-letter queue
+    await notification_dispatcher.close()
+
+@app.on_event("shutdown")
+async def stop_training_jobs():
+    training_runner.shutdown()
+
+@app.on_event("shutdown")
+async def stop_report_jobs():
+    report_engine.shutdown()
+
+@app.on_event("shutdown")
+async def stop_chart_workers():
+    chart_renderer.shutdown()
+
+@app.on_event("shutdown")
+async def stop_store_syncs():
+    # Cursors are saved per page; interrupted syncs can be resumed later
+    await store_sync.shutdown()
+
+def queue_full_error(error: QueueFullError) -> HTTPException:
+    """Map a full scoring queue to a 503 with Retry-After"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 # ============================================================================
 # ENUMS
 # ============================================================================
@@ -324,6 +501,7 @@ class StoreStatus(str, Enum):
 class OrderData(BaseModel):
     order_id: str
     order_data: dict
+    webhook_id: Optional[str] = None
 
 class CustomerData(BaseModel):
     customer_id: str
@@ -347,6 +525,12 @@ class StoreCreate(BaseModel):
     api_key: str
     webhook_secret: str
 
+class StoreSyncRequest(BaseModel):
+    shopify_domain: Optional[str] = None
+    access_token: Optional[str] = None
+    resources: List[str] = ["orders", "customers"]
+    since_days: int = 365
+
 class StoreUpdate(BaseModel):
     name: Optional[str] = None
     status: Optional[StoreStatus] = None
@@ -391,18 +575,31 @@ class SuccessResponse(BaseModel):
 # CUSTOM DOCS ENDPOINT
 # ============================================================================
 
+# Docs pages and the OpenAPI schema are built and compressed once at startup
+# (dark_docs.html again whenever it changes) and revalidated by ETag
+DARK_DOCS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dark_docs.html")
+
+# Replace FastAPI's /openapi.json, which re-serializes the schema on every request
+app.router.routes = [route for route in app.router.routes if getattr(route, "path", None) != app.openapi_url]
+
+@app.get("/openapi.json", include_in_schema=False)
+async def openapi_schema(request: Request):
+    return docs_assets.response(request, await docs_assets.get("openapi"))
+
 @app.get("/docs-dark", response_class=HTMLResponse)
-async def dark_docs():
+async def dark_docs(request: Request):
     """Serve the custom dark-themed HTML file"""
-    try:
-        with open("dark_docs.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
+    asset = await docs_assets.get("docs-dark")
+    if asset is None:
         return HTMLResponse(content="Dark docs file not found", status_code=404)
+    return docs_assets.response(request, asset)
 
 @app.get("/docs-custom", response_class=HTMLResponse)
-async def custom_docs():
+async def custom_docs(request: Request):
     """Custom dark-themed API documentation"""
+    return docs_assets.response(request, await docs_assets.get("docs-custom"))
+
+def custom_docs_html() -> str:
     html = """
     <!DOCTYPE html>
     <html lang="en">
@@ -671,7 +868,16 @@ async def custom_docs():
     </body>
     </html>
     """
-    return HTMLResponse(content=html)
+    return html
+
+def openapi_json() -> bytes:
+    if JSON_RESPONSE_MODE == "fast":
+        return fast_dumps(app.openapi())
+    return json.dumps(app.openapi(), separators=(",", ":")).encode("utf-8")
+
+docs_assets.add("openapi", openapi_json, "application/json")
+docs_assets.add("docs-dark", read_file(DARK_DOCS_PATH), "text/html; charset=utf-8", source=DARK_DOCS_PATH)
+docs_assets.add("docs-custom", lambda: custom_docs_html().encode("utf-8"), "text/html; charset=utf-8")
 
 # ============================================================================
 # HEALTH & SYSTEM
@@ -679,25 +885,57 @@ async def custom_docs():
 
 @app.get("/health", tags=["System"])
 async def health_check():
-    """Check API health status"""
-    return {
-        "status": "healthy",
+    """Check API health status; 503 when the scoring workers are down or the queue is full"""
+    problems = []
+    if not scoring_queue.running:
+        problems.append("scoring queue is not running")
+    elif scoring_queue.maxsize and scoring_queue.depth >= scoring_queue.maxsize:
+        problems.append("scoring queue is full")
+    body = {
+        "status": "degraded" if problems else "healthy",
         "service": "shopify-security-python",
         "timestamp": datetime.now().isoformat(),
+        "uptime_seconds": round(time.time() - process_started_at(), 1),
         "version": "1.0.0"
     }
+    if problems:
+        body["problems"] = problems
+        return JSONResponse(body, status_code=503)
+    return body
+
+@app.get("/system/queue", tags=["System"])
+async def queue_status():
+    """Get scoring queue depth, throughput and latency metrics"""
+    return {
+        "success": True,
+        "data": {
+            **scoring_queue.stats(),
+            "score_cache": fraud.score_cache.stats(),
+            "webhook_dedup": await webhook_dedup.stats(),
+            "shared_state": await shared_state.stats(),
+            "alert_stream": alert_broadcaster.stats(),
+            "notifications": notification_dispatcher.stats(),
+            "charts": chart_renderer.stats(),
+            "docs": docs_assets.stats()
+        }
+    }
+
+@app.get("/metrics", tags=["System"], response_class=Response)
+async def prometheus_metrics():
+    """Request, scoring and queue metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/system/status", tags=["System"])
 async def system_status():
     """Get detailed system status"""
+    started_at = process_started_at()
     return {
-        "status": "operational",
-        "uptime": "99.9%",
-        "last_maintenance": "2024-01-15T00:00:00Z",
-        "next_maintenance": "2024-02-15T00:00:00Z",
-        "active_stores": 150,
-        "active_users": 25,
-        "alerts_today": 12
+        "status": "operational" if scoring_queue.running else "degraded",
+        "started_at": datetime.fromtimestamp(started_at).isoformat(),
+        "uptime_seconds": round(time.time() - started_at, 1),
+        "alerts_today": alert_store.count_today(),
+        "open_alerts": alert_store.count(resolved=False),
+        "queued_analyses": scoring_queue.depth
     }
 
 # ============================================================================
@@ -876,207 +1114,413 @@ async def delete_store(store_id: str):
     }
 
 @app.post("/stores/{store_id}/sync", tags=["Store Management"])
-async def sync_store(store_id: str):
-    """Trigger store data synchronization"""
+async def sync_store(store_id: str, sync_request: Optional[StoreSyncRequest] = None):
+    """Trigger store data synchronization
+    
+    Pulls the store's orders and customers from Shopify and scores them.
+    Credentials default to SHOPIFY_SHOP_NAME / SHOPIFY_ACCESS_TOKEN.
+    """
+    sync_request = sync_request or StoreSyncRequest()
+    shop_domain = sync_request.shopify_domain or shop_domain_from_env()
+    access_token = sync_request.access_token or os.getenv("SHOPIFY_ACCESS_TOKEN")
+    if not shop_domain or not access_token:
+        raise HTTPException(status_code=400, detail="A Shopify domain and access token are required to sync")
+    unknown = set(sync_request.resources) - set(SYNC_RESOURCES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown resources: {', '.join(sorted(unknown))}")
+    try:
+        sync = store_sync.start(store_id, shop_domain, access_token, sync_request.resources, sync_request.since_days)
+    except SyncError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return {
         "success": True,
         "message": f"Store {store_id} sync initiated",
-        "sync_id": f"sync_{random.randint(10000, 99999)}"
+        "sync_id": sync["sync_id"],
+        "sync": sync
     }
 
+@app.get("/stores/{store_id}/sync", tags=["Store Management"])
+async def list_store_syncs(store_id: str, limit: int = Query(20, ge=1, le=100)):
+    """List a store's recent syncs"""
+    return {
+        "success": True,
+        "data": store_sync.list(store_id, limit)
+    }
+
+@app.get("/stores/{store_id}/sync/{sync_id}", tags=["Store Management"])
+async def get_store_sync(store_id: str, sync_id: str):
+    """Get sync progress"""
+    sync = store_sync.get(sync_id)
+    if sync is None or sync["store_id"] != store_id:
+        raise HTTPException(status_code=404, detail=f"Sync {sync_id} not found")
+    return {
+        "success": True,
+        "data": sync
+    }
+
+@app.post("/stores/{store_id}/sync/{sync_id}/resume", tags=["Store Management"])
+async def resume_store_sync(store_id: str, sync_id: str, sync_request: Optional[StoreSyncRequest] = None):
+    """Resume an interrupted or failed sync from its saved cursors"""
+    sync = store_sync.get(sync_id)
+    if sync is None or sync["store_id"] != store_id:
+        raise HTTPException(status_code=404, detail=f"Sync {sync_id} not found")
+    access_token = (sync_request.access_token if sync_request else None) or os.getenv("SHOPIFY_ACCESS_TOKEN")
+    try:
+        sync = store_sync.resume(sync_id, access_token)
+    except SyncError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "success": True,
+        "message": f"Sync {sync_id} resumed",
+        "data": sync
+    }
+
+@app.post("/stores/{store_id}/orders/import", tags=["Store Management"])
+async def import_store_orders(store_id: str, request: Request):
+    """Score historical orders streamed as NDJSON, one Shopify order per line
+    
+    The body is read incrementally and scored in chunks of INGEST_CHUNK_SIZE;
+    results stream back as NDJSON (one line per order or bad input line,
+    then a final `summary` line), so exports of any size run in bounded memory.
+    """
+    async def results():
+        started = time.perf_counter()
+        counts = {"orders": 0, "errors": 0, "allow": 0, "review": 0, "block": 0}
+        chunk, lines = [], []
+        
+        async def flush():
+            analyses = await process_order_chunk(store_id, chunk)
+            out = []
+            for line, analysis in zip(lines, analyses):
+                counts["orders"] += 1
+                counts[analysis["recommendation"]] += 1
+                out.append(json.dumps({"line": line, **analysis}, default=str))
+            chunk.clear()
+            lines.clear()
+            return ("\n".join(out) + "\n").encode("utf-8")
+        
+        async for line, order, error in read_ndjson(request.stream(), INGEST_MAX_LINE_BYTES):
+            # Results are keyed by order id, so an order without one cannot be stored
+            if error is None and imported_order_id(order) is None:
+                error = "Order has no id or order_id"
+            if error is not None:
+                counts["errors"] += 1
+                yield (json.dumps({"line": line, "error": error}) + "\n").encode("utf-8")
+                continue
+            chunk.append(order)
+            lines.append(line)
+            if len(chunk) >= INGEST_CHUNK_SIZE:
+                yield await flush()
+        if chunk:
+            yield await flush()
+        
+        summary = {"store_id": store_id, **counts, "elapsed_seconds": round(time.perf_counter() - started, 3)}
+        yield (json.dumps({"summary": summary}) + "\n").encode("utf-8")
+    
+    return NDJSONStreamingResponse(results())
+
 # ============================================================================
 # ALERTS & NOTIFICATIONS
 # ============================================================================
 
 @app.get("/alerts", tags=["Alerts & Notifications"])
 async def get_alerts(
-    skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     type: Optional[AlertType] = Query(None),
     severity: Optional[RiskLevel] = Query(None),
-    store_id: Optional[str] = Query(None)
+    store_id: Optional[str] = Query(None),
+    resolved: Optional[bool] = Query(None)
 ):
-    """Get list of alerts with filtering"""
-    alerts = [
-        {
-            "id": "alert_1",
-            "type": AlertType.FRAUD,
-            "title": "High Risk Order Detected",
-            "message": "Order #12345 has a fraud risk score of 0.85",
-            "severity": RiskLevel.HIGH,
-            "store_id": "store_1",
-            "created_at": "2024-01-15T10:30:00Z",
-            "resolved": False
-        },
-        {
-            "id": "alert_2",
-            "type": AlertType.SECURITY,
-            "title": "Suspicious Login Attempt",
-            "message": "Multiple failed login attempts detected",
-            "severity": RiskLevel.MEDIUM,
-            "store_id": "store_2",
-            "created_at": "2024-01-15T09:15:00Z",
-            "resolved": True
-        }
-    ]
-    
-    if type:
-        alerts = [a for a in alerts if a["type"] == type]
-    if severity:
-        alerts = [a for a in alerts if a["severity"] == severity]
-    if store_id:
-        alerts = [a for a in alerts if a["store_id"] == store_id]
+    """Get list of alerts with filtering, newest first"""
+    try:
+        alerts, next_cursor = alert_store.page(
+            limit=limit,
+            cursor=cursor,
+            type=type,
+            severity=severity,
+            store_id=store_id,
+            resolved=resolved
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
-        "alerts": alerts[skip:skip+limit],
-        "total": len(alerts),
-        "skip": skip,
-        "limit": limit
+        "alerts": alerts,
+        "total": alert_store.count(type=type, severity=severity, store_id=store_id, resolved=resolved),
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 @app.post("/alerts", tags=["Alerts & Notifications"])
 async def create_alert(alert: AlertCreate):
     """Create a new alert"""
+    created = alert_store.create(alert.dict())
+    publish_alerts([created])
     return {
         "success": True,
         "message": "Alert created successfully",
-        "alert_id": f"alert_{random.randint(1000, 9999)}",
-        "alert": alert.dict()
+        "alert_id": created["id"],
+        "alert": created
     }
 
 @app.put("/alerts/{alert_id}/resolve", tags=["Alerts & Notifications"])
 async def resolve_alert(alert_id: str):
     """Mark alert as resolved"""
+    if alert_store.resolve(alert_id) is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
     return {
         "success": True,
         "message": f"Alert {alert_id} marked as resolved"
     }
 
+@app.get("/alerts/stream", tags=["Alerts & Notifications"])
+async def stream_alerts(
+    store_id: Optional[str] = Query(None),
+    severity: Optional[RiskLevel] = Query(None, description="Minimum severity to receive")
+):
+    """Server-Sent Events stream of new alerts, including high-risk order analyses"""
+    try:
+        subscription = alert_broadcaster.subscribe(store_id, severity.value if severity else None)
+    except SubscriberLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    async def events():
+        reported_drops = 0
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                batch = await subscription.next_batch(alert_broadcaster.heartbeat_seconds)
+                if not batch:
+                    yield b": keepalive\n\n"
+                    continue
+                frames = []
+                if subscription.dropped > reported_drops:
+                    frames.append(sse_event("dropped", {"dropped": subscription.dropped - reported_drops}))
+                    reported_drops = subscription.dropped
+                frames.extend(sse_event("alert", alert, alert.get("id")) for alert in batch)
+                yield b"".join(frames)
+        finally:
+            alert_broadcaster.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/alerts/ws")
+async def alert_socket(
+    websocket: WebSocket,
+    store_id: Optional[str] = None,
+    severity: Optional[RiskLevel] = None
+):
+    """WebSocket stream of new alerts; same filters as /alerts/stream"""
+    try:
+        subscription = alert_broadcaster.subscribe(store_id, severity.value if severity else None)
+    except SubscriberLimitError:
+        await websocket.close(code=1013)
+        return
+    
+    async def send_alerts():
+        reported_drops = 0
+        while True:
+            batch = await subscription.next_batch(alert_broadcaster.heartbeat_seconds)
+            message = {"type": "alerts" if batch else "heartbeat", "alerts": batch}
+            if subscription.dropped > reported_drops:
+                message["dropped"] = subscription.dropped - reported_drops
+                reported_drops = subscription.dropped
+            await websocket.send_text(json.dumps(message, default=str))
+    
+    async def wait_for_close():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    try:
+        await websocket.accept()
+        tasks = [asyncio.create_task(send_alerts()), asyncio.create_task(wait_for_close())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        alert_broadcaster.unsubscribe(subscription)
+
 @app.get("/notifications/settings", tags=["Alerts & Notifications"])
 async def get_notification_settings():
     """Get notification settings"""
-    return {
-        "email_enabled": True,
-        "webhook_enabled": False,
-        "webhook_url": None,
-        "alert_types": [AlertType.FRAUD, AlertType.SECURITY],
-        "email_recipients": ["admin@darkshepherd.ai"]
-    }
+    return notification_dispatcher.settings()
 
 @app.put("/notifications/settings", tags=["Alerts & Notifications"])
 async def update_notification_settings(settings: NotificationSettings):
     """Update notification settings"""
+    try:
+        # Resolves the webhook host, so kept off the event loop
+        updated = await asyncio.get_running_loop().run_in_executor(
+            None, notification_dispatcher.update_settings, settings.dict()
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "success": True,
         "message": "Notification settings updated",
-        "settings": settings.dict()
+        "settings": updated
     }
 
-# ============================================================================
-# REPORTS & ANALYTICS
-# ============================================================================
+@app.get("/notifications/status", tags=["Alerts & Notifications"])
+async def get_notification_status():
+    """Webhook delivery backlog, throughput and dead-letter count"""
+    return {
+        "success": True,
+        "data": notification_dispatcher.stats()
+    }
 
-@app.post("/reports/generate", tags=["Reports & Analytics"])
-async def generate_report(report_request: ReportRequest):
-    """Generate a custom report"""
+@app.get("/notifications/dead-letters", tags=["Alerts & Notifications"])
+async def list_dead_letters(limit: int = Query(50, ge=1, le=500)):
+    """Alert batches that could not be delivered"""
     return {
         "success": True,
-        "message": "Report generation started",
-        "report_id": f"report_{random.randint(10000, 99999)}",
-        "estimated_completion": "2024-01-15T11:00:00Z"
+        "data": notification_dispatcher.dead_letters(limit)
     }
 
-@app.get("/reports/{report_id}", tags=["Reports & Analytics"])
-async def get_report(report_id: str):
-    """Get report by ID"""
+@app.post("/notifications/dead-letters/{letter_id}/retry", tags=["Alerts & Notifications"])
+async def retry_dead_letter(letter_id: str):
+    """Queue a dead-lettered batch for delivery again"""
+    queued = notification_dispatcher.retry_dead_letter(letter_id)
+    if queued is None:
+        raise HTTPException(status_code=404, detail=f"Dead letter {letter_id} not found")
     return {
-        "id": report_id,
-        "type": "fraud_analysis",
-        "status": "completed",
-        "created_at": "2024-01-15T10:00:00Z",
-        "completed_at": "2024-01-15T10:05:00Z",
-        "data": {
-            "total_orders": 1250,
-            "fraud_attempts": 15,
-            "fraud_rate": "1.2%",
-            "total_loss_prevented": "$12,500"
-        },
-        "download_url": f"/reports/{report_id}/download"
+        "success": True,
+        "message": f"{queued} alerts queued for redelivery"
     }
 
-@app.get("/analytics/overview", tags=["Reports & Analytics"])
-async def get_analytics_overview(
-    store_id: Optional[str] = Query(None),
-    days: int = Query(30, ge=1, le=365)
-):
-    """Get analytics overview"""
+# ============================================================================
+# REPORTS & ANALYTICS
+# ============================================================================
+
+@app.post("/reports/generate", status_code=202, tags=["Reports & Analytics"])
+async def generate_report(report_request: ReportRequest):
+    """Queue a report over stored order analyses; poll GET /reports/{report_id} for its status"""
+    try:
+        report = report_engine.start(report_request.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
-        "period": f"Last {days} days",
-        "total_orders": 12500,
-        "fraud_attempts": 150,
-        "fraud_rate": "1.2%",
-        "total_loss_prevented": "$125,000",
-        "active_stores": 15,
-        "alerts_generated": 45,
-        "avg_response_time": "2.3s"
+        "success": True,
+        "message": "Report generation started",
+        "report_id": report["report_id"],
+        "data": report
     }
 
-@app.get("/analytics/fraud-trends", tags=["Reports & Analytics"])
-async def get_fraud_trends(
-    store_id: Optional[str] = Query(None),
-    days: int = Query(30, ge=1, le=365)
-):
-    """Get fraud trend analysis"""
+@app.get("/reports", tags=["Reports & Analytics"])
+async def list_reports(limit: int = Query(20, ge=1, le=200)):
+    """List recent reports"""
     return {
-        "period": f"Last {days} days",
-        "trends": [
-            {"date": "2024-01-01", "fraud_attempts": 5, "successful_fraud": 1},
-            {"date": "2024-01-02", "fraud_attempts": 3, "successful_fraud": 0},
-            {"date": "2024-01-03", "fraud_attempts": 7, "successful_fraud": 2}
-        ],
-        "patterns": [
-            "Most fraud attempts occur on weekends",
-            "High-value orders are targeted more frequently",
-            "International orders show higher risk"
-        ]
+        "success": True,
+        "data": report_engine.list(limit)
     }
 
+@app.get("/reports/{report_id}", tags=["Reports & Analytics"])
+async def get_report(report_id: str):
+    """Get report by ID"""
+    report = report_engine.get(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found")
+    return report
+
+@app.get("/reports/{report_id}/download", tags=["Reports & Analytics"])
+async def download_report(report_id: str, format: str = Query("csv", pattern="^(csv|json)$")):
+    """Stream a completed report's rows as CSV or JSON"""
+    report = report_engine.get(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found")
+    if report["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Report {report_id} is {report['status']}")
+    # A plain iterator, so Starlette reads the file in its threadpool, not on the event loop
+    return StreamingResponse(
+        report_engine.stream(report, format),
+        media_type="text/csv" if format == "csv" else "application/json",
+        headers={"Content-Disposition": f'attachment; filename="{report_id}.{format}"'}
+    )
+
 # ============================================================================
 # SECURITY & FRAUD DETECTION
 # ============================================================================
 
 @app.post("/analyze-order", tags=["Security & Fraud"])
-async def analyze_order(order_data: OrderData, background_tasks: BackgroundTasks):
-    """Analyze order for fraud detection"""
+async def analyze_order(order_data: OrderData, x_shopify_webhook_id: Optional[str] = Header(None)):
+    """Analyze order for fraud detection
+    
+    Deliveries are deduplicated on order id plus webhook id (body `webhook_id`
+    or the `X-Shopify-Webhook-Id` header), so Shopify retries are acknowledged
+    without queueing another analysis.
+    """
     try:
         order_id = order_data.order_id
         order = order_data.order_data
-        # Add to background tasks for processing
-        background_tasks.add_task(process_order_analysis, order_id, order)
+        dedup_key = idempotency_key(order_id, order_data.webhook_id or x_shopify_webhook_id)
+        if await webhook_dedup.check_and_add(dedup_key):
+            return {
+                "success": True,
+                "message": f"Order {order_id} already received",
+                "order_id": order_id,
+                "duplicate": True
+            }
+        # Hand off to the scoring queue; rejects with 503 when saturated
+        try:
+            scoring_queue.submit(process_order_analysis, order_id, order)
+        except QueueFullError:
+            # Not queued, so let Shopify's retry through
+            await webhook_dedup.discard(dedup_key)
+            raise
         return {
             "success": True,
             "message": f"Order {order_id} queued for analysis",
             "order_id": order_id
         }
+    except QueueFullError as e:
+        raise queue_full_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze-customer", tags=["Security & Fraud"])
-async def analyze_customer(customer_data: CustomerData, background_tasks: BackgroundTasks):
+async def analyze_customer(customer_data: CustomerData):
     """Analyze customer for risk assessment"""
     try:
         customer_id = customer_data.customer_id
         customer = customer_data.customer_data
-        # Add to background tasks for processing
-        background_tasks.add_task(process_customer_analysis, customer_id, customer)
+        # Hand off to the scoring queue; rejects with 503 when saturated
+        scoring_queue.submit(process_customer_analysis, customer_id, customer)
         return {
             "success": True,
             "message": f"Customer {customer_id} queued for analysis",
             "customer_id": customer_id
         }
+    except QueueFullError as e:
+        raise queue_full_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analyses", tags=["Security & Fraud"])
+async def get_analyses(
+    customer_id: Optional[str] = Query(None),
+    store_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="Only analyses stored after this time"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Get stored order analyses by customer, store and time"""
+    analyses = analysis_store.find_order_analyses(
+        customer_id=customer_id,
+        store_id=store_id,
+        since=since.timestamp() if since else None,
+        limit=limit
+    )
+    return {
+        "analyses": analyses,
+        "total": len(analyses),
+        "limit": limit
+    }
+
 @app.get("/security/patterns", tags=["Security & Fraud"])
 async def get_fraud_patterns():
     """Get known fraud patterns"""
@@ -1096,16 +1540,38 @@ async def get_fraud_patterns():
                 "risk_score": 0.7,
                 "detection_rate": "88%"
             }
-        ]
+        ] + pattern_registry.list()
     }
 
 @app.post("/security/patterns", tags=["Security & Fraud"])
 async def create_fraud_pattern(pattern: dict):
-    """Create a new fraud pattern"""
+    """Create a new fraud pattern
+    
+    Example: `{"name": "Big first order", "store_id": "store_1", "match": "all",
+    "conditions": [{"feature": "order_value", "op": ">", "value": 1000},
+    {"feature": "new_customer", "op": "==", "value": true}],
+    "risk_score": 0.9, "action": "block"}`
+    """
+    try:
+        created = pattern_registry.add(pattern)
+    except PatternError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response_cache.invalidate("patterns")
     return {
         "success": True,
         "message": "Fraud pattern created",
-        "pattern_id": f"pattern_{random.randint(1000, 9999)}"
+        "pattern_id": created["pattern_id"]
+    }
+
+@app.delete("/security/patterns/{pattern_id}", tags=["Security & Fraud"])
+async def delete_fraud_pattern(pattern_id: str):
+    """Delete a custom fraud pattern"""
+    if not pattern_registry.remove(pattern_id):
+        raise HTTPException(status_code=404, detail=f"Pattern {pattern_id} not found")
+    response_cache.invalidate("patterns")
+    return {
+        "success": True,
+        "message": f"Fraud pattern {pattern_id} deleted"
     }
 
 # ============================================================================
@@ -1128,7 +1594,7 @@ async def get_settings():
             "alert_types": ["fraud", "security"]
         },
         "analytics": {
-            "data_retention_days": 90,
+            "data_retention_days": analysis_store.retention_days,
             "real_time_processing": True
         }
     }
@@ -1136,6 +1602,12 @@ async def get_settings():
 @app.put("/settings", tags=["Settings & Configuration"])
 async def update_settings(settings: dict):
     """Update system settings"""
+    retention_days = settings.get("analytics", {}).get("data_retention_days")
+    if retention_days is not None:
+        analysis_store.set_retention_days(retention_days)
+        order_events.retention_days = analysis_store.retention_days
+        order_events.compact()
+    response_cache.invalidate("settings")
     return {
         "success": True,
         "message": "Settings updated successfully",
@@ -1163,15 +1635,136 @@ async def restore_settings(backup_id: str):
 # ============================================================================
 # BACKGROUND TASKS
 # ============================================================================
+# Executed by scoring_queue workers, not per-request BackgroundTasks
+
+def order_features(order: dict, store_id: Optional[str] = None):
+    """Scoring features for a raw order, including its velocity signals"""
+    features = fraud.extract_order_features(order)
+    if features.get("store_id") is None:
+        features["store_id"] = store_id
+    velocity = velocity_detector.record_order(features)
+    features["rapid_ordering"] = velocity["rapid_ordering"]
+    features["multiple_payment_methods"] = features["multiple_payment_methods"] or velocity["multiple_payment_methods"]
+    return features, velocity
+
+def complete_analysis(order_id: str, features: dict, velocity: dict, analysis: dict) -> dict:
+    """Attach order identity and velocity to a scored analysis"""
+    analysis.update({
+        "order_id": order_id,
+        "customer_id": features.get("customer_id"),
+        "store_id": features.get("store_id"),
+        "order_value": features.get("order_value"),
+        "is_suspicious": analysis["risk_level"] == "high",
+        "velocity": velocity
+    })
+    return analysis
+
+def analysis_alerts(analyses: List[dict]) -> List[dict]:
+    """Fraud alerts for the high-risk analyses in a batch"""
+    return [
+        {
+            "id": f"order_{analysis['order_id']}",
+            "type": AlertType.FRAUD.value,
+            "title": "High Risk Order Detected",
+            "message": f"Order #{analysis['order_id']} has a fraud risk score of {analysis['risk_score']}",
+            "severity": RiskLevel.CRITICAL.value if analysis["recommendation"] == "block" else RiskLevel.HIGH.value,
+            "store_id": analysis.get("store_id"),
+            "order_id": analysis["order_id"],
+            "risk_score": analysis["risk_score"],
+            "recommendation": analysis["recommendation"],
+            "created_at": datetime.now().isoformat(),
+            "resolved": False
+        }
+        for analysis in analyses
+        if analysis["risk_level"] == "high"
+    ]
+
+def publish_alerts(alerts: List[dict]):
+    """Push newly stored alerts to stream subscribers and the notification webhook"""
+    if not alerts:
+        return
+    # With shared state, every worker's relay picks them up from the alert store instead
+    if not shared_state.shared:
+        alert_broadcaster.publish(alerts)
+    # Only the worker that stored an alert sends its notification
+    notification_dispatcher.submit(alerts)
+
+def raise_alerts(alerts: List[dict]):
+    """Store alerts (once per id) and publish the new ones"""
+    if alerts:
+        publish_alerts(alert_store.add_many(alerts))
+
+def record_analysis(features: dict, analysis: dict):
+    """Fold a stored analysis into the customer, rollup and event aggregates"""
+    # A rescored order replaces its earlier analysis, so its old counts come out first
+    previous = order_events.append(features, analysis)
+    if previous is not None:
+        customer_aggregates.retract_order(*previous)
+        rollups.retract(*previous)
+    customer_aggregates.record_order(features, analysis)
+    rollups.record(features, analysis)
+
+def replay_analyses(position: int):
+    """Fold analyses other workers stored after `position` into this worker's aggregates
+
+    Recent orders also feed the velocity counters, so rapid ordering spread
+    across workers is still seen. Returns the new position and how many
+    analyses were folded in.
+    """
+    replayed = 0
+    while True:
+        analyses, next_position = analysis_store.tail_order_analyses(position)
+        velocity_since = time.time() - VELOCITY_WINDOW_SECONDS
+        for features, analysis in analyses:
+            if (features.get("created_at") or 0) >= velocity_since:
+                velocity_detector.record_order(features)
+            record_analysis(features, analysis)
+        replayed += len(analyses)
+        if next_position == position:
+            return position, replayed
+        position = next_position
 
 async def process_order_analysis(order_id: str, order: dict):
     """Background task to process order analysis"""
-    # Simulate fraud detection logic
-    risk_score = random.uniform(0, 1)
-    is_suspicious = risk_score > 0.7
+    features, velocity = order_features(order)
+    analysis = complete_analysis(order_id, features, velocity, await fraud.score_order(features))
+    
+    analysis_store.save_order_analysis(analysis, features)
+    record_analysis(features, analysis)
+    raise_alerts(analysis_alerts([analysis]))
+    response_cache.invalidate("analyses")
+
+def imported_order_id(order: dict):
+    """A Shopify order's `id`, or `order_id` for exports that use that name"""
+    order_id = order.get("id")
+    return order.get("order_id") if order_id is None else order_id
+
+async def process_order_chunk(store_id: str, orders: List[dict]) -> List[dict]:
+    """Score a chunk of imported orders in one batch pass and record the results"""
+    scored = [order_features(order, store_id) for order in orders]
+    features = [f for f, _ in scored]
+    fraud_probabilities = await model_registry.predict_many_async(fraud.FRAUD_MODEL, features)
+    analyses = [
+        complete_analysis(str(imported_order_id(order)), f, velocity, analysis)
+        for order, (f, velocity), analysis in zip(orders, scored, fraud.analyze_batch(features, fraud_probabilities))
+    ]
     
-    # Store results (in production, save to database)
-    print(f"Order {order_id} analysis complete - Risk: {risk_score:.2f}, Suspicious: {is_suspicious}")
+    analysis_store.save_order_analyses(analyses, features)
+    for f, analysis in zip(features, analyses):
+        record_analysis(f, analysis)
+    raise_alerts(analysis_alerts(analyses))
+    response_cache.invalidate("analyses")
+    return analyses
+
+async def sync_orders_page(store_id: str, orders: List[dict]):
+    await process_order_chunk(store_id, orders)
+
+async def sync_customers_page(store_id: str, customers: List[dict]):
+    for customer in customers:
+        await process_customer_analysis(str(customer["id"]), {**customer, "store_id": store_id})
+
+store_sync.register_handler("orders", sync_orders_page)
+store_sync.register_handler("customers", sync_customers_page)
 
 async def process_customer_analysis(customer_id: str, customer: dict):
     """Background task to process customer analysis"""
@@ -1179,15 +1772,27 @@ async def process_customer_analysis(customer_id: str, customer: dict):
     risk_score = random.uniform(0, 1)
     risk_level = "high" if risk_score > 0.7 else "medium" if risk_score > 0.3 else "low"
     
-    # Store results (in production, save to database)
-    print(f"Customer {customer_id} analysis complete - Risk: {risk_score:.2f}, Level: {risk_level}")
+    analysis_store.save_customer_analysis({
+        "customer_id": customer_id,
+        "store_id": customer.get("store_id"),
+        "risk_score": round(risk_score, 3),
+        "risk_level": risk_level,
+        "recommendation": "monitor" if risk_level == "high" else "normal",
+        "timestamp": datetime.now().isoformat()
+    })
 
 if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.getenv("PORT", 8000))
+    # WEB_CONCURRENCY > 1 serves with that many worker processes sharing state
+    # through SHARED_STATE_BACKEND; auto-reload only applies to a single worker
+    workers = web_concurrency()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        workers=workers,
+        reload=workers == 1 and os.getenv("ENVIRONMENT", "development") == "development",
         log_level="info"
     ) 
\ No newline at end of file
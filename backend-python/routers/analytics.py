@@ -1,15 +1,45 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
 from datetime import datetime, timedelta
 import random
 import json
 
+import numpy as np
+
+from services.customer_aggregates import customer_aggregates
+from services.event_table import order_events
+from services.rollups import rollups, COLUMN_INDEX
+from services.charts import CHART_TYPES, FORMATS, chart_renderer
+from services.shared_state import shared_state
+
 router = APIRouter()
 
+# Longest window each rollup ring still holds: daily buckets, and the hourly ones order patterns read
+MAX_DAYS = rollups.daily_slots
+MAX_PATTERN_DAYS = rollups.hourly_slots // 24
+
+def recorded_data(available: bool) -> bool:
+    """Whether to answer from recorded orders instead of mock data
+
+    With several workers, each one's aggregates are rebuilt from the shared
+    store, so an empty worker reports zeros rather than numbers it made up.
+    """
+    return available or shared_state.shared
+
 @router.get("/overview")
-async def get_analytics_overview(period: str = "30d"):
+async def get_analytics_overview(
+    period: str = "30d", days: int = Query(None, ge=1, le=MAX_DAYS), store_id: str = None
+):
     """Get analytics overview for the specified period"""
-    # Generate mock analytics data
-    days = 30 if period == "30d" else 7 if period == "7d" else 90
+    if days:
+        period = f"{days}d"
+    days = days or period_days(period)
+    
+    if recorded_data(not rollups.empty):
+        return {
+            "success": True,
+            "data": rollup_overview(period, days, store_id)
+        }
     
     return {
         "success": True,
@@ -31,16 +61,26 @@ async def get_analytics_overview(period: str = "30d"):
     }
 
 @router.get("/fraud-trends")
-async def get_fraud_trends(period: str = "30d"):
+async def get_fraud_trends(
+    period: str = "30d", days: int = Query(None, ge=1, le=MAX_DAYS), store_id: str = None
+):
     """Get fraud detection trends"""
-    days = 30 if period == "30d" else 7 if period == "7d" else 90
+    if days:
+        period = f"{days}d"
+    days = days or period_days(period)
+    
+    if recorded_data(not rollups.empty):
+        return {
+            "success": True,
+            "data": rollup_fraud_trends(period, days, store_id)
+        }
     
     return {
         "success": True,
         "data": {
             "period": period,
             "total_fraud_attempts": random.randint(20, 100),
-            "successful_fraud": random.randint(5, 25),
+            "reviewed_orders": random.randint(5, 25),
             "blocked_fraud": random.randint(15, 75),
             "fraud_types": {
                 "payment_fraud": random.randint(10, 40),
@@ -58,8 +98,24 @@ async def get_fraud_trends(period: str = "30d"):
     }
 
 @router.get("/customer-insights")
-async def get_customer_insights(limit: int = 100):
+async def get_customer_insights(limit: int = 100, store_id: str = None):
     """Get customer behavior insights"""
+    if recorded_data(len(order_events) > 0):
+        customers, insights = order_events.customer_insights(min(limit, 100), store_id)
+        # Distinct-count sketches only live in the per-customer aggregates
+        for customer in customers:
+            aggregate = customer_aggregates.get(customer["customer_id"])
+            customer["payment_methods"] = aggregate.payment_methods.count() if aggregate else 0
+            customer["shipping_addresses"] = aggregate.shipping_addresses.count() if aggregate else 0
+        
+        return {
+            "success": True,
+            "data": {
+                "customers": customers,
+                "insights": insights
+            }
+        }
+    
     customers = []
     
     for i in range(min(limit, 100)):
@@ -90,9 +146,19 @@ async def get_customer_insights(limit: int = 100):
     }
 
 @router.get("/order-patterns")
-async def get_order_patterns(period: str = "30d"):
+async def get_order_patterns(
+    period: str = "30d", days: int = Query(None, ge=1, le=MAX_PATTERN_DAYS), store_id: str = None
+):
     """Get order pattern analysis"""
-    days = 30 if period == "30d" else 7 if period == "7d" else 90
+    if days:
+        period = f"{days}d"
+    days = days or period_days(period)
+    
+    if recorded_data(not rollups.empty):
+        return {
+            "success": True,
+            "data": rollup_order_patterns(period, days, store_id)
+        }
     
     return {
         "success": True,
@@ -130,6 +196,39 @@ async def get_order_patterns(period: str = "30d"):
         }
     }
 
+@router.get("/charts/{chart}")
+async def get_chart(
+    chart: str,
+    request: Request,
+    period: str = "30d",
+    days: int = Query(None, ge=1, le=MAX_DAYS),
+    store_id: str = None,
+    format: str = Query("png", pattern="^(png|svg)$"),
+    width: int = Query(800, ge=200, le=2400),
+    height: int = Query(400, ge=150, le=1600)
+):
+    """Render a fraud trend, risk distribution or order pattern chart as PNG or SVG"""
+    if chart not in CHART_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown chart {chart}; expected one of {', '.join(CHART_TYPES)}")
+    # Charts draw exactly the data the matching analytics endpoint returns
+    if chart == "order_patterns":
+        if days is not None and days > MAX_PATTERN_DAYS:
+            raise HTTPException(status_code=400, detail=f"Order pattern charts cover at most {MAX_PATTERN_DAYS} days")
+        data = (await get_order_patterns(period, days, store_id))["data"]
+    else:
+        data = (await get_fraud_trends(period, days, store_id))["data"]
+    
+    key, image = await chart_renderer.render(chart, data, format, width, height)
+    etag = f'"{key[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=image, media_type=FORMATS[format], headers=headers)
+
+def period_days(period: str) -> int:
+    """Number of days covered by a period string such as "7d" """
+    return 30 if period == "30d" else 7 if period == "7d" else 90
+
 def generate_trend_data(days: int):
     """Generate mock trend data"""
     trend = []
@@ -153,7 +252,113 @@ def generate_daily_fraud_trends(days: int):
             "date": (datetime.now() - timedelta(days=days-i-1)).strftime("%Y-%m-%d"),
             "fraud_attempts": random.randint(0, 10),
             "blocked": random.randint(0, 8),
-            "successful": random.randint(0, 3)
+            "reviewed": random.randint(0, 3)
         })
     
-    return trends 
\ No newline at end of file
+    return trends
+
+# ============================================================================
+# ROLLUP-BACKED RESPONSES
+# ============================================================================
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+def _percentages(counts) -> list:
+    """Integer percentage share of each count"""
+    total = float(np.sum(counts))
+    if not total:
+        return [0] * len(counts)
+    return [int(round(100 * c / total)) for c in np.asarray(counts).tolist()]
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
+
+def rollup_overview(period: str, days: int, store_id: str = None) -> dict:
+    """Analytics overview read from the daily rollups"""
+    dates, rows = rollups.daily(days, store_id)
+    totals = rows.sum(axis=0)
+    orders = totals[COLUMN_INDEX["orders"]]
+    labels = [d.strftime("%Y-%m-%d") for d in dates]
+    
+    def series(column: str) -> list:
+        values = rows[:, COLUMN_INDEX[column]].round(2).tolist()
+        return [{"date": label, "value": value} for label, value in zip(labels, values)]
+    
+    return {
+        "period": period,
+        "total_orders": int(orders),
+        "total_revenue": round(float(totals[COLUMN_INDEX["revenue"]]), 2),
+        "average_order_value": round(_ratio(totals[COLUMN_INDEX["revenue"]], orders), 2),
+        "fraud_rate": round(_ratio(totals[COLUMN_INDEX["fraud_attempts"]], orders), 4),
+        "blocked_orders": int(totals[COLUMN_INDEX["blocked"]]),
+        "suspicious_activity": int(totals[COLUMN_INDEX["fraud_attempts"]]),
+        "security_score": round(1 - _ratio(totals[COLUMN_INDEX["high_risk"]], orders), 3),
+        "total_loss_prevented": round(float(totals[COLUMN_INDEX["blocked_revenue"]]), 2),
+        "active_stores": rollups.active_stores(days) if store_id is None else int(orders > 0),
+        "trends": {
+            "orders_trend": series("orders"),
+            "revenue_trend": series("revenue"),
+            "fraud_trend": series("fraud_attempts")
+        }
+    }
+
+def rollup_fraud_trends(period: str, days: int, store_id: str = None) -> dict:
+    """Fraud trends read from the daily rollups"""
+    dates, rows = rollups.daily(days, store_id)
+    totals = rows.sum(axis=0)
+    daily = rows[:, [COLUMN_INDEX["fraud_attempts"], COLUMN_INDEX["blocked"], COLUMN_INDEX["reviewed"]]]
+    risk = _percentages(totals[[COLUMN_INDEX["low_risk"], COLUMN_INDEX["medium_risk"], COLUMN_INDEX["high_risk"]]])
+    
+    return {
+        "period": period,
+        "total_fraud_attempts": int(totals[COLUMN_INDEX["fraud_attempts"]]),
+        "reviewed_orders": int(totals[COLUMN_INDEX["reviewed"]]),
+        "blocked_fraud": int(totals[COLUMN_INDEX["blocked"]]),
+        "fraud_types": {
+            fraud_type: int(totals[COLUMN_INDEX[fraud_type]])
+            for fraud_type in ("payment_fraud", "account_takeover", "friendly_fraud", "identity_theft")
+        },
+        "daily_trends": [
+            {
+                "date": d.strftime("%Y-%m-%d"),
+                "fraud_attempts": attempts,
+                "blocked": blocked,
+                "reviewed": reviewed
+            }
+            for d, (attempts, blocked, reviewed) in zip(dates, daily.astype(int).tolist())
+        ],
+        "risk_distribution": {
+            "low_risk": risk[0],
+            "medium_risk": risk[1],
+            "high_risk": risk[2]
+        }
+    }
+
+def rollup_order_patterns(period: str, days: int, store_id: str = None) -> dict:
+    """Order patterns read from the hourly and daily rollups"""
+    orders = COLUMN_INDEX["orders"]
+    hours_of_day, _, hourly_rows = rollups.hourly(days * 24, store_id)
+    by_hour = np.bincount(hours_of_day, weights=hourly_rows[:, orders], minlength=24)
+    time_of_day = _percentages([by_hour[6:12].sum(), by_hour[12:18].sum(), by_hour[18:24].sum(), by_hour[0:6].sum()])
+    
+    dates, daily_rows = rollups.daily(days, store_id)
+    weekdays = np.array([d.weekday() for d in dates])
+    by_weekday = _percentages(np.bincount(weekdays, weights=daily_rows[:, orders], minlength=7))
+    totals = daily_rows.sum(axis=0)
+    values = _percentages(totals[[COLUMN_INDEX["low_value"], COLUMN_INDEX["medium_value"], COLUMN_INDEX["high_value"]]])
+    
+    return {
+        "period": period,
+        "total_orders": int(totals[orders]),
+        "patterns": {
+            "time_distribution": dict(zip(["morning", "afternoon", "evening", "night"], time_of_day)),
+            "day_distribution": dict(zip(WEEKDAYS, by_weekday)),
+            "value_distribution": dict(zip(["low_value", "medium_value", "high_value"], values))
+        },
+        "suspicious_patterns": {
+            "rapid_orders": int(totals[COLUMN_INDEX["rapid_orders"]]),
+            "high_value_orders": int(totals[COLUMN_INDEX["high_value"]]),
+            "multiple_addresses": int(totals[COLUMN_INDEX["multiple_addresses"]]),
+            "unusual_timing": int(totals[COLUMN_INDEX["unusual_timing"]])
+        }
+    }
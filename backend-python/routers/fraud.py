@@ -1,64 +1,128 @@
 from fastapi import APIRouter, HTTPException
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import List, Optional
+import hashlib
 import random
 import json
+import os
+
+import numpy as np
+
+from services.velocity import velocity_detector
+from services.rule_engine import pattern_registry
+from services.model_registry import FRAUD_MODEL, model_registry
+from services.training import TrainingBusyError, training_runner
+from services.lru import LRUCache
+from services import metrics
 
 router = APIRouter()
 
+# Rule weights shared by the single-order and batch scoring paths
+RISK_SCORE_BASE = 0.5
+HIGH_VALUE_ORDER_THRESHOLD = 1000
+HIGH_VALUE_ORDER_WEIGHT = 0.2
+RISK_SCORE_WEIGHTS = {
+    "new_customer": 0.15,
+    "international_shipping": 0.1,
+    "multiple_payment_methods": 0.2,
+    "rapid_ordering": 0.2
+}
+FRAUD_PROBABILITY_BASE = 0.1
+FRAUD_PROBABILITY_WEIGHT = 0.15
+FRAUD_PROBABILITY_FACTORS = [
+    "high_value",
+    "new_customer",
+    "unusual_timing",
+    "multiple_addresses"
+]
+
+FRAUD_TYPES = [
+    "payment_fraud",
+    "account_takeover",
+    "friendly_fraud",
+    "identity_theft",
+    "none"
+]
+
+# Inputs that determine a rule-based score; identical vectors score identically
+SCORING_FEATURES = (
+    "order_value",
+    "high_value",
+    "new_customer",
+    "international_shipping",
+    "multiple_payment_methods",
+    "multiple_addresses",
+    "unusual_timing",
+    "rapid_ordering"
+)
+
+MAX_BATCH_SIZE = 10000
+
+# deterministic: score jitter is derived from a seeded hash of the feature vector
+# random: fresh jitter on every call (no memoization)
+SCORING_MODE = os.getenv("SCORING_MODE", "deterministic")
+SCORING_SEED = os.getenv("SCORING_SEED", "0")
+
+score_cache = LRUCache(int(os.getenv("SCORE_CACHE_SIZE", 50000)))
+
 @router.post("/analyze")
 async def analyze_fraud_potential(data: dict):
     """Analyze data for fraud potential using ML models"""
     try:
-        # Mock ML analysis
-        risk_score = calculate_risk_score(data)
-        fraud_probability = calculate_fraud_probability(data)
+        analysis = await score_order(data)
         
-        analysis = {
-            "risk_score": round(risk_score, 3),
-            "fraud_probability": round(fraud_probability, 3),
-            "risk_level": get_risk_level(risk_score),
-            "fraud_type": predict_fraud_type(data),
-            "confidence": round(random.uniform(0.7, 0.95), 3),
-            "factors": analyze_risk_factors(data),
-            "recommendation": get_recommendation(risk_score, fraud_probability),
-            "timestamp": datetime.now().isoformat()
+        return {
+            "success": True,
+            "data": analysis
         }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analyze/batch")
+async def analyze_fraud_potential_batch(orders: List[dict]):
+    """Analyze a batch of orders for fraud potential in one vectorized pass"""
+    if len(orders) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(orders)} orders (max {MAX_BATCH_SIZE})"
+        )
+    try:
+        fraud_probabilities = await model_registry.predict_many_async(FRAUD_MODEL, orders)
+        analyses = analyze_batch(orders, fraud_probabilities)
         
         return {
             "success": True,
-            "data": analysis
+            "data": {
+                "results": analyses,
+                "total": len(analyses)
+            }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/velocity/{dimension}/{key}")
+async def get_velocity(dimension: str, key: str, seconds: int = 600):
+    """Get how many orders a customer, IP, card or address placed recently"""
+    if dimension not in velocity_detector.DIMENSIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown velocity dimension: {dimension}")
+    
+    return {
+        "success": True,
+        "data": {
+            "dimension": dimension,
+            "key": key,
+            "window_seconds": seconds,
+            "orders": velocity_detector.count(dimension, key, seconds),
+            "distinct_values": velocity_detector.distinct(dimension, key, seconds)
+        }
+    }
+
 @router.get("/models/status")
 async def get_ml_models_status():
     """Get status of ML models"""
     return {
         "success": True,
-        "data": {
-            "fraud_detection_model": {
-                "status": "active",
-                "version": "1.2.0",
-                "accuracy": round(random.uniform(0.85, 0.95), 3),
-                "last_updated": (datetime.now() - timedelta(days=random.randint(1, 30))).isoformat(),
-                "training_samples": random.randint(10000, 100000)
-            },
-            "risk_assessment_model": {
-                "status": "active",
-                "version": "1.1.5",
-                "accuracy": round(random.uniform(0.80, 0.90), 3),
-                "last_updated": (datetime.now() - timedelta(days=random.randint(1, 30))).isoformat(),
-                "training_samples": random.randint(8000, 80000)
-            },
-            "pattern_recognition_model": {
-                "status": "active",
-                "version": "1.0.8",
-                "accuracy": round(random.uniform(0.75, 0.85), 3),
-                "last_updated": (datetime.now() - timedelta(days=random.randint(1, 30))).isoformat(),
-                "training_samples": random.randint(5000, 50000)
-            }
-        }
+        "data": model_registry.status()
     }
 
 @router.get("/patterns/{pattern_type}")
@@ -118,64 +182,238 @@ async def get_fraud_patterns(pattern_type: str):
         }
     }
 
-@router.post("/train")
+@router.post("/train", status_code=202)
 async def train_ml_models():
-    """Trigger ML model training"""
-    # Mock training process
-    training_results = {
-        "fraud_detection_model": {
-            "status": "training",
-            "progress": 0,
-            "estimated_completion": (datetime.now() + timedelta(hours=2)).isoformat(),
-            "new_accuracy": round(random.uniform(0.88, 0.96), 3)
-        },
-        "risk_assessment_model": {
-            "status": "training",
-            "progress": 0,
-            "estimated_completion": (datetime.now() + timedelta(hours=1.5)).isoformat(),
-            "new_accuracy": round(random.uniform(0.82, 0.92), 3)
-        }
-    }
+    """Start a background training job for the fraud model"""
+    try:
+        job = training_runner.start(model_registry)
+    except TrainingBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {
         "success": True,
         "message": "ML model training initiated",
-        "data": training_results
+        "data": job
+    }
+
+@router.get("/train")
+async def list_training_jobs(limit: int = 20):
+    """List recent training jobs"""
+    return {
+        "success": True,
+        "data": training_runner.list(limit)
     }
 
-def calculate_risk_score(data: dict) -> float:
+@router.get("/train/{job_id}")
+async def get_training_job(job_id: str):
+    """Poll a training job's status and progress"""
+    job = training_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    
+    return {
+        "success": True,
+        "data": job
+    }
+
+def build_analysis(data: dict, fraud_probability: Optional[float] = None) -> dict:
+    """Run the single-order scoring pipeline over a feature dict
+    
+    `fraud_probability` comes from the trained model when one is loaded;
+    otherwise the rule-based estimate is used.
+    """
+    noise = scoring_noise(data)
+    risk_score = calculate_risk_score(data, noise[0])
+    if fraud_probability is None:
+        fraud_probability = calculate_fraud_probability(data, noise[1])
+    matched = pattern_registry.evaluate(data)
+    risk_score = apply_pattern_scores(risk_score, matched)
+    
+    return {
+        "risk_score": round(risk_score, 3),
+        "fraud_probability": round(fraud_probability, 3),
+        "risk_level": get_risk_level(risk_score),
+        "fraud_type": predict_fraud_type(data, noise[2]),
+        "confidence": round(_jitter(noise[3], 0.7, 0.95), 3),
+        "factors": analyze_risk_factors(data),
+        "recommendation": apply_pattern_actions(get_recommendation(risk_score, fraud_probability), matched),
+        "matched_patterns": [rule.pattern_id for rule in matched],
+        "timestamp": datetime.now().isoformat()
+    }
+
+async def score_order(data: dict) -> dict:
+    """build_analysis behind a memo cache keyed on the content of the scoring inputs
+    
+    Webhook retries and duplicate deliveries of the same order are answered
+    from the cache instead of being rescored.
+    """
+    key = score_cache_key(data) if SCORING_MODE == "deterministic" else None
+    if key is not None:
+        cached = score_cache.get(key)
+        if cached is not None:
+            record_scored([cached], "single")
+            return dict(cached, timestamp=datetime.now().isoformat())
+    
+    fraud_probability = await model_registry.predict(FRAUD_MODEL, data)
+    analysis = build_analysis(data, fraud_probability)
+    record_scored([analysis], "single")
+    if key is not None:
+        score_cache.put(key, analysis)
+    return dict(analysis)
+
+def record_scored(analyses: List[dict], mode: str):
+    """Count scored orders, memo-cache hits included, by risk level and recommendation for /metrics"""
+    metrics.orders_scored.inc((mode,), len(analyses))
+    # Tallied locally first: a batch has only a handful of distinct values
+    levels, recommendations = {}, {}
+    for analysis in analyses:
+        levels[analysis["risk_level"]] = levels.get(analysis["risk_level"], 0) + 1
+        recommendations[analysis["recommendation"]] = recommendations.get(analysis["recommendation"], 0) + 1
+    for level, count in levels.items():
+        metrics.risk_levels.inc((level,), count)
+    for recommendation, count in recommendations.items():
+        metrics.recommendations.inc((recommendation,), count)
+
+def score_cache_key(data: dict) -> bytes:
+    """Content hash of everything that can influence an order's analysis"""
+    store_id = data.get("store_id")
+    model = model_registry.get(FRAUD_MODEL)
+    features = set(SCORING_FEATURES) | set(pattern_registry.features_used(store_id))
+    if model is not None:
+        features |= set(model.features)
+    parts = [
+        repr(store_id),
+        pattern_registry.generation,
+        model.path if model is not None else None,
+        [(feature, repr(data.get(feature))) for feature in sorted(features)]
+    ]
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).digest()
+
+def scoring_noise(data: dict) -> tuple:
+    """Four uniforms in [0, 1) used as score, probability, fraud type and confidence jitter
+    
+    In deterministic mode they come from a seeded hash of the feature vector,
+    so identical orders always produce identical analyses.
+    """
+    if SCORING_MODE != "deterministic":
+        return tuple(random.random() for _ in range(4))
+    vector = "|".join(repr(_scoring_value(data.get(feature))) for feature in SCORING_FEATURES)
+    digest = hashlib.blake2b(f"{SCORING_SEED}|{vector}".encode("utf-8"), digest_size=32).digest()
+    return tuple(int.from_bytes(digest[i:i + 8], "little") / 2 ** 64 for i in range(0, 32, 8))
+
+def _scoring_value(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+def _jitter(u, low: float, high: float):
+    """Map uniform(s) in [0, 1) onto [low, high)"""
+    return low + (high - low) * u
+
+def apply_pattern_scores(risk_score: float, matched: list) -> float:
+    """Raise the risk score to the highest score of any matched custom pattern"""
+    return max([risk_score] + [rule.risk_score for rule in matched])
+
+def apply_pattern_actions(recommendation: str, matched: list) -> str:
+    """Escalate a recommendation to the most severe action of any matched pattern"""
+    severity = {"allow": 0, "review": 1, "block": 2}
+    for rule in matched:
+        if severity[rule.action] > severity[recommendation]:
+            recommendation = rule.action
+    return recommendation
+
+def extract_order_features(order: dict) -> dict:
+    """Derive scoring features from a raw Shopify order payload"""
+    customer = order.get("customer") or {}
+    shipping = order.get("shipping_address") or {}
+    billing = order.get("billing_address") or {}
+    
+    order_value = float(order.get("order_value", order.get("total_price", 0)) or 0)
+    ordered_at = _parse_datetime(order.get("created_at"))
+    customer_since = _parse_datetime(customer.get("created_at"))
+    # Hour in the order's own timezone, as reported by Shopify
+    order_hour = ordered_at.hour if ordered_at else None
+    gateways = order.get("payment_gateway_names") or []
+    
+    flags = {
+        "order_value": order_value,
+        "high_value": order_value > HIGH_VALUE_ORDER_THRESHOLD,
+        "new_customer": bool(customer) and (customer.get("orders_count") or 0) <= 1,
+        "international_shipping": bool(shipping.get("country_code") and billing.get("country_code"))
+            and shipping.get("country_code") != billing.get("country_code"),
+        "multiple_payment_methods": len(gateways) > 1,
+        "multiple_addresses": bool(shipping.get("address1") and billing.get("address1"))
+            and shipping.get("address1") != billing.get("address1"),
+        "unusual_timing": order_hour is not None and order_hour < 6
+    }
+    # Explicit feature flags sent by the caller win over derived ones
+    flags.update({k: order[k] for k in flags if k in order})
+    
+    return {
+        **flags,
+        "customer_id": customer.get("id", order.get("customer_id")),
+        "store_id": order.get("store_id"),
+        "created_at": ordered_at.timestamp() if ordered_at else None,
+        "customer_created_at": customer_since.timestamp() if customer_since else None,
+        "payment_method": ",".join(gateways) or None,
+        "shipping_address": _address_key(shipping),
+        "customer_ip": order.get("browser_ip") or (order.get("client_details") or {}).get("browser_ip"),
+        "card_fingerprint": _card_fingerprint(order.get("payment_details") or {})
+    }
+
+def _parse_datetime(value):
+    """Parse an ISO-8601 timestamp, or None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _address_key(address: dict):
+    """Normalized identity of a postal address"""
+    parts = [address.get(k) for k in ("address1", "address2", "city", "zip", "country_code")]
+    key = "|".join(str(p).strip().lower() for p in parts if p)
+    return key or None
+
+def _card_fingerprint(payment_details: dict):
+    """Card identity from BIN, masked number and brand; never the full PAN"""
+    parts = [
+        payment_details.get("credit_card_bin"),
+        (payment_details.get("credit_card_number") or "")[-4:],
+        payment_details.get("credit_card_company")
+    ]
+    if not any(parts):
+        return None
+    return ":".join(str(p or "") for p in parts)
+
+def calculate_risk_score(data: dict, noise: float) -> float:
     """Calculate risk score based on input data"""
-    base_score = 0.5
+    base_score = RISK_SCORE_BASE
     
     # Mock risk factors
-    if data.get("order_value", 0) > 1000:
-        base_score += 0.2
-    if data.get("new_customer", False):
-        base_score += 0.15
-    if data.get("international_shipping", False):
-        base_score += 0.1
-    if data.get("multiple_payment_methods", False):
-        base_score += 0.2
+    if data.get("order_value", 0) > HIGH_VALUE_ORDER_THRESHOLD:
+        base_score += HIGH_VALUE_ORDER_WEIGHT
+    for feature, weight in RISK_SCORE_WEIGHTS.items():
+        if data.get(feature, False):
+            base_score += weight
     
-    return min(1.0, base_score + random.uniform(-0.1, 0.1))
+    return min(1.0, base_score + _jitter(noise, -0.1, 0.1))
 
-def calculate_fraud_probability(data: dict) -> float:
-    """Calculate fraud probability using ML model"""
-    # Mock ML prediction
-    base_prob = 0.1
+def calculate_fraud_probability(data: dict, noise: float) -> float:
+    """Rule-based fraud probability, used until a trained model is loaded"""
+    base_prob = FRAUD_PROBABILITY_BASE
     
-    risk_factors = [
-        data.get("high_value", False),
-        data.get("new_customer", False),
-        data.get("unusual_timing", False),
-        data.get("multiple_addresses", False)
-    ]
+    risk_factors = [data.get(feature, False) for feature in FRAUD_PROBABILITY_FACTORS]
     
     for factor in risk_factors:
         if factor:
-            base_prob += 0.15
+            base_prob += FRAUD_PROBABILITY_WEIGHT
     
-    return min(1.0, base_prob + random.uniform(-0.05, 0.05))
+    return min(1.0, base_prob + _jitter(noise, -0.05, 0.05))
 
 def get_risk_level(risk_score: float) -> str:
     """Get risk level based on score"""
@@ -186,23 +424,15 @@ def get_risk_level(risk_score: float) -> str:
     else:
         return "low"
 
-def predict_fraud_type(data: dict) -> str:
+def predict_fraud_type(data: dict, noise: float) -> str:
     """Predict type of fraud"""
-    fraud_types = [
-        "payment_fraud",
-        "account_takeover",
-        "friendly_fraud",
-        "identity_theft",
-        "none"
-    ]
-    
     # Mock prediction logic
     if data.get("high_value", False):
         return "payment_fraud"
     elif data.get("new_customer", False):
         return "account_takeover"
     else:
-        return random.choice(fraud_types)
+        return FRAUD_TYPES[int(noise * len(FRAUD_TYPES))]
 
 def analyze_risk_factors(data: dict) -> list:
     """Analyze and return risk factors"""
@@ -218,6 +448,10 @@ def analyze_risk_factors(data: dict) -> list:
         factors.append("multiple_shipping_addresses")
     if data.get("international_shipping", False):
         factors.append("international_shipping")
+    if data.get("multiple_payment_methods", False):
+        factors.append("multiple_payment_methods")
+    if data.get("rapid_ordering", False):
+        factors.append("rapid_order_placement")
     
     return factors
 
@@ -228,4 +462,100 @@ def get_recommendation(risk_score: float, fraud_probability: float) -> str:
     elif risk_score > 0.5 or fraud_probability > 0.4:
         return "review"
     else:
-        return "allow" 
\ No newline at end of file
+        return "allow"
+
+# ============================================================================
+# BATCH SCORING
+# ============================================================================
+
+def _feature_column(orders: List[dict], feature: str) -> np.ndarray:
+    """Extract a boolean feature column from a list of orders"""
+    return np.fromiter((bool(o.get(feature, False)) for o in orders), dtype=bool, count=len(orders))
+
+def scoring_noise_matrix(orders: List[dict]) -> np.ndarray:
+    """scoring_noise for every order, one row per order"""
+    return np.array([scoring_noise(o) for o in orders]).reshape(len(orders), 4)
+
+def calculate_risk_scores(orders: List[dict], noise: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_risk_score over a batch of orders"""
+    n = len(orders)
+    order_values = np.fromiter((o.get("order_value", 0) for o in orders), dtype=float, count=n)
+    
+    scores = np.full(n, RISK_SCORE_BASE)
+    scores += np.where(order_values > HIGH_VALUE_ORDER_THRESHOLD, HIGH_VALUE_ORDER_WEIGHT, 0.0)
+    for feature, weight in RISK_SCORE_WEIGHTS.items():
+        scores += np.where(_feature_column(orders, feature), weight, 0.0)
+    
+    return np.minimum(1.0, scores + _jitter(noise, -0.1, 0.1))
+
+def calculate_fraud_probabilities(orders: List[dict], noise: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_fraud_probability over a batch of orders"""
+    n = len(orders)
+    probs = np.full(n, FRAUD_PROBABILITY_BASE)
+    for feature in FRAUD_PROBABILITY_FACTORS:
+        probs += np.where(_feature_column(orders, feature), FRAUD_PROBABILITY_WEIGHT, 0.0)
+    
+    return np.minimum(1.0, probs + _jitter(noise, -0.05, 0.05))
+
+def get_risk_levels(risk_scores: np.ndarray) -> np.ndarray:
+    """Vectorized get_risk_level"""
+    return np.select([risk_scores > 0.7, risk_scores > 0.3], ["high", "medium"], default="low")
+
+def get_recommendations(risk_scores: np.ndarray, fraud_probabilities: np.ndarray) -> np.ndarray:
+    """Vectorized get_recommendation"""
+    return np.select(
+        [
+            (risk_scores > 0.8) | (fraud_probabilities > 0.7),
+            (risk_scores > 0.5) | (fraud_probabilities > 0.4)
+        ],
+        ["block", "review"],
+        default="allow"
+    )
+
+def analyze_batch(orders: List[dict], fraud_probabilities: Optional[np.ndarray] = None) -> List[dict]:
+    """Score a batch of orders, returning one analysis per order in input order"""
+    if not orders:
+        return []
+    
+    noise = scoring_noise_matrix(orders)
+    risk_scores = calculate_risk_scores(orders, noise[:, 0])
+    if fraud_probabilities is None:
+        fraud_probabilities = calculate_fraud_probabilities(orders, noise[:, 1])
+    matches = [pattern_registry.evaluate(order) for order in orders]
+    for i, matched in enumerate(matches):
+        if matched:
+            risk_scores[i] = apply_pattern_scores(risk_scores[i], matched)
+    risk_levels = get_risk_levels(risk_scores).tolist()
+    recommendations = [
+        apply_pattern_actions(recommendation, matched)
+        for recommendation, matched in zip(get_recommendations(risk_scores, fraud_probabilities).tolist(), matches)
+    ]
+    confidences = _jitter(noise[:, 3], 0.7, 0.95).tolist()
+    timestamp = datetime.now().isoformat()
+    
+    # Round as Python floats so each result matches the single-order path exactly
+    analyses = [
+        {
+            "risk_score": round(risk_score, 3),
+            "fraud_probability": round(fraud_probability, 3),
+            "risk_level": risk_level,
+            "fraud_type": predict_fraud_type(order, fraud_type_noise),
+            "confidence": round(confidence, 3),
+            "factors": analyze_risk_factors(order),
+            "recommendation": recommendation,
+            "matched_patterns": [rule.pattern_id for rule in matched],
+            "timestamp": timestamp
+        }
+        for order, matched, risk_score, fraud_probability, risk_level, confidence, recommendation, fraud_type_noise in zip(
+            orders,
+            matches,
+            risk_scores.tolist(),
+            fraud_probabilities.tolist(),
+            risk_levels,
+            confidences,
+            recommendations,
+            noise[:, 2].tolist()
+        )
+    ]
+    record_scored(analyses, "batch")
+    return analyses
@@ -1,29 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, HTTPException
 from datetime import datetime, timedelta
 import random
 import json
 
-router = APIRouter()
+from services.alert_store import alert_store
+from services.analysis_store import analysis_store
+from services.customer_aggregates import customer_aggregates
 
-# Mock data storage (replace with database)
-security_alerts = []
-fraud_analyses = {}
+router = APIRouter()
+# Order/customer lookups; mounted at the app root as well as under /security
+lookup_router = APIRouter()
 
 @router.get("/alerts")
 async def get_security_alerts():
     """Get recent security alerts"""
-    # Generate mock alerts
-    if not security_alerts:
-        generate_mock_alerts()
+    counts = alert_store.severity_counts()
     
     return {
         "success": True,
         "data": {
-            "alerts": security_alerts[-10:],  # Last 10 alerts
-            "total": len(security_alerts),
-            "critical": len([a for a in security_alerts if a["severity"] == "critical"]),
-            "high": len([a for a in security_alerts if a["severity"] == "high"]),
-            "medium": len([a for a in security_alerts if a["severity"] == "medium"])
+            "alerts": alert_store.recent(10),  # Last 10 alerts
+            "total": sum(counts.values()),
+            "critical": counts.get("critical", 0),
+            "high": counts.get("high", 0),
+            "medium": counts.get("medium", 0)
         }
     }
 
@@ -62,103 +62,79 @@ async def get_security_dashboard():
         }
     }
 
-@router.get("/fraud/order/{order_id}")
+@lookup_router.get("/fraud/order/{order_id}")
 async def get_fraud_analysis(order_id: str):
     """Get fraud analysis for specific order"""
-    # Generate mock fraud analysis
-    risk_score = random.uniform(0, 1)
-    is_suspicious = risk_score > 0.7
-    
-    analysis = {
-        "order_id": order_id,
-        "risk_score": round(risk_score, 3),
-        "is_suspicious": is_suspicious,
-        "risk_level": "high" if risk_score > 0.7 else "medium" if risk_score > 0.3 else "low",
-        "factors": generate_risk_factors(),
-        "recommendation": "block" if is_suspicious else "allow",
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    fraud_analyses[order_id] = analysis
+    stored = analysis_store.get_order_analysis(order_id)
+    if stored is not None:
+        return {
+            "success": True,
+            "data": stored
+        }
+    raise HTTPException(status_code=404, detail=f"No stored analysis for order {order_id}")
+
+@lookup_router.post("/fraud/order/{order_id}/label")
+async def label_order(order_id: str, fraudulent: bool = Body(..., embed=True)):
+    """Record whether an analyzed order turned out to be fraud, for model training"""
+    analysis = analysis_store.label_order_analysis(order_id, fraudulent)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail=f"No stored analysis for order {order_id}")
     
     return {
         "success": True,
         "data": analysis
     }
 
-@router.get("/risk/customer/{customer_id}")
+@lookup_router.get("/risk/customer/{customer_id}")
 async def get_customer_risk(customer_id: str):
     """Get risk assessment for specific customer"""
-    # Generate mock risk assessment
-    risk_score = random.uniform(0, 1)
+    aggregate = customer_aggregates.get(customer_id)
+    if aggregate is not None:
+        return {
+            "success": True,
+            "data": build_customer_assessment(aggregate)
+        }
+    
+    stored = analysis_store.get_customer_analysis(customer_id)
+    if stored is not None:
+        return {
+            "success": True,
+            "data": stored
+        }
+    raise HTTPException(status_code=404, detail=f"No risk data for customer {customer_id}")
+
+def build_customer_assessment(aggregate) -> dict:
+    """Build a customer risk assessment from running order aggregates"""
+    risk_score = aggregate.average_risk_score
+    if aggregate.total_orders:
+        risk_score = max(risk_score, aggregate.suspicious_orders / aggregate.total_orders)
     risk_level = "high" if risk_score > 0.7 else "medium" if risk_score > 0.3 else "low"
     
-    assessment = {
-        "customer_id": customer_id,
+    risk_factors = []
+    if aggregate.account_age_days() < 30:
+        risk_factors.append("new_account")
+    if aggregate.shipping_addresses.count() > 1:
+        risk_factors.append("multiple_addresses")
+    if aggregate.payment_methods.count() > 1:
+        risk_factors.append("multiple_payment_methods")
+    if aggregate.suspicious_orders:
+        risk_factors.append("suspicious_order_history")
+    
+    summary = aggregate.to_dict()
+    return {
+        "customer_id": aggregate.customer_id,
         "risk_score": round(risk_score, 3),
         "risk_level": risk_level,
-        "risk_factors": generate_customer_risk_factors(),
+        "risk_factors": risk_factors,
         "order_history": {
-            "total_orders": random.randint(1, 50),
-            "suspicious_orders": random.randint(0, 5),
-            "total_spent": random.uniform(100, 10000),
-            "average_order_value": random.uniform(50, 500)
+            "total_orders": summary["total_orders"],
+            "suspicious_orders": summary["suspicious_orders"],
+            "total_spent": summary["total_spent"],
+            "average_order_value": summary["average_order_value"],
+            "payment_methods": summary["payment_methods"],
+            "shipping_addresses": summary["shipping_addresses"],
+            "last_order": summary["last_order"]
         },
         "recommendation": "monitor" if risk_level == "high" else "normal",
         "timestamp": datetime.now().isoformat()
     }
-    
-    return {
-        "success": True,
-        "data": assessment
-    }
-
-def generate_mock_alerts():
-    """Generate mock security alerts"""
-    alert_types = [
-        "fraud_detected",
-        "suspicious_login",
-        "unusual_activity",
-        "multiple_failed_attempts",
-        "high_value_order",
-        "new_device_login"
-    ]
-    
-    severities = ["low", "medium", "high", "critical"]
-    
-    for i in range(50):
-        alert = {
-            "id": f"alert_{i+1}",
-            "type": random.choice(alert_types),
-            "severity": random.choice(severities),
-            "message": f"Security alert #{i+1}",
-            "timestamp": (datetime.now() - timedelta(hours=random.randint(1, 168))).isoformat(),
-            "resolved": random.choice([True, False])
-        }
-        security_alerts.append(alert)
-
-def generate_risk_factors():
-    """Generate mock risk factors for orders"""
-    factors = [
-        "high_value_order",
-        "new_customer",
-        "unusual_shipping_address",
-        "multiple_payment_methods",
-        "rapid_order_placement",
-        "international_shipping"
-    ]
-    
-    return random.sample(factors, random.randint(1, 4))
-
-def generate_customer_risk_factors():
-    """Generate mock risk factors for customers"""
-    factors = [
-        "new_account",
-        "multiple_addresses",
-        "high_order_frequency",
-        "payment_declines",
-        "suspicious_ip",
-        "unusual_browsing_pattern"
-    ]
-    
-    return random.sample(factors, random.randint(1, 3)) 
\ No newline at end of file
@@ -0,0 +1,324 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+# Every listing is ordered newest first by (created_at, alert_id); each filter
+# column leads an index ending in that key, so a filtered page is an index range
+# scan that stops after `limit` rows wherever the cursor falls.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS security_alerts (
+    alert_id TEXT PRIMARY KEY,
+    type TEXT,
+    severity TEXT,
+    store_id TEXT,
+    resolved INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_security_alerts_created ON security_alerts (created_at, alert_id);
+CREATE INDEX IF NOT EXISTS idx_security_alerts_type ON security_alerts (type, created_at, alert_id);
+CREATE INDEX IF NOT EXISTS idx_security_alerts_severity ON security_alerts (severity, created_at, alert_id);
+CREATE INDEX IF NOT EXISTS idx_security_alerts_store ON security_alerts (store_id, created_at, alert_id);
+CREATE INDEX IF NOT EXISTS idx_security_alerts_resolved ON security_alerts (resolved, created_at, alert_id);
+CREATE INDEX IF NOT EXISTS idx_security_alerts_store_open ON security_alerts (store_id, resolved, created_at, alert_id);
+
+-- Totals per (scope, type, severity), where scope is '*' or a store id, kept
+-- in step with security_alerts by triggers so counts never scan alerts
+CREATE TABLE IF NOT EXISTS security_alert_counts (
+    scope TEXT NOT NULL,
+    type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    open INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, type, severity)
+) WITHOUT ROWID;
+
+-- Alerts created per UTC day, kept in step by triggers like the totals above
+CREATE TABLE IF NOT EXISTS security_alert_daily_counts (
+    day TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+COUNT_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS security_alerts_count_insert AFTER INSERT ON security_alerts BEGIN
+    INSERT OR IGNORE INTO security_alert_counts (scope, type, severity)
+    SELECT scope, IFNULL(NEW.type, ''), IFNULL(NEW.severity, '')
+    FROM (SELECT '*' AS scope UNION ALL SELECT NEW.store_id WHERE NEW.store_id IS NOT NULL);
+    UPDATE security_alert_counts SET total = total + 1, open = open + (NEW.resolved = 0)
+    WHERE scope IN ('*', IFNULL(NEW.store_id, '*'))
+      AND type = IFNULL(NEW.type, '') AND severity = IFNULL(NEW.severity, '');
+END;
+CREATE TRIGGER IF NOT EXISTS security_alerts_count_delete AFTER DELETE ON security_alerts BEGIN
+    UPDATE security_alert_counts SET total = total - 1, open = open - (OLD.resolved = 0)
+    WHERE scope IN ('*', IFNULL(OLD.store_id, '*'))
+      AND type = IFNULL(OLD.type, '') AND severity = IFNULL(OLD.severity, '');
+END;
+CREATE TRIGGER IF NOT EXISTS security_alerts_count_resolve AFTER UPDATE OF resolved ON security_alerts
+WHEN OLD.resolved != NEW.resolved BEGIN
+    UPDATE security_alert_counts SET open = open + (NEW.resolved = 0) - (OLD.resolved = 0)
+    WHERE scope IN ('*', IFNULL(NEW.store_id, '*'))
+      AND type = IFNULL(NEW.type, '') AND severity = IFNULL(NEW.severity, '');
+END;
+"""
+
+REBUILD_COUNTS = """
+DELETE FROM security_alert_counts;
+INSERT INTO security_alert_counts (scope, type, severity, total, open)
+SELECT scope, type, severity, COUNT(*), SUM(resolved = 0) FROM (
+    SELECT '*' AS scope, IFNULL(type, '') AS type, IFNULL(severity, '') AS severity, resolved FROM security_alerts
+    UNION ALL
+    SELECT store_id, IFNULL(type, ''), IFNULL(severity, ''), resolved FROM security_alerts WHERE store_id IS NOT NULL
+) GROUP BY scope, type, severity;
+"""
+
+DAILY_COUNT_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS security_alerts_daily_insert AFTER INSERT ON security_alerts BEGIN
+    INSERT INTO security_alert_daily_counts (day, total) VALUES (date(NEW.created_at, 'unixepoch'), 1)
+    ON CONFLICT (day) DO UPDATE SET total = total + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS security_alerts_daily_delete AFTER DELETE ON security_alerts BEGIN
+    UPDATE security_alert_daily_counts SET total = total - 1 WHERE day = date(OLD.created_at, 'unixepoch');
+END;
+"""
+
+REBUILD_DAILY_COUNTS = """
+DELETE FROM security_alert_daily_counts;
+INSERT INTO security_alert_daily_counts (day, total)
+SELECT date(created_at, 'unixepoch'), COUNT(*) FROM security_alerts GROUP BY 1;
+"""
+
+SELECT_COLUMNS = "alert_id, created_at, resolved, payload"
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a pagination cursor this store did not issue"""
+
+
+class AlertStore:
+    """Security alerts in SQLite, shared by every API worker
+
+    Pages are fetched with keyset cursors over indexed columns and per-severity
+    counts are maintained incrementally, so listing and counting cost the
+    same with millions of alerts as with fifty.
+    """
+
+    def __init__(self, db_path: str):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        has_triggers = self._conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = 'security_alerts_count_insert'"
+        ).fetchone()[0]
+        if not has_triggers:
+            # Backfill totals for alerts stored before the triggers existed
+            self._conn.executescript(f"BEGIN IMMEDIATE; {REBUILD_COUNTS} {COUNT_TRIGGERS} COMMIT;")
+        has_daily_triggers = self._conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = 'security_alerts_daily_insert'"
+        ).fetchone()[0]
+        if not has_daily_triggers:
+            self._conn.executescript(f"BEGIN IMMEDIATE; {REBUILD_DAILY_COUNTS} {DAILY_COUNT_TRIGGERS} COMMIT;")
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def create(self, alert: dict) -> dict:
+        """Store a new alert, assigning its id and creation time"""
+        alert = dict(alert)
+        alert["id"] = alert.get("id") or f"alert_{uuid.uuid4().hex[:12]}"
+        alert.setdefault("created_at", datetime.now().isoformat())
+        alert.setdefault("resolved", False)
+        self.add_many([alert])
+        return alert
+
+    def add_many(self, alerts: List[dict]) -> List[dict]:
+        """Insert alerts, skipping ids that already exist; returns the ones added"""
+        rows = [
+            (
+                str(alert["id"]),
+                _optional_str(alert.get("type")),
+                _optional_str(alert.get("severity")),
+                _optional_str(alert.get("store_id")),
+                int(bool(alert.get("resolved"))),
+                _timestamp(alert.get("created_at") or alert.get("timestamp")),
+                json.dumps(alert, default=str)
+            )
+            for alert in alerts
+        ]
+        added = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for alert, row in zip(alerts, rows):
+                if self._conn.execute(
+                    "INSERT OR IGNORE INTO security_alerts "
+                    "(alert_id, type, severity, store_id, resolved, created_at, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row
+                ).rowcount:
+                    added.append(alert)
+            self._conn.execute("COMMIT")
+        return added
+
+    def add(self, alert: dict) -> bool:
+        return len(self.add_many([alert])) == 1
+
+    def resolve(self, alert_id: str) -> Optional[dict]:
+        """Mark an alert resolved; returns it, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM security_alerts WHERE alert_id = ?", (alert_id,)).fetchone()
+            if row is None:
+                return None
+            alert = json.loads(row[0])
+            if not alert.get("resolved"):
+                alert["resolved"] = True
+                alert["resolved_at"] = datetime.now().isoformat()
+                self._conn.execute(
+                    "UPDATE security_alerts SET resolved = 1, payload = ? WHERE alert_id = ?",
+                    (json.dumps(alert, default=str), alert_id)
+                )
+        return alert
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def page(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        type: Optional[str] = None,
+        severity: Optional[str] = None,
+        store_id: Optional[str] = None,
+        resolved: Optional[bool] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Newest-first page of matching alerts and the cursor for the next page"""
+        clauses, params = _filters(type, severity, store_id, resolved)
+        if cursor is not None:
+            clauses.append("(created_at, alert_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {SELECT_COLUMNS} FROM security_alerts {where} "
+                "ORDER BY created_at DESC, alert_id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [json.loads(row[3]) for row in rows[:limit]], next_cursor
+
+    def last_position(self) -> int:
+        """Position of the newest stored alert, for tail()"""
+        with self._lock:
+            return self._conn.execute("SELECT IFNULL(MAX(rowid), 0) FROM security_alerts").fetchone()[0]
+
+    def tail(self, position: int, limit: int = 1000) -> Tuple[List[dict], int]:
+        """Alerts stored after `position` by any worker, in insertion order, and the new position"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, payload FROM security_alerts WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (position, limit)
+            ).fetchall()
+        if not rows:
+            return [], position
+        return [json.loads(payload) for _, payload in rows], rows[-1][0]
+
+    def recent(self, limit: int = 10) -> List[dict]:
+        """The `limit` newest alerts, oldest first"""
+        alerts, _ = self.page(limit)
+        return alerts[::-1]
+
+    def count(
+        self,
+        type: Optional[str] = None,
+        severity: Optional[str] = None,
+        store_id: Optional[str] = None,
+        resolved: Optional[bool] = None
+    ) -> int:
+        """Number of matching alerts, read from the maintained totals"""
+        column = "total" if resolved is None else "open" if not resolved else "total - open"
+        clauses = ["scope = ?"]
+        params = ["*" if store_id is None else str(store_id)]
+        if type is not None:
+            clauses.append("type = ?")
+            params.append(_optional_str(type))
+        if severity is not None:
+            clauses.append("severity = ?")
+            params.append(_optional_str(severity))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT SUM({column}) FROM security_alert_counts WHERE {' AND '.join(clauses)}", params
+            ).fetchone()
+        return row[0] or 0
+
+    def count_today(self) -> int:
+        """Alerts created so far on the current UTC day, read from the maintained totals"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total FROM security_alert_daily_counts WHERE day = ?",
+                (datetime.now(timezone.utc).date().isoformat(),)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def severity_counts(self, store_id: Optional[str] = None, open_only: bool = False) -> Dict[str, int]:
+        column = "open" if open_only else "total"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT severity, SUM({column}) FROM security_alert_counts WHERE scope = ? GROUP BY severity",
+                ("*" if store_id is None else str(store_id),)
+            ).fetchall()
+        return {severity: count for severity, count in rows if count}
+
+
+def encode_cursor(created_at: float, alert_id: str) -> str:
+    raw = json.dumps([created_at, alert_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        created_at, alert_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return [float(created_at), str(alert_id)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def _filters(type, severity, store_id, resolved) -> Tuple[list, list]:
+    clauses, params = [], []
+    for column, value in (("type", type), ("severity", severity), ("store_id", store_id)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(_optional_str(value))
+    if resolved is not None:
+        clauses.append("resolved = ?")
+        params.append(int(resolved))
+    return clauses, params
+
+
+def _optional_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if value:
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+alert_store = AlertStore(os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"))
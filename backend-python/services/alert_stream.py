@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANKS = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+
+class SubscriberLimitError(Exception):
+    """Raised when a worker already holds its maximum number of stream subscribers"""
+
+
+class Subscription:
+    """One stream client: its filters and a bounded buffer of pending alerts
+
+    When the client falls behind, the oldest pending alerts are dropped and
+    counted instead of growing the buffer or holding up the publisher.
+    """
+
+    __slots__ = ("store_id", "min_rank", "_buffer", "_ready", "dropped")
+
+    def __init__(self, store_id: Optional[str], min_rank: int, buffer_size: int):
+        self.store_id = store_id
+        self.min_rank = min_rank
+        self._buffer = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, alert: dict):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(alert)
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[dict]:
+        """Pending alerts, waiting up to `timeout` seconds; [] on timeout"""
+        if not self._buffer:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = list(self._buffer)
+        self._buffer.clear()
+        return batch
+
+
+class AlertBroadcaster:
+    """Fans alerts out to stream subscribers filtered by store and minimum severity
+
+    Subscribers are indexed by store, so publishing touches only the clients
+    that can match; each one gets its own bounded buffer.
+    """
+
+    def __init__(self, buffer_size: int = 100, max_subscribers: int = 10_000, heartbeat_seconds: float = 15.0):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat_seconds = heartbeat_seconds
+        self._by_store: Dict[Optional[str], Set[Subscription]] = {}
+        self._count = 0
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, store_id: Optional[str] = None, min_severity: Optional[str] = None) -> Subscription:
+        if self._count >= self.max_subscribers:
+            raise SubscriberLimitError(f"Alert stream is at its limit of {self.max_subscribers} subscribers")
+        subscription = Subscription(store_id, SEVERITY_RANKS.get(min_severity or "low", 0), self.buffer_size)
+        self._by_store.setdefault(store_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._by_store.get(subscription.store_id)
+        if subscribers is not None and subscription in subscribers:
+            subscribers.discard(subscription)
+            self._count -= 1
+            if not subscribers:
+                del self._by_store[subscription.store_id]
+
+    def publish(self, alerts: List[dict]) -> int:
+        """Offer alerts to every matching subscriber; never blocks"""
+        delivered = 0
+        for alert in alerts:
+            rank = SEVERITY_RANKS.get(alert.get("severity"), 0)
+            for key in (None, alert.get("store_id")):
+                for subscription in self._by_store.get(key, ()):
+                    if rank >= subscription.min_rank:
+                        subscription.offer(alert)
+                        delivered += 1
+                if key is None and alert.get("store_id") is None:
+                    break
+        self.published += len(alerts)
+        self.delivered += delivered
+        return delivered
+
+    async def relay(self, store, poll_seconds: float = 0.5):
+        """Publish alerts written by any worker, by tailing the shared alert store"""
+        position = store.last_position()
+        while True:
+            await asyncio.sleep(poll_seconds)
+            if not self._count:
+                position = store.last_position()
+                continue
+            try:
+                alerts, position = store.tail(position)
+            except Exception:
+                logger.exception("Alert stream relay failed")
+                continue
+            if alerts:
+                self.publish(alerts)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self._count,
+            "max_subscribers": self.max_subscribers,
+            "published_total": self.published,
+            "delivered_total": self.delivered,
+            "dropped_total": sum(s.dropped for subscribers in self._by_store.values() for s in subscribers)
+        }
+
+
+def sse_event(event: str, data, event_id: Optional[str] = None) -> bytes:
+    """One Server-Sent Events frame"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+alert_broadcaster = AlertBroadcaster(
+    buffer_size=int(os.getenv("ALERT_STREAM_BUFFER", 100)),
+    max_subscribers=int(os.getenv("ALERT_STREAM_MAX_SUBSCRIBERS", 10000)),
+    heartbeat_seconds=float(os.getenv("ALERT_STREAM_HEARTBEAT_SECONDS", 15))
+)
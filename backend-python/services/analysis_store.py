@@ -0,0 +1,323 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from services.lru import LRUCache
+
+PURGE_INTERVAL_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_analyses (
+    order_id TEXT PRIMARY KEY,
+    customer_id TEXT,
+    store_id TEXT,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    features TEXT,
+    origin TEXT,
+    ordered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_order_analyses_customer ON order_analyses (customer_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_order_analyses_store ON order_analyses (store_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_order_analyses_created ON order_analyses (created_at);
+
+CREATE TABLE IF NOT EXISTS customer_analyses (
+    customer_id TEXT PRIMARY KEY,
+    store_id TEXT,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_customer_analyses_store ON customer_analyses (store_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_customer_analyses_created ON customer_analyses (created_at);
+"""
+
+# Columns added after the first release, as (table, column, type)
+MIGRATIONS = (
+    ("order_analyses", "features", "TEXT"),
+    ("order_analyses", "origin", "TEXT"),
+    ("order_analyses", "ordered_at", "REAL"),
+)
+
+# When the order was placed (storage time if the order had no timestamp), for
+# reports that group by order date; created after the migrations above
+ORDER_TIME_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_order_analyses_ordered ON order_analyses (ordered_at);
+CREATE INDEX IF NOT EXISTS idx_order_analyses_store_ordered ON order_analyses (store_id, ordered_at);
+"""
+
+
+class AnalysisStore:
+    """Order and customer analyses in an in-memory LRU tier backed by SQLite"""
+
+    def __init__(self, db_path: str, cache_size: int = 10000, retention_days: int = 90):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self._cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._token = uuid.uuid4().hex
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.executescript(ORDER_TIME_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Orders
+    # ------------------------------------------------------------------
+
+    def save_order_analysis(self, analysis: dict, features: Optional[dict] = None):
+        """Persist an order analysis keyed by its order_id, with the features it was scored on"""
+        order_id = str(analysis["order_id"])
+        created_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO order_analyses "
+                "(order_id, customer_id, store_id, created_at, payload, features, origin, ordered_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    order_id,
+                    _optional_str(analysis.get("customer_id")),
+                    _optional_str(analysis.get("store_id")),
+                    created_at,
+                    json.dumps(analysis),
+                    _optional_json(features),
+                    self.origin,
+                    _ordered_at(features, created_at)
+                )
+            )
+        self._cache.put(("order", order_id), (created_at, analysis))
+        self._maybe_purge()
+
+    def save_order_analyses(self, analyses: List[dict], features: Optional[List[dict]] = None):
+        """Persist many order analyses in one transaction, bypassing the LRU tier"""
+        created_at = time.time()
+        origin = self.origin
+        rows = [
+            (
+                str(analysis["order_id"]),
+                _optional_str(analysis.get("customer_id")),
+                _optional_str(analysis.get("store_id")),
+                created_at,
+                json.dumps(analysis),
+                _optional_json(order_features),
+                origin,
+                _ordered_at(order_features, created_at)
+            )
+            for analysis, order_features in zip(analyses, features or [None] * len(analyses))
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO order_analyses "
+                    "(order_id, customer_id, store_id, created_at, payload, features, origin, ordered_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        # Drop any cached copies so lookups see the imported version
+        for row in rows:
+            self._cache.pop(("order", row[0]))
+        self._maybe_purge()
+
+    def label_order_analysis(self, order_id: str, fraudulent: bool) -> Optional[dict]:
+        """Record the confirmed outcome of a stored order; None if it is not stored"""
+        order_id = str(order_id)
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE order_analyses SET payload = json_set(payload, '$.label', json(?)) "
+                "WHERE order_id = ? AND created_at >= ? RETURNING payload",
+                ("true" if fraudulent else "false", order_id, self._cutoff())
+            ).fetchone()
+        self._cache.pop(("order", order_id))
+        return None if row is None else json.loads(row[0])
+
+    def get_order_analysis(self, order_id: str) -> Optional[dict]:
+        """Look up a stored order analysis by primary key"""
+        return self._get("order", "SELECT created_at, payload FROM order_analyses WHERE order_id = ?", str(order_id))
+
+    def find_order_analyses(
+        self,
+        customer_id: Optional[str] = None,
+        store_id: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """Most recent order analyses matching the given index filters"""
+        clauses = ["created_at >= ?"]
+        params = [max(since or 0.0, self._cutoff())]
+        if customer_id is not None:
+            clauses.append("customer_id = ?")
+            params.append(str(customer_id))
+        if store_id is not None:
+            clauses.append("store_id = ?")
+            params.append(str(store_id))
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT payload FROM order_analyses WHERE {' AND '.join(clauses)} "
+                "ORDER BY created_at DESC LIMIT ?",
+                params
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def tail_order_analyses(self, position: int, limit: int = 1000) -> Tuple[List[Tuple[dict, dict]], int]:
+        """(features, analysis) saved after `position` by other processes, oldest first, and the new position
+
+        Rows stored before features were persisted get the fields their
+        analysis carries, timed at when they were stored.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, created_at, payload, features, origin FROM order_analyses "
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (position, limit)
+            ).fetchall()
+        if not rows:
+            return [], position
+
+        origin = self.origin
+        analyses = []
+        for _, created_at, payload, features, row_origin in rows:
+            if row_origin == origin:
+                continue
+            analysis = json.loads(payload)
+            if features is None:
+                features = {
+                    "customer_id": analysis.get("customer_id"),
+                    "store_id": analysis.get("store_id"),
+                    "order_value": analysis.get("order_value"),
+                    "created_at": created_at
+                }
+            else:
+                features = json.loads(features)
+            analyses.append((features, analysis))
+        return analyses, rows[-1][0]
+
+    # ------------------------------------------------------------------
+    # Customers
+    # ------------------------------------------------------------------
+
+    def save_customer_analysis(self, assessment: dict):
+        """Persist a customer risk assessment keyed by its customer_id"""
+        customer_id = str(assessment["customer_id"])
+        created_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO customer_analyses (customer_id, store_id, created_at, payload) "
+                "VALUES (?, ?, ?, ?)",
+                (customer_id, _optional_str(assessment.get("store_id")), created_at, json.dumps(assessment))
+            )
+        self._cache.put(("customer", customer_id), (created_at, assessment))
+        self._maybe_purge()
+
+    def get_customer_analysis(self, customer_id: str) -> Optional[dict]:
+        """Look up a stored customer assessment by primary key"""
+        return self._get(
+            "customer",
+            "SELECT created_at, payload FROM customer_analyses WHERE customer_id = ?",
+            str(customer_id)
+        )
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def set_retention_days(self, days: int):
+        self.retention_days = int(days)
+        self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Delete analyses older than the retention window"""
+        cutoff = self._cutoff()
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM order_analyses WHERE created_at < ?", (cutoff,)).rowcount
+            deleted += self._conn.execute("DELETE FROM customer_analyses WHERE created_at < ?", (cutoff,)).rowcount
+        self._last_purge = time.time()
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            orders = self._conn.execute("SELECT COUNT(*) FROM order_analyses").fetchone()[0]
+            customers = self._conn.execute("SELECT COUNT(*) FROM customer_analyses").fetchone()[0]
+        return {
+            "order_analyses": orders,
+            "customer_analyses": customers,
+            "retention_days": self.retention_days,
+            "cache": self._cache.stats()
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, kind: str, query: str, key: str) -> Optional[dict]:
+        cached = self._cache.get((kind, key))
+        if cached is None:
+            with self._lock:
+                row = self._conn.execute(query, (key,)).fetchone()
+            if row is None:
+                return None
+            cached = (row[0], json.loads(row[1]))
+            self._cache.put((kind, key), cached)
+
+        created_at, payload = cached
+        if created_at < self._cutoff():
+            self._cache.pop((kind, key))
+            return None
+        return payload
+
+    @property
+    def origin(self) -> str:
+        """Tag for rows this process saves; the pid tells apart workers forked after import"""
+        return f"{self._token}:{os.getpid()}"
+
+    def _migrate(self):
+        for table, column, column_type in MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                if column == "ordered_at":
+                    self._conn.execute(
+                        "UPDATE order_analyses SET ordered_at = IFNULL(json_extract(features, '$.created_at'), created_at)"
+                    )
+
+    def _cutoff(self) -> float:
+        return time.time() - self.retention_days * 86400
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+            self.purge_expired()
+
+
+def _optional_str(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _optional_json(value) -> Optional[str]:
+    return None if value is None else json.dumps(value)
+
+
+def _ordered_at(features: Optional[dict], created_at: float) -> float:
+    """The order's own timestamp when the features carry one, else the storage time"""
+    return (features or {}).get("created_at") or created_at
+
+
+analysis_store = AnalysisStore(
+    db_path=os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"),
+    cache_size=int(os.getenv("ANALYSIS_CACHE_SIZE", 10000)),
+    retention_days=int(os.getenv("DATA_RETENTION_DAYS", 90))
+)
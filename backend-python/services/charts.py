@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Tuple
+
+from services.lru import LRUCache
+
+# Bump when chart styling changes so cached images are not reused
+RENDER_VERSION = 1
+
+CHART_TYPES = ("fraud_trends", "risk_distribution", "order_patterns")
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DPI = 100
+
+
+class ChartRenderer:
+    """Renders analytics charts in a dedicated process pool with a content-addressed cache
+
+    matplotlib is slow and not thread-safe, so figures are only ever drawn in
+    worker processes that import it once. Each image is stored under the hash
+    of its data and parameters: a repeated view of the same period is a dict or
+    file lookup, and concurrent requests for the same chart share one render.
+    """
+
+    def __init__(self, cache_dir: str, max_workers: int = 1, memory_items: int = 256, max_cache_mb: float = 256):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)
+        self._memory = LRUCache(memory_items)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pool = None
+        self._cache_bytes = None
+        self.renders = 0
+        self.disk_hits = 0
+
+    async def render(self, chart: str, data: dict, format: str = "png", width: int = 800, height: int = 400) -> Tuple[str, bytes]:
+        """(content key, image bytes) for a chart of `data`, rendering it only on a cache miss"""
+        if chart not in CHART_TYPES:
+            raise ValueError(f"Unknown chart {chart!r}; expected one of {', '.join(CHART_TYPES)}")
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format!r}; expected one of {', '.join(FORMATS)}")
+        params = {"chart": chart, "format": format, "width": width, "height": height}
+        key = chart_key(data, params)
+
+        image = self._memory.get(key)
+        if image is not None:
+            return key, image
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            image = await asyncio.shield(pending)
+            if image is not None:
+                return key, image
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            image = await asyncio.get_running_loop().run_in_executor(None, self._read, key, format)
+            if image is None:
+                image = await asyncio.wrap_future(self._executor().submit(render_chart, data, params))
+                self.renders += 1
+                await asyncio.get_running_loop().run_in_executor(None, self._write, key, format, image)
+            else:
+                self.disk_hits += 1
+            self._memory.put(key, image)
+            future.set_result(image)
+            return key, image
+        except BaseException as e:
+            if isinstance(e, BrokenProcessPool):
+                self._pool = None
+            # Waiters render it themselves
+            future.set_result(None)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn rather than fork: the API process holds threads and SQLite handles
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._pool
+
+    def _path(self, key: str, format: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{format}")
+
+    def _read(self, key: str, format: str):
+        try:
+            with open(self._path(key, format), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, format: str, image: bytes):
+        path = self._path(key, format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+
+        if self._cache_bytes is None:
+            self._cache_bytes = sum(size for _, _, size in self._cache_files())
+        else:
+            self._cache_bytes += len(image)
+        if self._cache_bytes > self.max_cache_bytes:
+            self._evict()
+
+    def _cache_files(self):
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """Delete the oldest cached images until the cache is at 80% of its limit"""
+        files = sorted(self._cache_files(), key=lambda item: item[1])
+        total = sum(size for _, _, size in files)
+        for path, _, size in files:
+            if total <= self.max_cache_bytes * 0.8:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._cache_bytes = total
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "renders": self.renders,
+            "disk_hits": self.disk_hits,
+            "memory": self._memory.stats(),
+            "in_flight": len(self._inflight),
+            "cache_bytes": self._cache_bytes
+        }
+
+
+def chart_key(data: dict, params: dict) -> str:
+    """Content address of a chart: a hash of its data, parameters and renderer version"""
+    payload = json.dumps([RENDER_VERSION, params, data], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Runs in the chart worker processes
+# ----------------------------------------------------------------------
+
+def _init_worker():
+    """Import matplotlib (headless) and seaborn once per worker"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    # Stable SVG element ids, so identical charts are identical files
+    matplotlib.rcParams["svg.hashsalt"] = "darkshepherd"
+    import seaborn as sns
+
+    sns.set_theme(style="whitegrid", palette="deep")
+
+
+def render_chart(data: dict, params: dict) -> bytes:
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure(figsize=(params["width"] / DPI, params["height"] / DPI), dpi=DPI)
+    try:
+        DRAWERS[params["chart"]](figure, data)
+        figure.tight_layout()
+        buffer = io.BytesIO()
+        # Fixed metadata so the same chart always produces the same bytes
+        metadata = {"Software": None} if params["format"] == "png" else {"Date": None, "Creator": None}
+        figure.savefig(buffer, format=params["format"], metadata=metadata)
+        return buffer.getvalue()
+    finally:
+        plt.close(figure)
+
+
+def _title(name: str, data: dict) -> str:
+    return f"{name} ({data.get('period', '')})"
+
+
+def draw_fraud_trends(figure, data: dict):
+    import seaborn as sns
+
+    daily = data.get("daily_trends", [])
+    dates = [day["date"][5:] for day in daily]
+    axes = figure.add_subplot()
+    for column, color in zip(("fraud_attempts", "blocked", "reviewed"), sns.color_palette("deep", 3)):
+        axes.plot(dates, [day[column] for day in daily], label=column.replace("_", " "), color=color, linewidth=1.5)
+    axes.set_title(_title("Fraud trends", data))
+    axes.set_ylabel("orders")
+    step = max(1, len(dates) // 10)
+    axes.set_xticks(range(0, len(dates), step))
+    axes.set_xticklabels(dates[::step], rotation=45, ha="right")
+    axes.legend(loc="upper left")
+
+
+def draw_risk_distribution(figure, data: dict):
+    import seaborn as sns
+
+    risk = data.get("risk_distribution", {})
+    fraud_types = data.get("fraud_types", {})
+    left, right = figure.subplots(1, 2)
+    levels = ["low_risk", "medium_risk", "high_risk"]
+    left.bar(
+        [level.split("_")[0] for level in levels],
+        [risk.get(level, 0) for level in levels],
+        color=sns.color_palette("RdYlGn_r", 3)
+    )
+    left.set_title(_title("Risk distribution", data))
+    left.set_ylabel("% of orders")
+    right.barh(
+        [name.replace("_", " ") for name in fraud_types],
+        list(fraud_types.values()),
+        color=sns.color_palette("deep", len(fraud_types))
+    )
+    right.set_title("Fraud types")
+    right.invert_yaxis()
+
+
+def draw_order_patterns(figure, data: dict):
+    import seaborn as sns
+
+    patterns = data.get("patterns", {})
+    sections = (
+        ("time_distribution", "Time of day"),
+        ("day_distribution", "Day of week"),
+        ("value_distribution", "Order value")
+    )
+    for axes, (section, title) in zip(figure.subplots(1, 3), sections):
+        values = patterns.get(section, {})
+        labels = [label[:3] if section == "day_distribution" else label.replace("_value", "") for label in values]
+        axes.bar(labels, list(values.values()), color=sns.color_palette("deep", len(values)))
+        axes.set_title(title)
+        axes.tick_params(axis="x", rotation=45)
+    figure.axes[0].set_ylabel("% of orders")
+    figure.suptitle(_title("Order patterns", data))
+
+
+DRAWERS = {
+    "fraud_trends": draw_fraud_trends,
+    "risk_distribution": draw_risk_distribution,
+    "order_patterns": draw_order_patterns
+}
+
+
+chart_renderer = ChartRenderer(
+    cache_dir=os.getenv("CHART_CACHE_DIR", "./data/charts"),
+    max_workers=int(os.getenv("CHART_WORKERS", 1)),
+    memory_items=int(os.getenv("CHART_MEMORY_ITEMS", 256)),
+    max_cache_mb=float(os.getenv("CHART_CACHE_MAX_MB", 256))
+)
@@ -0,0 +1,207 @@
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+SUSPICIOUS_RISK_LEVELS = ("high", "critical")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class DistinctSketch:
+    """Distinct-value counter: exact for small sets, HyperLogLog registers beyond that"""
+
+    __slots__ = ("_hashes", "_registers")
+
+    EXACT_LIMIT = 16
+    PRECISION = 8
+    NUM_REGISTERS = 1 << PRECISION
+    ALPHA = 0.7213 / (1 + 1.079 / NUM_REGISTERS)
+
+    def __init__(self):
+        self._hashes = set()
+        self._registers = None
+
+    def add(self, value):
+        if value is None or value == "":
+            return
+        h = _hash64(str(value))
+        if self._registers is None:
+            self._hashes.add(h)
+            if len(self._hashes) > self.EXACT_LIMIT:
+                self._promote()
+        else:
+            self._add_hash(h)
+
+    def count(self) -> int:
+        if self._registers is None:
+            return len(self._hashes)
+
+        m = self.NUM_REGISTERS
+        estimate = self.ALPHA * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def _promote(self):
+        self._registers = bytearray(self.NUM_REGISTERS)
+        for h in self._hashes:
+            self._add_hash(h)
+        self._hashes = set()
+
+    def _add_hash(self, h: int):
+        index = h >> (64 - self.PRECISION)
+        remainder = h & ((1 << (64 - self.PRECISION)) - 1)
+        rank = (64 - self.PRECISION) - remainder.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+
+class CustomerAggregate:
+    """Running order statistics for one customer"""
+
+    __slots__ = (
+        "customer_id",
+        "store_id",
+        "total_orders",
+        "total_spent",
+        "suspicious_orders",
+        "risk_score_sum",
+        "payment_methods",
+        "shipping_addresses",
+        "first_order_at",
+        "last_order_at",
+        "account_created_at"
+    )
+
+    def __init__(self, customer_id: str, store_id: Optional[str] = None):
+        self.customer_id = customer_id
+        self.store_id = store_id
+        self.total_orders = 0
+        self.total_spent = 0.0
+        self.suspicious_orders = 0
+        self.risk_score_sum = 0.0
+        self.payment_methods = DistinctSketch()
+        self.shipping_addresses = DistinctSketch()
+        self.first_order_at = None
+        self.last_order_at = None
+        self.account_created_at = None
+
+    @property
+    def average_order_value(self) -> float:
+        return self.total_spent / self.total_orders if self.total_orders else 0.0
+
+    @property
+    def average_risk_score(self) -> float:
+        return self.risk_score_sum / self.total_orders if self.total_orders else 0.0
+
+    def account_age_days(self, now: Optional[float] = None) -> int:
+        created_at = self.account_created_at or self.first_order_at
+        if created_at is None:
+            return 0
+        return max(0, int(((now or time.time()) - created_at) // 86400))
+
+    def to_dict(self) -> dict:
+        return {
+            "customer_id": self.customer_id,
+            "store_id": self.store_id,
+            "risk_score": round(self.average_risk_score, 3),
+            "total_orders": self.total_orders,
+            "total_spent": round(self.total_spent, 2),
+            "average_order_value": round(self.average_order_value, 2),
+            "last_order": _isoformat(self.last_order_at),
+            "suspicious_orders": self.suspicious_orders,
+            "payment_methods": self.payment_methods.count(),
+            "shipping_addresses": self.shipping_addresses.count(),
+            "account_age_days": self.account_age_days()
+        }
+
+
+class CustomerAggregateStore:
+    """Per-customer aggregates updated in O(1) per analyzed order"""
+
+    def __init__(self, max_customers: int = 1_000_000):
+        self.max_customers = max_customers
+        self._customers = OrderedDict()
+
+    def record_order(self, features: dict, analysis: dict) -> Optional[CustomerAggregate]:
+        """Fold one scored order into its customer's running aggregate"""
+        customer_id = features.get("customer_id")
+        if customer_id is None:
+            return None
+        customer_id = str(customer_id)
+
+        aggregate = self._customers.get(customer_id)
+        if aggregate is None:
+            aggregate = CustomerAggregate(customer_id, features.get("store_id"))
+            self._customers[customer_id] = aggregate
+            if len(self._customers) > self.max_customers:
+                self._customers.popitem(last=False)
+        else:
+            self._customers.move_to_end(customer_id)
+
+        ordered_at = features.get("created_at") or time.time()
+        aggregate.total_orders += 1
+        aggregate.total_spent += float(features.get("order_value", 0) or 0)
+        aggregate.risk_score_sum += float(analysis.get("risk_score", 0) or 0)
+        if analysis.get("risk_level") in SUSPICIOUS_RISK_LEVELS:
+            aggregate.suspicious_orders += 1
+        aggregate.payment_methods.add(features.get("payment_method"))
+        aggregate.shipping_addresses.add(features.get("shipping_address"))
+        if aggregate.first_order_at is None or ordered_at < aggregate.first_order_at:
+            aggregate.first_order_at = ordered_at
+        if aggregate.last_order_at is None or ordered_at > aggregate.last_order_at:
+            aggregate.last_order_at = ordered_at
+        if features.get("customer_created_at"):
+            aggregate.account_created_at = features["customer_created_at"]
+        if aggregate.store_id is None:
+            aggregate.store_id = features.get("store_id")
+        return aggregate
+
+    def retract_order(self, features: dict, analysis: dict):
+        """Take a rescored order's earlier totals back out of its customer's aggregate
+
+        Distinct payment methods and addresses and the first and last order
+        times cannot be taken back; the rescored order sets them again anyway.
+        """
+        customer_id = features.get("customer_id")
+        aggregate = None if customer_id is None else self._customers.get(str(customer_id))
+        if aggregate is None or not aggregate.total_orders:
+            return
+        aggregate.total_orders -= 1
+        aggregate.total_spent -= float(features.get("order_value", 0) or 0)
+        aggregate.risk_score_sum -= float(analysis.get("risk_score", 0) or 0)
+        if analysis.get("risk_level") in SUSPICIOUS_RISK_LEVELS and aggregate.suspicious_orders:
+            aggregate.suspicious_orders -= 1
+
+    def get(self, customer_id: str) -> Optional[CustomerAggregate]:
+        return self._customers.get(str(customer_id))
+
+    def recent(self, limit: int = 100) -> List[CustomerAggregate]:
+        """Most recently active customers, newest first"""
+        customers = []
+        for customer_id in reversed(self._customers):
+            if len(customers) >= limit:
+                break
+            customers.append(self._customers[customer_id])
+        return customers
+
+    def __len__(self) -> int:
+        return len(self._customers)
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+customer_aggregates = CustomerAggregateStore(
+    max_customers=int(os.getenv("CUSTOMER_AGGREGATES_MAX", 1_000_000))
+)
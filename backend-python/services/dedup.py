@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from services.shared_state import shared_state
+
+
+class DedupIndex:
+    """Time-windowed set of recently seen keys with a fixed memory ceiling
+
+    Keys are stored as 64-bit digests in a ring of generation sets. A new
+    generation starts every `window_seconds / generations` (or when the
+    current one fills up) and the oldest is dropped, so a key is remembered
+    for between `window_seconds * (generations - 1) / generations` and
+    `window_seconds`.
+    """
+
+    def __init__(self, window_seconds: float = 172800, generations: int = 8, max_keys: int = 500_000):
+        self.rotate_seconds = window_seconds / generations
+        self.generation_capacity = max(1, max_keys // generations)
+        self._generations = deque([set()], maxlen=generations)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.accepted = 0
+
+    async def check_and_add(self, key: str) -> bool:
+        """Record `key`; True if it was already seen within the window"""
+        digest = _digest(key)
+        with self._lock:
+            self._maybe_rotate()
+            if any(digest in generation for generation in self._generations):
+                self.duplicates += 1
+                return True
+            self._generations[-1].add(digest)
+            self.accepted += 1
+            return False
+
+    async def discard(self, key: str):
+        """Forget a key so a later delivery is processed again"""
+        digest = _digest(key)
+        with self._lock:
+            for generation in self._generations:
+                generation.discard(digest)
+
+    def _maybe_rotate(self):
+        now = time.monotonic()
+        # One new generation per elapsed period, so idle gaps expire old keys too
+        periods = min(int((now - self._rotated_at) / self.rotate_seconds), self._generations.maxlen)
+        if not periods and len(self._generations[-1]) >= self.generation_capacity:
+            periods = 1
+        if periods:
+            for _ in range(periods):
+                self._generations.append(set())
+            self._rotated_at = now
+
+    def __len__(self) -> int:
+        return sum(len(generation) for generation in self._generations)
+
+    async def stats(self) -> dict:
+        total = self.duplicates + self.accepted
+        return {
+            "keys": len(self),
+            "max_keys": self.generation_capacity * self._generations.maxlen,
+            "accepted_total": self.accepted,
+            "duplicates_total": self.duplicates,
+            "duplicate_rate": round(self.duplicates / total, 3) if total else 0.0
+        }
+
+
+class SharedDedupIndex:
+    """DedupIndex counterpart backed by shared state, so all workers see each delivery
+
+    Each key is an expiring entry in the shared store, added atomically, so a
+    retried webhook routed to a different worker is still caught.
+    """
+
+    def __init__(self, state, window_seconds: float = 172800):
+        self.state = state
+        self.window_seconds = window_seconds
+
+    async def check_and_add(self, key: str) -> bool:
+        """Record `key`; True if it was already seen within the window"""
+        if await self.state.add(f"dedup:{_digest(key):016x}", self.window_seconds):
+            await self.state.incr("counter:dedup:accepted")
+            return False
+        await self.state.incr("counter:dedup:duplicates")
+        return True
+
+    async def discard(self, key: str):
+        await self.state.delete(f"dedup:{_digest(key):016x}")
+
+    async def stats(self) -> dict:
+        counters = await self.state.counters("counter:dedup:")
+        accepted = counters.get("accepted", 0)
+        duplicates = counters.get("duplicates", 0)
+        total = accepted + duplicates
+        return {
+            "backend": self.state.backend,
+            "accepted_total": accepted,
+            "duplicates_total": duplicates,
+            "duplicate_rate": round(duplicates / total, 3) if total else 0.0
+        }
+
+
+def idempotency_key(order_id: str, webhook_id: Optional[str] = None) -> str:
+    """Dedup key for a delivery: the order plus the webhook delivery id when known"""
+    return f"{order_id}:{webhook_id}" if webhook_id else str(order_id)
+
+
+def _digest(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+if shared_state.shared:
+    webhook_dedup = SharedDedupIndex(shared_state, float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", 172800)))
+else:
+    webhook_dedup = DedupIndex(
+        window_seconds=float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", 172800)),
+        max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", 500_000))
+    )
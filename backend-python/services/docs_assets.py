@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Preferred first when a client accepts several
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+class CompressedAsset:
+    """A response body together with its precompressed encodings and strong ETag"""
+
+    __slots__ = ("media_type", "digest", "bodies")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {"identity": body}
+        # mtime=0 keeps the gzip bytes (and so the ETag) stable across reloads
+        self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        # Each encoding is a different representation, so it gets its own strong tag
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+class _Entry:
+    __slots__ = ("load", "media_type", "source", "asset", "mtime", "checked_at")
+
+    def __init__(self, load: Callable[[], bytes], media_type: str, source: Optional[str]):
+        self.load = load
+        self.media_type = media_type
+        self.source = source
+        self.asset = None
+        self.mtime = None
+        self.checked_at = 0.0
+
+
+class AssetCache:
+    """Documentation pages and the OpenAPI schema, built and compressed once
+
+    Each asset is produced by a loader and compressed up front, so serving it
+    is a dict lookup. Assets backed by a file are rebuilt when its mtime
+    changes, checked at most every `check_interval` seconds.
+    """
+
+    def __init__(self, max_age: int = 300, check_interval: float = 1.0):
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self.served = {"identity": 0, "gzip": 0, "br": 0, "not_modified": 0}
+        self.reloads = 0
+
+    def add(self, name: str, load: Callable[[], bytes], media_type: str, source: Optional[str] = None):
+        """Register an asset; `source` is the file to watch for changes, if any"""
+        self._entries[name] = _Entry(load, media_type, source)
+
+    def load_all(self):
+        now = time.monotonic()
+        for entry in self._entries.values():
+            self._refresh(entry)
+            entry.checked_at = now
+
+    async def get(self, name: str) -> Optional[CompressedAsset]:
+        """The current asset, rebuilding it off the event loop if its file changed"""
+        entry = self._entries[name]
+        now = time.monotonic()
+        if not entry.checked_at or (entry.source and now - entry.checked_at >= self.check_interval):
+            entry.checked_at = now
+            if entry.asset is None or _mtime(entry.source) != entry.mtime:
+                await asyncio.get_running_loop().run_in_executor(None, self._refresh, entry)
+        return entry.asset
+
+    def _refresh(self, entry: _Entry):
+        mtime = _mtime(entry.source) if entry.source else None
+        if entry.source and mtime is None:
+            entry.asset = entry.mtime = None
+            return
+        entry.asset = CompressedAsset(entry.load(), entry.media_type)
+        entry.mtime = mtime
+        self.reloads += 1
+
+    def response(self, request: Request, asset: CompressedAsset) -> Response:
+        """Serve `asset` in the best encoding the client accepts, or 304 if it is current"""
+        encoding = negotiate(request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": f"public, max-age={self.max_age}",
+            "Vary": "Accept-Encoding"
+        }
+        if _matches(request.headers.get("if-none-match"), asset.digest):
+            self.served["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        self.served[encoding] += 1
+        return Response(content=asset.bodies[encoding], media_type=asset.media_type, headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            "encodings": list(ENCODINGS),
+            "assets": {
+                name: {encoding: len(body) for encoding, body in entry.asset.bodies.items()}
+                for name, entry in self._entries.items()
+                if entry.asset is not None
+            },
+            "served": dict(self.served),
+            "reloads": self.reloads
+        }
+
+
+def negotiate(accept_encoding: str) -> str:
+    """The preferred encoding allowed by an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _matches(if_none_match: Optional[str], digest: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        # Any encoding of the same content is still current
+        if tag.removeprefix("W/").strip('"').split("-")[0] == digest:
+            return True
+    return False
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except (FileNotFoundError, TypeError):
+        return None
+
+
+def read_file(path: str) -> Callable[[], bytes]:
+    def load() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    return load
+
+
+docs_assets = AssetCache(max_age=int(os.getenv("DOCS_CACHE_MAX_AGE", 300)))
@@ -0,0 +1,367 @@
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+RISK_LEVEL_CODES = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+RECOMMENDATION_CODES = {"allow": 0, "review": 1, "block": 2}
+FRAUD_TYPE_CODES = {"payment_fraud": 0, "account_takeover": 1, "friendly_fraud": 2, "identity_theft": 3}
+RISK_LEVELS = {code: name for name, code in RISK_LEVEL_CODES.items()}
+RECOMMENDATIONS = {code: name for name, code in RECOMMENDATION_CODES.items()}
+FRAUD_TYPES = {code: name for name, code in FRAUD_TYPE_CODES.items()}
+
+# Bit positions of boolean order features in the `flags` column
+FLAG_BITS = {
+    "new_customer": 0,
+    "high_value": 1,
+    "international_shipping": 2,
+    "multiple_payment_methods": 3,
+    "multiple_addresses": 4,
+    "unusual_timing": 5,
+    "rapid_ordering": 6
+}
+
+# order_value and risk_score stay float64 so a rescored order's old contribution
+# can be retracted from other aggregates exactly
+SCHEMA = {
+    "order_key": np.int64,
+    "timestamp": np.float64,
+    "store": np.int32,
+    "customer": np.int32,
+    "order_value": np.float64,
+    "risk_score": np.float64,
+    "risk_level": np.int8,
+    "recommendation": np.int8,
+    "fraud_type": np.int8,
+    "flags": np.uint8
+}
+
+COMPACT_INTERVAL_SECONDS = 3600
+
+HIGH_RISK_SCORE = 0.7
+NEW_CUSTOMER_DAYS = 30
+REPEAT_CUSTOMER_ORDERS = 5
+
+
+class _Dictionary:
+    """Dense integer codes for repeated string keys such as customer ids"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value) -> Optional[int]:
+        return None if value is None else self.codes.get(str(value))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self.codes) + sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values)
+
+
+class OrderEventTable:
+    """Columnar table of scored order events, one row per order id
+
+    Rows are staged in Python lists and flushed into growable NumPy columns
+    `chunk_size` at a time; reads flush first and then operate on array views.
+    A rescored order overwrites its row in place, and rows older than
+    `retention_days` are compacted away at most once an hour.
+
+    Order ids are kept as 64-bit hashes in the `order_key` column. Flushed rows
+    are found through a sorted key array searched with `np.searchsorted`, and
+    only staged rows go through a dict, so the per-order index costs 16 bytes
+    instead of a Python dict entry and string per order.
+    """
+
+    def __init__(self, chunk_size: int = 65536, initial_capacity: int = 65536, retention_days: int = 90):
+        self.chunk_size = chunk_size
+        self.retention_days = retention_days
+        self._columns = {name: np.empty(initial_capacity, dtype=dtype) for name, dtype in SCHEMA.items()}
+        self._size = 0
+        self._staged = {name: [] for name in SCHEMA}
+        self._stores = _Dictionary()
+        self._customers = _Dictionary()
+        # Per-customer account creation time, indexed by customer code
+        self._customer_created = np.full(initial_capacity, np.nan)
+        # Sorted order keys of flushed rows with their row numbers, and the rows of staged keys
+        self._index_keys = np.empty(0, dtype=np.int64)
+        self._index_rows = np.empty(0, dtype=np.int64)
+        self._staged_rows = {}
+        self._compacted_at = time.time()
+
+    def __len__(self) -> int:
+        return self._size + len(self._staged["timestamp"])
+
+    def append(self, features: dict, analysis: dict):
+        """Stage one scored order, or overwrite its earlier row
+
+        Returns the (features, analysis) of the row it replaced, so the
+        caller can take that order's old contribution out of other aggregates.
+        """
+        flags = 0
+        for feature, bit in FLAG_BITS.items():
+            if features.get(feature):
+                flags |= 1 << bit
+
+        customer = self._customers.encode(features.get("customer_id"))
+        order_key = _order_key(analysis.get("order_id"))
+        values = {
+            "order_key": order_key,
+            "timestamp": features.get("created_at") or time.time(),
+            "store": self._stores.encode(features.get("store_id")),
+            "customer": customer,
+            "order_value": float(features.get("order_value", 0) or 0),
+            "risk_score": float(analysis.get("risk_score", 0) or 0),
+            "risk_level": RISK_LEVEL_CODES.get(analysis.get("risk_level"), 0),
+            "recommendation": RECOMMENDATION_CODES.get(analysis.get("recommendation"), 0),
+            "fraud_type": FRAUD_TYPE_CODES.get(analysis.get("fraud_type"), -1),
+            "flags": flags
+        }
+        if customer >= 0 and features.get("customer_created_at"):
+            self._set_customer_created(customer, features["customer_created_at"])
+
+        row = self._row_of(order_key) if order_key else None
+        if row is not None:
+            previous = self._read(row)
+            self._write(row, values)
+            return previous
+
+        staged = self._staged
+        if order_key:
+            self._staged_rows[order_key] = len(self)
+        for name, value in values.items():
+            staged[name].append(value)
+
+        if len(staged["timestamp"]) >= self.chunk_size:
+            self.flush()
+        if time.time() - self._compacted_at >= COMPACT_INTERVAL_SECONDS:
+            self.compact()
+        return None
+
+    def compact(self) -> int:
+        """Drop orders older than the retention window; returns how many were dropped"""
+        self.flush()
+        self._compacted_at = time.time()
+        keep = self._columns["timestamp"][:self._size] >= self._compacted_at - self.retention_days * 86400
+        kept = int(np.count_nonzero(keep))
+        dropped = self._size - kept
+        if not dropped:
+            return 0
+        for name, column in self._columns.items():
+            column[:kept] = column[:self._size][keep]
+        self._size = kept
+        self._index_keys = np.empty(0, dtype=np.int64)
+        self._index_rows = np.empty(0, dtype=np.int64)
+        self._index(0, kept)
+        return dropped
+
+    def flush(self):
+        """Move staged rows into the column arrays"""
+        count = len(self._staged["timestamp"])
+        if not count:
+            return
+        self._reserve(self._size + count)
+        for name, dtype in SCHEMA.items():
+            self._columns[name][self._size:self._size + count] = np.asarray(self._staged[name], dtype=dtype)
+            self._staged[name] = []
+        self._index(self._size, self._size + count)
+        self._staged_rows = {}
+        self._size += count
+
+    def columns(self, store_id: Optional[str] = None) -> dict:
+        """Column views, optionally restricted to one store"""
+        self.flush()
+        views = {name: column[:self._size] for name, column in self._columns.items()}
+        if store_id is None:
+            return views
+        code = self._stores.lookup(store_id)
+        if code is None:
+            return {name: column[:0] for name, column in views.items()}
+        mask = views["store"] == code
+        return {name: column[mask] for name, column in views.items()}
+
+    def customer_summary(self, store_id: Optional[str] = None, now: Optional[float] = None) -> dict:
+        """Per-customer order statistics computed in single vectorized passes"""
+        cols = self.columns(store_id)
+        known = cols["customer"] >= 0
+        customer = cols["customer"][known]
+        n = len(self._customers)
+
+        orders = np.bincount(customer, minlength=n)
+        spent = np.bincount(customer, weights=cols["order_value"][known], minlength=n)
+        risk_sum = np.bincount(customer, weights=cols["risk_score"][known], minlength=n)
+        suspicious = np.bincount(customer, weights=cols["risk_level"][known] >= RISK_LEVEL_CODES["high"], minlength=n)
+        first_order = np.full(n, np.inf)
+        last_order = np.full(n, -np.inf)
+        np.minimum.at(first_order, customer, cols["timestamp"][known])
+        np.maximum.at(last_order, customer, cols["timestamp"][known])
+
+        present = np.flatnonzero(orders)
+        self._reserve_customers(n)
+        created = np.fmin(self._customer_created[:n][present], first_order[present])
+        return {
+            "customer": present,
+            "orders": orders[present],
+            "spent": spent[present],
+            "risk_score": risk_sum[present] / orders[present],
+            "suspicious_orders": suspicious[present].astype(np.int64),
+            "last_order": last_order[present],
+            "account_age_days": np.maximum(0, ((now or time.time()) - created) // 86400).astype(np.int64)
+        }
+
+    def customer_insights(self, limit: int = 100, store_id: Optional[str] = None):
+        """(most recently active customers, insight counts over every customer)"""
+        summary = self.customer_summary(store_id)
+        total = len(summary["customer"])
+        insights = {
+            "total_customers": total,
+            "high_risk_customers": int(np.count_nonzero(summary["risk_score"] > HIGH_RISK_SCORE)),
+            "new_customers": int(np.count_nonzero(summary["account_age_days"] < NEW_CUSTOMER_DAYS)),
+            "repeat_customers": int(np.count_nonzero(summary["orders"] > REPEAT_CUSTOMER_ORDERS)),
+            "average_risk_score": round(float(summary["risk_score"].mean()), 3) if total else 0.0
+        }
+
+        limit = min(limit, total)
+        if not limit:
+            return [], insights
+        top = np.argpartition(-summary["last_order"], limit - 1)[:limit]
+        top = top[np.argsort(-summary["last_order"][top])]
+        customers = [
+            {
+                "customer_id": self._customers.values[code],
+                "risk_score": round(risk, 3),
+                "total_orders": orders,
+                "total_spent": round(spent, 2),
+                "last_order": _isoformat(last_order),
+                "suspicious_orders": suspicious,
+                "account_age_days": age
+            }
+            for code, risk, orders, spent, last_order, suspicious, age in zip(
+                summary["customer"][top].tolist(),
+                summary["risk_score"][top].tolist(),
+                summary["orders"][top].tolist(),
+                summary["spent"][top].tolist(),
+                summary["last_order"][top].tolist(),
+                summary["suspicious_orders"][top].tolist(),
+                summary["account_age_days"][top].tolist()
+            )
+        ]
+        return customers, insights
+
+    def _read(self, row: int):
+        """(features, analysis) as recorded for one row"""
+        if row < self._size:
+            values = {name: column[row].item() for name, column in self._columns.items()}
+        else:
+            values = {name: staged[row - self._size] for name, staged in self._staged.items()}
+        features = {
+            "created_at": values["timestamp"],
+            "store_id": self._stores.values[values["store"]] if values["store"] >= 0 else None,
+            "customer_id": self._customers.values[values["customer"]] if values["customer"] >= 0 else None,
+            "order_value": values["order_value"]
+        }
+        for feature, bit in FLAG_BITS.items():
+            features[feature] = bool(values["flags"] & (1 << bit))
+        analysis = {
+            "risk_score": values["risk_score"],
+            "risk_level": RISK_LEVELS.get(values["risk_level"]),
+            "recommendation": RECOMMENDATIONS.get(values["recommendation"]),
+            "fraud_type": FRAUD_TYPES.get(values["fraud_type"])
+        }
+        return features, analysis
+
+    def _write(self, row: int, values: dict):
+        if row < self._size:
+            for name, value in values.items():
+                self._columns[name][row] = value
+        else:
+            for name, value in values.items():
+                self._staged[name][row - self._size] = value
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the table: columns, order index, customer data and id dictionaries"""
+        self.flush()
+        return (
+            sum(column.nbytes for column in self._columns.values())
+            + self._index_keys.nbytes
+            + self._index_rows.nbytes
+            + self._customer_created.nbytes
+            + self._stores.memory_bytes()
+            + self._customers.memory_bytes()
+        )
+
+    def _row_of(self, order_key: int) -> Optional[int]:
+        row = self._staged_rows.get(order_key)
+        if row is not None:
+            return row
+        i = int(np.searchsorted(self._index_keys, order_key))
+        if i < len(self._index_keys) and self._index_keys[i] == order_key:
+            return int(self._index_rows[i])
+        return None
+
+    def _index(self, start: int, stop: int):
+        """Merge the order keys of rows [start, stop) into the sorted index"""
+        keys = self._columns["order_key"][start:stop]
+        rows = np.flatnonzero(keys) + start
+        keys = np.concatenate([self._index_keys, keys[keys != 0]])
+        rows = np.concatenate([self._index_rows, rows])
+        order = np.argsort(keys, kind="stable")
+        self._index_keys = keys[order]
+        self._index_rows = rows[order]
+
+    def _reserve(self, size: int):
+        capacity = len(self._columns["timestamp"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _reserve_customers(self, size: int):
+        if size <= len(self._customer_created):
+            return
+        grown = np.full(max(size, 2 * len(self._customer_created)), np.nan)
+        grown[:len(self._customer_created)] = self._customer_created
+        self._customer_created = grown
+
+    def _set_customer_created(self, customer: int, created_at: float):
+        self._reserve_customers(customer + 1)
+        self._customer_created[customer] = created_at
+
+
+def _order_key(order_id) -> int:
+    """Nonzero 64-bit hash of an order id, or 0 when there is none
+
+    The table lives in one process and is rebuilt on startup, so the
+    per-process string hash is stable for as long as the keys are.
+    """
+    if order_id is None:
+        return 0
+    return hash(str(order_id)) or 1
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+order_events = OrderEventTable(
+    chunk_size=int(os.getenv("EVENT_TABLE_CHUNK_SIZE", 65536)),
+    retention_days=int(os.getenv("DATA_RETENTION_DAYS", 90))
+)
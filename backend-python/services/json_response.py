@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import json
+import os
+from decimal import Decimal
+from typing import Any, Callable
+
+from fastapi import FastAPI
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, request_response
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # standard mode only
+    orjson = None
+
+JSON_MODES = ("standard", "fast")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson
+
+    Produces the same compact JSON as the standard encoder. Anything orjson
+    cannot serialize (e.g. integers beyond 64 bits) goes through FastAPI's
+    jsonable_encoder instead.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes for `content`, via orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def use_fast_json(app: FastAPI) -> int:
+    """Serve every JSON route of `app` through FastJSONResponse; returns how many were converted
+
+    FastAPI runs each endpoint's return value through jsonable_encoder (or
+    validates it against the response model) before rendering it, which walks
+    the whole payload in Python. Converted endpoints return a FastJSONResponse
+    themselves, so FastAPI passes it through untouched:
+
+    - routes without a response model render their dict or list directly
+    - routes with one skip re-validation when the endpoint already returned an
+      instance of the model, which pydantic dumps straight to JSON
+
+    Routes with an explicit non-JSON response class are left alone. Call it
+    once every route is registered.
+    """
+    if orjson is None:
+        raise RuntimeError("JSON_RESPONSE_MODE=fast requires the orjson package")
+    converted = 0
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or getattr(route.dependant.call, "fast_json", False):
+            continue
+        response_class = route.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        if not issubclass(response_class, JSONResponse):
+            continue
+        route.response_class = FastJSONResponse
+        route.dependant.call = _fast_endpoint(route)
+        route.app = request_response(route.get_route_handler())
+        converted += 1
+    return converted
+
+
+def _fast_endpoint(route: APIRoute) -> Callable:
+    call = route.dependant.call
+    status_code = route.status_code or 200
+    model = route.response_model
+    # Pydantic can only dump the model as-is when no include/exclude options apply
+    dump_model = model if isinstance(model, type) and issubclass(model, BaseModel) and not (
+        route.response_model_include or route.response_model_exclude or route.response_model_by_alias is False
+        or route.response_model_exclude_unset or route.response_model_exclude_defaults
+        or route.response_model_exclude_none
+    ) else None
+
+    def respond(content: Any) -> Any:
+        if isinstance(content, Response):
+            return content
+        if model is None:
+            return FastJSONResponse(content, status_code=status_code)
+        if dump_model is not None and type(content) is dump_model:
+            return Response(content.model_dump_json(by_alias=True), status_code=status_code, media_type="application/json")
+        # Let FastAPI validate it against the response model
+        return content
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            return respond(await call(*args, **kwargs))
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            return respond(call(*args, **kwargs))
+    endpoint.fast_json = True
+    return endpoint
+
+
+JSON_RESPONSE_MODE = os.getenv("JSON_RESPONSE_MODE", "standard")
+if JSON_RESPONSE_MODE not in JSON_MODES:
+    raise ValueError(f"JSON_RESPONSE_MODE must be one of {', '.join(JSON_MODES)}")
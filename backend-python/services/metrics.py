@@ -0,0 +1,246 @@
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Starlette appends the charset to text/ media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Request latency buckets in seconds, from cache hits to model training calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+Labels = Tuple[str, ...]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Labels, Tuple[str, ...], float]]:
+        """(suffix, label values, extra label pair, value) for every series"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, extra, value in self.samples():
+            names = self.labelnames + extra[:1]
+            values = labels + extra[1:]
+            label_text = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+            lines.append(f"{self.name}{suffix}{{{label_text}}} {_format(value)}" if label_text else
+                         f"{self.name}{suffix} {_format(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label combination; name it `..._total`"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield "", labels, (), value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, or is read from `function` at scrape time"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, labels: Labels = ()):
+        self._values[labels] = value
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def samples(self):
+        if self.function is not None:
+            yield "", (), (), self.function()
+            return
+        for labels, value in list(self._values.items()):
+            yield "", labels, (), value
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, with their sum, per label combination
+
+    Each series is one list: a slot per bucket (plus +Inf) and the running
+    sum. Recording is a bisect and two increments; the cumulative bucket
+    counts Prometheus expects are only built at scrape time.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in list(self._series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                yield "_bucket", labels, ("le", _format(bound)), cumulative
+            yield "_sum", labels, (), series[-1]
+            yield "_count", labels, (), cumulative
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format
+
+    Recording takes no locks: every metric here is updated from the event loop
+    thread, so a plain dict and list update cannot interleave. With several
+    workers each process reports its own counts.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency, response sizes and in-flight requests
+
+    Requests are labelled by route template (`/reports/{report_id}`), never
+    the raw path, so series stay bounded. Register it last so it wraps the
+    response cache: cached hits never reach the router, so their template is
+    remembered from earlier routed requests to the same static path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Dict[str, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def record_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, record_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            labels = (scope["method"], self._route(scope))
+            http_requests.inc(labels + (str(status),))
+            http_request_duration.observe(elapsed, labels)
+            http_response_size.observe(size, labels)
+
+    def _route(self, scope) -> str:
+        path = scope["path"]
+        route = scope.get("route")
+        if route is not None:
+            template = route.path
+            if template == path:
+                self._templates[path] = template
+            return template
+        return self._templates.get(path, "unmatched")
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter("http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status"))
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")
+)
+http_response_size = metrics.histogram(
+    "http_response_size_bytes", "HTTP response body size by method and route", ("method", "route"), SIZE_BUCKETS
+)
+http_requests_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+orders_scored = metrics.counter("fraud_orders_scored_total", "Orders scored, by single or batch scoring", ("mode",))
+risk_levels = metrics.counter("fraud_risk_levels_total", "Scored orders by risk level", ("risk_level",))
+recommendations = metrics.counter(
+    "fraud_recommendations_total", "Scored orders by block/review/allow recommendation", ("recommendation",)
+)
+
+_started_at = time.time()
+metrics.gauge("process_start_time_seconds", "Start time of the process since the Unix epoch", function=lambda: _started_at)
+
+
+def process_started_at() -> float:
+    """When this worker process started, in seconds since the Unix epoch"""
+    return _started_at
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAUD_MODEL = "fraud_detection_model"
+
+# Feature columns fed to the models, in order, unless an artifact lists its own
+MODEL_FEATURES = (
+    "order_value",
+    "high_value",
+    "new_customer",
+    "international_shipping",
+    "multiple_payment_methods",
+    "multiple_addresses",
+    "unusual_timing",
+    "rapid_ordering"
+)
+
+_VERSION_FILE = re.compile(r"^v(\d+)\.joblib$")
+
+
+class LoadedModel:
+    """A fitted estimator together with the metadata stored in its artifact"""
+
+    def __init__(self, name: str, artifact: dict, path: str):
+        self.name = name
+        self.estimator = artifact["model"]
+        self.version = str(artifact.get("version", "unknown"))
+        self.features = list(artifact.get("features") or MODEL_FEATURES)
+        self.accuracy = artifact.get("accuracy")
+        self.training_samples = artifact.get("training_samples")
+        self.trained_at = artifact.get("trained_at") or datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+        self.path = path
+        self.loaded_at = datetime.now().isoformat()
+
+    def vectorize(self, orders: List[dict]) -> np.ndarray:
+        """Feature matrix for a list of order feature dicts"""
+        rows = np.zeros((len(orders), len(self.features)))
+        for i, order in enumerate(orders):
+            for j, feature in enumerate(self.features):
+                value = order.get(feature)
+                rows[i, j] = float(value) if isinstance(value, (int, float)) else float(bool(value))
+        return rows
+
+    def predict_proba(self, rows: np.ndarray) -> np.ndarray:
+        """Probability of the positive (fraud) class for each row"""
+        return self.estimator.predict_proba(rows)[:, -1]
+
+    def status(self) -> dict:
+        return {
+            "status": "active",
+            "version": self.version,
+            "accuracy": self.accuracy,
+            "last_updated": self.trained_at,
+            "loaded_at": self.loaded_at,
+            "training_samples": self.training_samples,
+            "features": self.features
+        }
+
+
+class MicroBatcher:
+    """Collects concurrent single-row predictions into one predict_proba call
+
+    The first request opens a window of `window_ms`; everything that arrives
+    before it closes (or until `max_batch` rows) is scored together on the
+    registry's thread pool.
+    """
+
+    def __init__(self, registry, name: str, window_ms: float = 2.0, max_batch: int = 256):
+        self.registry = registry
+        self.name = name
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        # Strong references to running batches, so they are not garbage collected mid-flight
+        self._tasks = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, order: dict) -> float:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((order, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        orders = [order for order, _ in batch]
+        try:
+            probabilities = await self.registry.predict_many_async(self.name, orders)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), probability in zip(batch, probabilities):
+            if not future.done():
+                future.set_result(probability)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "average_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch
+        }
+
+
+class ModelRegistry:
+    """Fitted models loaded once from `<model_dir>/<name>/v<N>.joblib` artifacts
+
+    The highest version of each model is kept in memory; inference runs on a
+    small thread pool so predictions never block the event loop.
+    """
+
+    def __init__(self, model_dir: str, threads: int = 2, batch_window_ms: float = 2.0, max_batch: int = 256):
+        self.model_dir = model_dir
+        self.batch_window_ms = batch_window_ms
+        self.max_batch = max_batch
+        self._models = {}
+        self._batchers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="model-inference")
+
+    def load(self) -> dict:
+        """Load the latest artifact of every model found on disk"""
+        if not os.path.isdir(self.model_dir):
+            return {}
+        for name in sorted(os.listdir(self.model_dir)):
+            path = latest_artifact(os.path.join(self.model_dir, name))
+            if path is None:
+                continue
+            try:
+                self.activate(name, path)
+            except Exception:
+                logger.exception("Failed to load model artifact %s", path)
+        return {name: model.version for name, model in self._models.items()}
+
+    def refresh(self) -> List[str]:
+        """Activate artifacts newer than the ones being served, e.g. trained by another worker"""
+        if not os.path.isdir(self.model_dir):
+            return []
+        activated = []
+        for name in sorted(os.listdir(self.model_dir)):
+            path = latest_artifact(os.path.join(self.model_dir, name))
+            current = self._models.get(name)
+            if path is None or (current is not None and current.path == path):
+                continue
+            try:
+                self.activate(name, path)
+                activated.append(name)
+            except Exception:
+                logger.exception("Failed to load model artifact %s", path)
+        return activated
+
+    def activate(self, name: str, path: str) -> LoadedModel:
+        """Load one artifact and make it the model served under `name`"""
+        import joblib
+        model = LoadedModel(name, joblib.load(path), path)
+        with self._lock:
+            self._models[name] = model
+        logger.info("Loaded model %s version %s from %s", name, model.version, path)
+        return model
+
+    def get(self, name: str) -> Optional[LoadedModel]:
+        return self._models.get(name)
+
+    def predict_many(self, name: str, orders: List[dict]) -> Optional[np.ndarray]:
+        """Fraud probabilities for a batch of orders, or None if `name` is not loaded"""
+        model = self._models.get(name)
+        if model is None:
+            return None
+        return model.predict_proba(model.vectorize(orders))
+
+    async def predict_many_async(self, name: str, orders: List[dict]) -> Optional[np.ndarray]:
+        """predict_many on the inference thread pool"""
+        if name not in self._models:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.predict_many, name, orders)
+
+    async def predict(self, name: str, order: dict) -> Optional[float]:
+        """Probability for one order, micro-batched with concurrent callers"""
+        if name not in self._models:
+            return None
+        batcher = self._batchers.get(name)
+        if batcher is None:
+            batcher = self._batchers[name] = MicroBatcher(self, name, self.batch_window_ms, self.max_batch)
+        return float(await batcher.submit(order))
+
+    def status(self) -> dict:
+        models = {name: model.status() for name, model in self._models.items()}
+        for name, model in models.items():
+            if name in self._batchers:
+                model["inference"] = self._batchers[name].stats()
+        if FRAUD_MODEL not in models:
+            models[FRAUD_MODEL] = {
+                "status": "not_trained",
+                "version": None,
+                "fallback": "rule_based"
+            }
+        return models
+
+
+def latest_artifact(directory: str) -> Optional[str]:
+    """Path of the highest `v<N>.joblib` in a directory"""
+    if not os.path.isdir(directory):
+        return None
+    versions = [
+        (int(match.group(1)), entry)
+        for entry in os.listdir(directory)
+        for match in [_VERSION_FILE.match(entry)] if match
+    ]
+    if not versions:
+        return None
+    return os.path.join(directory, max(versions)[1])
+
+
+model_registry = ModelRegistry(
+    os.getenv("MODEL_DIR", "./models"),
+    threads=int(os.getenv("MODEL_INFERENCE_THREADS", 2)),
+    batch_window_ms=float(os.getenv("MODEL_BATCH_WINDOW_MS", 2)),
+    max_batch=int(os.getenv("MODEL_MAX_BATCH", 256))
+)
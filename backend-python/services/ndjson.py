@@ -0,0 +1,85 @@
+import json
+from typing import AsyncIterator, Optional, Tuple
+
+from starlette.responses import StreamingResponse
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """StreamingResponse for handlers that keep reading the request body while responding
+
+    Starlette's stock version listens for disconnects on `receive` alongside
+    the body stream, which would swallow request body chunks; here a client
+    disconnect surfaces as a failed send instead.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def read_ndjson(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int = 1_048_576
+) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Parse newline-delimited JSON objects from a stream of byte chunks
+
+    Yields `(line_number, object, None)` per record or `(line_number, None,
+    error)` for a bad line. At most one partial line (capped at
+    `max_line_bytes`) is buffered, so memory does not grow with input size.
+    """
+    pending = []
+    pending_size = 0
+    oversized = False
+    line_number = 0
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            if newline < 0:
+                if not oversized and start < len(chunk):
+                    pending.append(chunk[start:])
+                    pending_size += len(chunk) - start
+                    if pending_size > max_line_bytes:
+                        oversized = True
+                        pending, pending_size = [], 0
+                break
+
+            piece = chunk[start:newline]
+            start = newline + 1
+            line_number += 1
+            if oversized:
+                oversized = False
+                yield line_number, None, f"Line exceeds {max_line_bytes} bytes"
+                continue
+            line = b"".join(pending) + piece if pending else piece
+            pending, pending_size = [], 0
+            result = _parse_line(line, max_line_bytes)
+            if result is not None:
+                yield (line_number,) + result
+
+    if oversized:
+        yield line_number + 1, None, f"Line exceeds {max_line_bytes} bytes"
+    elif pending:
+        result = _parse_line(b"".join(pending), max_line_bytes)
+        if result is not None:
+            yield (line_number + 1,) + result
+
+
+def _parse_line(line: bytes, max_line_bytes: int):
+    """(object, None), (None, error), or None for a blank line"""
+    if len(line) > max_line_bytes:
+        return None, f"Line exceeds {max_line_bytes} bytes"
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        value = json.loads(line)
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+    if not isinstance(value, dict):
+        return None, "Expected a JSON object"
+    return value, None
@@ -0,0 +1,422 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    "email_enabled": True,
+    "webhook_enabled": False,
+    "webhook_url": None,
+    "alert_types": ["fraud", "security"],
+    "email_recipients": ["admin@darkshepherd.ai"]
+}
+
+# Settings are re-read from SQLite at most this often, so updates made on
+# another worker apply within a few seconds without a query per alert
+SETTINGS_REFRESH_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification_settings (
+    key TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notification_dead_letters (
+    letter_id TEXT PRIMARY KEY,
+    destination TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notification_dead_letters_created ON notification_dead_letters (created_at);
+"""
+
+
+class DeliveryError(Exception):
+    """Raised when a batch could not be delivered"""
+
+    def __init__(self, message: str, attempts: int):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+class _Destination:
+    __slots__ = ("url", "pending", "active", "timer", "delivered", "batches")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.pending = deque()
+        self.active = 0
+        self.timer = None
+        self.delivered = 0
+        self.batches = 0
+
+
+class NotificationDispatcher:
+    """Delivers alerts to the configured webhook in batches, off the scoring path
+
+    `submit` only appends to a bounded per-destination buffer. Buffered alerts
+    are flushed after `batch_window_ms` (or as soon as `max_batch` are waiting)
+    over one pooled HTTP client, with at most `concurrency` requests in flight
+    per destination. Failed batches are retried with jittered backoff and end
+    up in a SQLite dead-letter queue, as do alerts that overflow the buffer.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_window_ms: float = 250,
+        max_batch: int = 100,
+        max_pending: int = 10_000,
+        concurrency: int = 2,
+        max_connections: int = 20,
+        max_attempts: int = 5,
+        timeout: float = 10.0,
+        allowed_hosts: Iterable[str] = ()
+    ):
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.allowed_hosts = allow_list(allowed_hosts)
+        self._destinations: Dict[str, _Destination] = {}
+        self._tasks = set()
+        self._client = None
+        self._settings = None
+        self._settings_read_at = 0.0
+        self._closing = False
+        self.retries = 0
+        self.dead_lettered = 0
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Settings
+    # ------------------------------------------------------------------
+
+    def settings(self) -> dict:
+        now = time.monotonic()
+        if self._settings is None or now - self._settings_read_at > SETTINGS_REFRESH_SECONDS:
+            with self._lock:
+                row = self._conn.execute("SELECT payload FROM notification_settings WHERE key = 'default'").fetchone()
+            self._settings = {**DEFAULT_SETTINGS, **json.loads(row[0])} if row else dict(DEFAULT_SETTINGS)
+            self._settings_read_at = now
+        return self._settings
+
+    def update_settings(self, settings: dict) -> dict:
+        settings = json.loads(json.dumps({**DEFAULT_SETTINGS, **settings}, default=str))
+        if settings.get("webhook_enabled"):
+            validate_webhook_url(settings.get("webhook_url"), self.allowed_hosts)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO notification_settings (key, updated_at, payload) VALUES ('default', ?, ?)",
+                (time.time(), json.dumps(settings, default=str))
+            )
+        self._settings = settings
+        self._settings_read_at = time.monotonic()
+        return settings
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def submit(self, alerts: List[dict]) -> int:
+        """Queue alerts for the webhook if notifications are enabled for their type"""
+        settings = self.settings()
+        if not alerts or not settings.get("webhook_enabled") or not settings.get("webhook_url"):
+            return 0
+        alert_types = set(settings.get("alert_types") or ())
+        matching = [alert for alert in alerts if getattr(alert.get("type"), "value", alert.get("type")) in alert_types]
+        return self.enqueue(settings["webhook_url"], matching)
+
+    def enqueue(self, url: str, alerts: List[dict]) -> int:
+        """Queue alerts for one destination; overflow goes to the dead-letter queue"""
+        if not alerts:
+            return 0
+        destination = self._destinations.get(url)
+        if destination is None:
+            destination = self._destinations[url] = _Destination(url)
+        room = self.max_pending - len(destination.pending)
+        if room < len(alerts):
+            self._dead_letter(url, alerts[max(room, 0):], 0, "buffer full")
+            alerts = alerts[:max(room, 0)]
+        destination.pending.extend(alerts)
+        self._schedule(destination)
+        return len(alerts)
+
+    def _schedule(self, destination: _Destination):
+        """Flush now if a full batch is waiting, otherwise when the batch window ends"""
+        if len(destination.pending) >= self.max_batch:
+            self._flush(destination)
+        elif destination.pending and destination.timer is None and destination.active < self.concurrency:
+            destination.timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush, destination)
+
+    def _flush(self, destination: _Destination):
+        if destination.timer is not None:
+            destination.timer.cancel()
+            destination.timer = None
+        while destination.pending and destination.active < self.concurrency:
+            batch = [destination.pending.popleft() for _ in range(min(self.max_batch, len(destination.pending)))]
+            destination.active += 1
+            task = asyncio.get_running_loop().create_task(self._deliver(destination, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, destination: _Destination, batch: List[dict]):
+        try:
+            await self._post(destination.url, batch)
+            destination.delivered += len(batch)
+            destination.batches += 1
+        except DeliveryError as e:
+            logger.warning("Notification batch to %s failed after %d attempts: %s", destination.url, e.attempts, e)
+            self._dead_letter(destination.url, batch, e.attempts, str(e))
+        except asyncio.CancelledError:
+            self._dead_letter(destination.url, batch, 0, "cancelled at shutdown")
+            raise
+        except Exception as e:
+            logger.exception("Notification batch to %s failed", destination.url)
+            self._dead_letter(destination.url, batch, 1, f"{type(e).__name__}: {e}")
+        finally:
+            destination.active -= 1
+            # A slot freed up: send what accumulated meanwhile
+            if not self._closing:
+                self._schedule(destination)
+
+    async def _post(self, url: str, batch: List[dict]):
+        # Checked again at send time, since DNS for an accepted host can change
+        try:
+            await check_webhook_destination(url, self.allowed_hosts)
+        except ValueError as e:
+            raise DeliveryError(str(e), 0)
+        client = self._http_client()
+        # Same id on every attempt so receivers can drop duplicate deliveries
+        delivery_id = uuid.uuid4().hex
+        body = json.dumps({
+            "event": "alerts",
+            "delivery_id": delivery_id,
+            "count": len(batch),
+            "alerts": batch,
+            "sent_at": datetime.now().isoformat()
+        }, default=str)
+        headers = {"Content-Type": "application/json", "X-DarkShepherd-Delivery": delivery_id}
+
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            retry_after = None
+            try:
+                response = await client.post(url, content=body, headers=headers)
+                if response.status_code < 300:
+                    return
+                error = f"HTTP {response.status_code}"
+                if response.status_code != 429 and response.status_code < 500:
+                    raise DeliveryError(error, attempt)
+                retry_after = _retry_after(response.headers.get("Retry-After"))
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt < self.max_attempts:
+                self.retries += 1
+                await asyncio.sleep(retry_after if retry_after is not None else _backoff(attempt))
+        raise DeliveryError(error, self.max_attempts)
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.timeout),
+                headers={"User-Agent": "DarkShepherd-Notifications/1.0"}
+            )
+        return self._client
+
+    async def close(self, timeout: float = 5.0):
+        """Flush buffered alerts, wait briefly for deliveries, dead-letter the rest"""
+        for destination in self._destinations.values():
+            if destination.pending:
+                self._flush(destination)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._tasks and loop.time() < deadline:
+            await asyncio.wait(set(self._tasks), timeout=deadline - loop.time())
+        self._closing = True
+        pending = set(self._tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for destination in self._destinations.values():
+            if destination.timer is not None:
+                destination.timer.cancel()
+                destination.timer = None
+            if destination.pending:
+                self._dead_letter(destination.url, list(destination.pending), 0, "not sent before shutdown")
+                destination.pending.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ------------------------------------------------------------------
+    # Dead letters
+    # ------------------------------------------------------------------
+
+    def _dead_letter(self, url: str, alerts: List[dict], attempts: int, error: str):
+        self.dead_lettered += len(alerts)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO notification_dead_letters (letter_id, destination, created_at, attempts, error, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (f"dlq_{uuid.uuid4().hex[:12]}", url, time.time(), attempts, error, json.dumps(alerts, default=str))
+            )
+
+    def dead_letters(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT letter_id, destination, created_at, attempts, error, payload FROM notification_dead_letters "
+                "ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {
+                "letter_id": letter_id,
+                "destination": destination,
+                "created_at": datetime.fromtimestamp(created_at).isoformat(),
+                "attempts": attempts,
+                "error": error,
+                "alert_count": len(json.loads(payload)),
+                "alert_ids": [alert.get("id") for alert in json.loads(payload)]
+            }
+            for letter_id, destination, created_at, attempts, error, payload in rows
+        ]
+
+    def retry_dead_letter(self, letter_id: str) -> Optional[int]:
+        """Re-queue a dead letter's alerts to its destination; None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "DELETE FROM notification_dead_letters WHERE letter_id = ? RETURNING destination, payload", (letter_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self.enqueue(row[0], json.loads(row[1]))
+
+    def stats(self) -> dict:
+        with self._lock:
+            dead_letters = self._conn.execute("SELECT COUNT(*) FROM notification_dead_letters").fetchone()[0]
+        return {
+            "destinations": {
+                url: {
+                    "pending": len(d.pending),
+                    "in_flight": d.active,
+                    "delivered_total": d.delivered,
+                    "batches_total": d.batches
+                }
+                for url, d in self._destinations.items()
+            },
+            "retries_total": self.retries,
+            "dead_lettered_total": self.dead_lettered,
+            "dead_letters": dead_letters
+        }
+
+
+def allow_list(entries: Iterable[str]) -> Tuple[frozenset, tuple]:
+    """(host names, IP networks) from entries such as `sink.internal` or `10.0.0.0/8`"""
+    names, networks = set(), []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            names.add(entry.lower())
+    return frozenset(names), tuple(networks)
+
+
+def validate_webhook_url(url: Optional[str], allowed_hosts: Tuple[frozenset, tuple] = (frozenset(), ())):
+    """Reject non-http(s) URLs and hosts that resolve to internal addresses
+
+    Loopback, private, link-local and other non-public addresses are refused
+    unless the host or address is on the allow-list (NOTIFICATION_ALLOWED_HOSTS),
+    so notification settings cannot aim deliveries at internal services.
+    """
+    host = _webhook_host(url)
+    try:
+        addresses = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"webhook_url host {host!r} does not resolve: {e}")
+    _check_addresses(host, addresses, allowed_hosts)
+
+
+async def check_webhook_destination(url: str, allowed_hosts: Tuple[frozenset, tuple] = (frozenset(), ())):
+    """validate_webhook_url with the lookup done off the event loop"""
+    host = _webhook_host(url)
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"webhook_url host {host!r} does not resolve: {e}")
+    _check_addresses(host, addresses, allowed_hosts)
+
+
+def _webhook_host(url: Optional[str]) -> str:
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError(f"webhook_url must be an http(s) URL, got {url!r}")
+    return parsed.hostname
+
+
+def _check_addresses(host: str, addresses: list, allowed_hosts: Tuple[frozenset, tuple]):
+    names, networks = allowed_hosts
+    if host.lower() in names:
+        return
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if (not address.is_global or address.is_multicast) and not any(address in n for n in networks):
+            raise ValueError(
+                f"webhook_url host {host!r} resolves to non-public address {address}; "
+                "add it to NOTIFICATION_ALLOWED_HOSTS to allow it"
+            )
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return min(60.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+notification_dispatcher = NotificationDispatcher(
+    db_path=os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"),
+    batch_window_ms=float(os.getenv("NOTIFICATION_BATCH_WINDOW_MS", 250)),
+    max_batch=int(os.getenv("NOTIFICATION_MAX_BATCH", 100)),
+    max_pending=int(os.getenv("NOTIFICATION_MAX_PENDING", 10000)),
+    concurrency=int(os.getenv("NOTIFICATION_CONCURRENCY", 2)),
+    max_connections=int(os.getenv("NOTIFICATION_MAX_CONNECTIONS", 20)),
+    max_attempts=int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 5)),
+    allowed_hosts=os.getenv("NOTIFICATION_ALLOWED_HOSTS", "").split(",")
+)
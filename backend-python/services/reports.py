@@ -0,0 +1,457 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from services.training import _lower_priority
+
+logger = logging.getLogger(__name__)
+
+ROW_CHUNK_SIZE = 5000
+DOWNLOAD_CHUNK_LINES = 2000
+
+METRIC_COLUMNS = [
+    "orders",
+    "revenue",
+    "fraud_attempts",
+    "blocked",
+    "reviewed",
+    "blocked_revenue",
+    "low_risk",
+    "medium_risk",
+    "high_risk",
+    "avg_risk_score"
+]
+
+# Order analyses keep their scored fields in the JSON payload. json_extract
+# reads them inside SQLite without building a Python dict per order; the
+# materialized CTE extracts each field once per row rather than once per sum.
+SCORED_SQL = """
+WITH scored AS MATERIALIZED (
+    SELECT ordered_at, store_id,
+        IFNULL(json_extract(payload, '$.order_value'), 0) AS order_value,
+        json_extract(payload, '$.recommendation') AS recommendation,
+        json_extract(payload, '$.risk_level') AS risk_level,
+        IFNULL(json_extract(payload, '$.risk_score'), 0) AS risk_score
+    FROM order_analyses WHERE {where}
+)
+"""
+
+METRIC_SQL = """
+    COUNT(*),
+    SUM(order_value),
+    SUM(recommendation IN ('block', 'review')),
+    SUM(recommendation = 'block'),
+    SUM(recommendation = 'review'),
+    SUM(CASE WHEN recommendation = 'block' THEN order_value ELSE 0 END),
+    SUM(risk_level = 'low'),
+    SUM(risk_level = 'medium'),
+    SUM(risk_level = 'high'),
+    SUM(risk_score)
+"""
+
+ORDER_COLUMNS = [
+    "order_id",
+    "analyzed_at",
+    "store_id",
+    "customer_id",
+    "order_value",
+    "risk_score",
+    "risk_level",
+    "recommendation",
+    "fraud_type"
+]
+
+REPORT_TYPES = {
+    "fraud_analysis": ["date", "store_id"] + METRIC_COLUMNS,
+    "store_summary": ["store_id"] + METRIC_COLUMNS,
+    "orders": ORDER_COLUMNS
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id TEXT PRIMARY KEY,
+    report_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at);
+"""
+
+
+class ReportEngine:
+    """Builds reports from stored order analyses in a process pool
+
+    The API only records the request and hands it to a worker process, which
+    aggregates inside SQLite and writes the rows to a file; downloads stream
+    that file in chunks. Report records live in SQLite so any API worker can
+    report progress and serve the result.
+    """
+
+    def __init__(self, db_path: str, report_dir: str, max_workers: int = 2, niceness: int = 10):
+        self.db_path = db_path
+        self.report_dir = report_dir
+        self.max_workers = max_workers
+        self.niceness = niceness
+        self._pool = None
+        self._tasks = {}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def start(self, request: dict) -> dict:
+        """Validate and queue a report; returns its record"""
+        request = _normalize_request(request)
+        report_id = f"report_{uuid.uuid4().hex[:12]}"
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO reports (report_id, report_type, status, progress, created_at, updated_at, payload) "
+            "VALUES (?, ?, 'queued', 0, ?, ?, ?)",
+            (report_id, request["report_type"], now, now, json.dumps({"request": request}))
+        )
+        if self._pool is None:
+            # spawn rather than fork: the API process holds threads and SQLite handles
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(self.niceness,)
+            )
+        future = self._pool.submit(run_report, report_id, self.db_path, self.report_dir, request)
+        self._tasks[report_id] = asyncio.ensure_future(self._finish(report_id, asyncio.wrap_future(future)))
+        return self.get(report_id)
+
+    async def _finish(self, report_id: str, future):
+        try:
+            await future
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._pool = None
+            logger.exception("Report %s failed", report_id)
+            _update_report(self._conn, report_id, status="failed", error=str(e))
+        finally:
+            self._tasks.pop(report_id, None)
+
+    def get(self, report_id: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT report_id, report_type, status, progress, created_at, updated_at, payload FROM reports "
+            "WHERE report_id = ?",
+            (report_id,)
+        ).fetchone()
+        return _report_record(row) if row else None
+
+    def list(self, limit: int = 20) -> List[dict]:
+        rows = self._conn.execute(
+            "SELECT report_id, report_type, status, progress, created_at, updated_at, payload FROM reports "
+            "ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [_report_record(row) for row in rows]
+
+    def rows_path(self, report_id: str) -> str:
+        return os.path.join(self.report_dir, f"{report_id}.ndjson")
+
+    def stream(self, report: dict, format: str = "csv") -> Iterator[bytes]:
+        """Chunks of a completed report's rows as CSV, or as one JSON document"""
+        columns = report["columns"]
+        path = self.rows_path(report["report_id"])
+        if format == "csv":
+            return _csv_chunks(path, columns)
+        return _json_chunks(path, columns, report)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        # Reports started here will never finish; don't leave them looking queued
+        for report_id in list(self._tasks):
+            _update_report(self._conn, report_id, status="failed", error="Interrupted by shutdown")
+
+
+def _normalize_request(request: dict) -> dict:
+    report_type = request.get("report_type")
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report_type {report_type!r}; expected one of {', '.join(REPORT_TYPES)}")
+    start, end = _epoch(request["start_date"]), _epoch(request["end_date"])
+    if end <= start:
+        raise ValueError("end_date must be after start_date")
+    store_ids = sorted({str(store_id) for store_id in request.get("store_ids") or ()}) or None
+    return {
+        "report_type": report_type,
+        "start_date": datetime.fromtimestamp(start).isoformat(),
+        "end_date": datetime.fromtimestamp(end).isoformat(),
+        "store_ids": store_ids
+    }
+
+
+def _epoch(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def _report_record(row) -> dict:
+    report_id, report_type, status, progress, created_at, updated_at, payload = row
+    record = {
+        "report_id": report_id,
+        "report_type": report_type,
+        "status": status,
+        "progress": round(progress, 3),
+        "created_at": datetime.fromtimestamp(created_at).isoformat(),
+        "updated_at": datetime.fromtimestamp(updated_at).isoformat()
+    }
+    record.update(json.loads(payload))
+    if status == "completed":
+        record["download_url"] = f"/reports/{report_id}/download"
+    return record
+
+
+def _update_report(conn, report_id: str, status: Optional[str] = None, progress: Optional[float] = None, **details):
+    row = conn.execute("SELECT status, progress, payload FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+    if row is None:
+        return
+    payload = json.loads(row[2])
+    payload.update(details)
+    conn.execute(
+        "UPDATE reports SET status = ?, progress = ?, updated_at = ?, payload = ? WHERE report_id = ?",
+        (status or row[0], row[1] if progress is None else progress, time.time(), json.dumps(payload), report_id)
+    )
+
+
+def _read_lines(path: str) -> Iterator[List[str]]:
+    with open(path, encoding="utf-8") as f:
+        while True:
+            lines = [line for line in (f.readline() for _ in range(DOWNLOAD_CHUNK_LINES)) if line]
+            if not lines:
+                return
+            yield lines
+
+
+def _csv_chunks(path: str, columns: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for lines in _read_lines(path):
+        writer.writerows(json.loads(line) for line in lines)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _json_chunks(path: str, columns: List[str], report: dict) -> Iterator[bytes]:
+    header = {key: report[key] for key in ("report_id", "report_type", "request", "summary", "row_count")}
+    yield (json.dumps(header)[:-1] + ', "rows": [').encode("utf-8")
+    first = True
+    for lines in _read_lines(path):
+        rows = ",".join(json.dumps(dict(zip(columns, json.loads(line)))) for line in lines)
+        yield (rows if first else "," + rows).encode("utf-8")
+        first = False
+    yield b"]}"
+
+
+# ----------------------------------------------------------------------
+# Runs in the report process
+# ----------------------------------------------------------------------
+
+def run_report(report_id: str, db_path: str, report_dir: str, request: dict) -> dict:
+    """Compute a report from stored order analyses and write its rows file"""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=10)
+    # A separate reading connection: its long-lived snapshot would otherwise
+    # make every progress update fail once another process has written
+    reader = sqlite3.connect(db_path, isolation_level=None)
+    started = time.perf_counter()
+    try:
+        _update_report(conn, report_id, status="running", progress=0.0)
+        start = _epoch(request["start_date"])
+        end = _epoch(request["end_date"])
+        store_ids = request.get("store_ids")
+        report_type = request["report_type"]
+
+        os.makedirs(report_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=report_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                def write(rows):
+                    out.writelines(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+
+                def progress(fraction):
+                    _update_report(conn, report_id, progress=0.95 * fraction)
+
+                if report_type == "orders":
+                    totals, row_count = write_order_rows(reader, start, end, store_ids, write, progress)
+                else:
+                    totals, row_count = write_aggregate_rows(
+                        reader, start, end, store_ids, by_date=report_type == "fraud_analysis", write=write, progress=progress
+                    )
+            os.replace(tmp_path, os.path.join(report_dir, f"{report_id}.ndjson"))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        summary = _summary(totals)
+        _update_report(
+            conn, report_id,
+            status="completed",
+            progress=1.0,
+            columns=REPORT_TYPES[report_type],
+            row_count=row_count,
+            summary=summary,
+            completed_at=datetime.now().isoformat(),
+            elapsed_seconds=round(time.perf_counter() - started, 3)
+        )
+        return summary
+    finally:
+        reader.close()
+        conn.close()
+
+
+def _scope(start: float, end: float, store_ids: Optional[List[str]]):
+    clauses = ["ordered_at >= ?", "ordered_at < ?"]
+    params = [start, end]
+    if store_ids:
+        clauses.append(f"store_id IN ({','.join('?' * len(store_ids))})")
+        params.extend(store_ids)
+    return " AND ".join(clauses), params
+
+
+def _days(start: float, end: float) -> Iterator[tuple]:
+    """(start, end) of each local calendar day overlapping [start, end)"""
+    while start < end:
+        midnight = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = min(end, (midnight + timedelta(days=1)).timestamp())
+        yield start, day_end
+        start = day_end
+
+
+def write_aggregate_rows(conn, start: float, end: float, store_ids, by_date: bool, write, progress) -> tuple:
+    """Metric rows per (date, store) or per store; returns (totals, rows written)
+
+    Analyses are aggregated inside SQLite one day at a time, so a quarter-long
+    multi-store report never holds more than a day of groups in memory.
+    """
+    totals = [0.0] * len(METRIC_COLUMNS)
+    per_store = {}
+    row_count = 0
+    days = list(_days(start, end))
+    for i, (window_start, window_end) in enumerate(days):
+        where, params = _scope(window_start, window_end, store_ids)
+        query = SCORED_SQL.format(where=where)
+        if by_date:
+            query += (
+                f"SELECT date(ordered_at, 'unixepoch', 'localtime') AS day, store_id, {METRIC_SQL} "
+                "FROM scored GROUP BY day, store_id ORDER BY day, store_id"
+            )
+        else:
+            query += f"SELECT store_id, {METRIC_SQL} FROM scored GROUP BY store_id"
+        rows = []
+        for row in conn.execute(query, params):
+            key, metrics = row[:-len(METRIC_COLUMNS)], list(row[-len(METRIC_COLUMNS):])
+            totals = [a + (b or 0) for a, b in zip(totals, metrics)]
+            if by_date:
+                rows.append(list(key) + _finish_metrics(metrics))
+            else:
+                current = per_store.get(key[0])
+                per_store[key[0]] = metrics if current is None else [a + (b or 0) for a, b in zip(current, metrics)]
+        if rows:
+            write(rows)
+            row_count += len(rows)
+        progress((i + 1) / len(days))
+    if not by_date:
+        rows = [[store_id] + _finish_metrics(metrics) for store_id, metrics in sorted(per_store.items(), key=_store_order)]
+        write(rows)
+        row_count = len(rows)
+    return totals, row_count
+
+
+def write_order_rows(conn, start: float, end: float, store_ids, write, progress) -> tuple:
+    """One row per analysed order, oldest first; returns (totals, rows written)"""
+    where, params = _scope(start, end, store_ids)
+    totals = [0.0] * len(METRIC_COLUMNS)
+    row_count = 0
+    cursor = conn.execute(
+        "SELECT order_id, ordered_at, store_id, customer_id, "
+        "json_extract(payload, '$.order_value'), json_extract(payload, '$.risk_score'), "
+        "json_extract(payload, '$.risk_level'), json_extract(payload, '$.recommendation'), "
+        f"json_extract(payload, '$.fraud_type') FROM order_analyses WHERE {where} ORDER BY ordered_at",
+        params
+    )
+    while True:
+        chunk = cursor.fetchmany(ROW_CHUNK_SIZE)
+        if not chunk:
+            break
+        rows = []
+        for order_id, ordered_at, store_id, customer_id, value, score, level, recommendation, fraud_type in chunk:
+            totals = [a + b for a, b in zip(totals, _order_metrics(value or 0, score or 0, level, recommendation))]
+            rows.append([
+                order_id, datetime.fromtimestamp(ordered_at).isoformat(), store_id, customer_id,
+                value, score, level, recommendation, fraud_type
+            ])
+        write(rows)
+        row_count += len(rows)
+        progress(min(1.0, (chunk[-1][1] - start) / (end - start)))
+    return totals, row_count
+
+
+def _order_metrics(value: float, score: float, level: Optional[str], recommendation: Optional[str]) -> list:
+    """One order's contribution to each of METRIC_COLUMNS, as summed by METRIC_SQL"""
+    blocked = recommendation == "block"
+    reviewed = recommendation == "review"
+    return [
+        1, value, blocked or reviewed, blocked, reviewed, value if blocked else 0,
+        level == "low", level == "medium", level == "high", score
+    ]
+
+
+def _finish_metrics(metrics: list) -> list:
+    """Round sums and turn the risk score sum into an average"""
+    metrics = [m or 0 for m in metrics]
+    orders = metrics[0]
+    metrics[1] = round(metrics[1], 2)
+    metrics[5] = round(metrics[5], 2)
+    metrics[-1] = round(metrics[-1] / orders, 4) if orders else 0.0
+    return metrics
+
+
+def _store_order(item):
+    return (item[0] is None, item[0] or "")
+
+
+def _summary(totals: list) -> dict:
+    metrics = dict(zip(METRIC_COLUMNS, _finish_metrics(list(totals))))
+    orders = metrics["orders"]
+    return {
+        "total_orders": int(orders),
+        "fraud_attempts": int(metrics["fraud_attempts"]),
+        "blocked": int(metrics["blocked"]),
+        "fraud_rate": round(metrics["fraud_attempts"] / orders * 100, 2) if orders else 0.0,
+        "total_revenue": metrics["revenue"],
+        "total_loss_prevented": metrics["blocked_revenue"],
+        "avg_risk_score": metrics["avg_risk_score"]
+    }
+
+
+report_engine = ReportEngine(
+    db_path=os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"),
+    report_dir=os.getenv("REPORT_DIR", "./data/reports"),
+    max_workers=int(os.getenv("REPORT_WORKERS", 2)),
+    niceness=int(os.getenv("REPORT_NICENESS", 10))
+)
@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from services.lru import LRUCache
+from services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """How long a route's responses stay fresh and which events invalidate them"""
+    ttl: float
+    tags: Tuple[str, ...] = ()
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: list
+    body: bytes
+    etag: str
+    expires_at: float
+    generations: Tuple[int, ...]
+
+
+class ResponseCache:
+    """TTL cache of serialized GET responses with tag-based invalidation
+
+    Tag generations are always read from a local copy. With shared state,
+    invalidations are also counted in the shared store and the local copy is
+    refreshed from it at most every `refresh_seconds`, so another worker's
+    invalidation reaches this one within that interval without a shared-store
+    round-trip per request.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Dict[str, CacheRule]] = None,
+        max_entries: int = 1024,
+        state=None,
+        refresh_seconds: float = 2.0
+    ):
+        self.rules = dict(rules or {})
+        self.refresh_seconds = refresh_seconds
+        self._entries = LRUCache(max_entries)
+        self._generations = {}
+        self._inflight = {}
+        self._tasks = set()
+        self._refreshed_at = 0.0
+        self._state = state if state is not None and state.shared else None
+
+    def rule_for(self, path: str) -> Optional[CacheRule]:
+        return self.rules.get(path)
+
+    def invalidate(self, tag: str):
+        """Expire every cached response whose route carries `tag`"""
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+        if self._state is not None:
+            task = asyncio.get_running_loop().create_task(self._state.incr(f"cache_tag:{tag}"))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+    def get(self, key, rule: CacheRule) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic() or entry.generations != self._current_generations(rule):
+            self._entries.pop(key)
+            return None
+        return entry
+
+    async def get_or_compute(self, key, rule: CacheRule, compute):
+        """Return a fresh entry, running `compute` at most once per key at a time"""
+        if self._state is not None and time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            await self._refresh_generations()
+        entry = self.get(key, rule)
+        if entry is not None:
+            return entry, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            entry = await asyncio.shield(pending)
+            if entry is not None:
+                return entry, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generations = self._current_generations(rule)
+        try:
+            status, headers, body = await compute()
+            entry = None
+            if status == 200:
+                entry = CachedResponse(
+                    status=status,
+                    headers=headers,
+                    body=body,
+                    etag='"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"',
+                    expires_at=time.monotonic() + rule.ttl,
+                    generations=generations
+                )
+                self._entries.put(key, entry)
+            future.set_result(entry)
+            return (entry, False) if entry is not None else ((status, headers, body), False)
+        except BaseException:
+            future.set_result(None)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _current_generations(self, rule: CacheRule) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in rule.tags)
+
+    async def _refresh_generations(self):
+        # Stamped first, so concurrent requests don't all hit the shared store
+        self._refreshed_at = time.monotonic()
+        try:
+            shared = await self._state.counters("cache_tag:")
+        except Exception:
+            logger.exception("Cache tag refresh failed; serving with local generations")
+            return
+        # Every local bump is also counted in the shared store, so the larger value is current
+        for tag, generation in shared.items():
+            if generation > self._generations.get(tag, 0):
+                self._generations[tag] = generation
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware that serves configured GET routes from a ResponseCache
+
+    Responses carry an ETag and Cache-Control; a matching If-None-Match gets a
+    bodiless 304. Concurrent misses for the same URL share one computation.
+    """
+
+    def __init__(self, app, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        rule = self.cache.rule_for(scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        key = (scope["method"], scope["path"], query)
+
+        async def compute():
+            return await self._capture(scope, receive)
+
+        result, hit = await self.cache.get_or_compute(key, rule, compute)
+        if not isinstance(result, CachedResponse):
+            status, headers, body = result
+            await _send_response(send, status, headers, body)
+            return
+
+        cache_headers = [
+            (b"etag", result.etag.encode("latin-1")),
+            (b"cache-control", f"max-age={int(rule.ttl)}".encode("latin-1")),
+            (b"x-cache", b"HIT" if hit else b"MISS")
+        ]
+        if_none_match = _header(scope, b"if-none-match")
+        if if_none_match and result.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            await _send_response(send, 304, cache_headers, b"")
+            return
+
+        await _send_response(send, result.status, result.headers + cache_headers, result.body)
+
+    async def _capture(self, scope, receive):
+        status = 500
+        headers = []
+        chunks = []
+
+        async def capture_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    (name, value) for name, value in message.get("headers", [])
+                    if name.lower() not in (b"etag", b"cache-control")
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture_send)
+        return status, headers, b"".join(chunks)
+
+
+async def _send_response(send, status: int, headers: list, body: bytes):
+    if status == 304:
+        headers = [(name, value) for name, value in headers if name.lower() != b"content-length"]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+response_cache = ResponseCache(
+    state=shared_state,
+    refresh_seconds=float(os.getenv("SHARED_STATE_POLL_SECONDS", 2))
+)
@@ -0,0 +1,211 @@
+import os
+import time
+from datetime import date, datetime
+from typing import Optional
+
+import numpy as np
+
+COLUMNS = (
+    "orders",
+    "revenue",
+    "fraud_attempts",
+    "blocked",
+    "reviewed",
+    "blocked_revenue",
+    "low_risk",
+    "medium_risk",
+    "high_risk",
+    "low_value",
+    "medium_value",
+    "high_value",
+    "payment_fraud",
+    "account_takeover",
+    "friendly_fraud",
+    "identity_theft",
+    "rapid_orders",
+    "multiple_addresses",
+    "unusual_timing"
+)
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+LOW_VALUE_LIMIT = 100
+MEDIUM_VALUE_LIMIT = 500
+
+ALL_STORES = "__all__"
+
+
+class BucketRing:
+    """Fixed number of time buckets stored in a ring, one row of COLUMNS per bucket"""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.values = np.zeros((slots, len(COLUMNS)))
+        self.stamps = np.full(slots, -1, dtype=np.int64)
+        self.latest = -1
+
+    def add(self, index: int, row: np.ndarray):
+        # Backfilled orders older than the ring's span are dropped, never
+        # allowed to reset the newer bucket that now owns their slot
+        if index <= self.latest - self.slots:
+            return
+        slot = index % self.slots
+        stamp = self.stamps[slot]
+        if stamp > index:
+            return
+        if stamp < index:
+            self.values[slot] = 0.0
+            self.stamps[slot] = index
+        self.values[slot] += row
+        self.latest = max(self.latest, index)
+
+    def subtract(self, index: int, row: np.ndarray):
+        """Take a row back out of its bucket, if that bucket is still held"""
+        slot = index % self.slots
+        if self.stamps[slot] == index:
+            self.values[slot] -= row
+
+    def window(self, end_index: int, count: int):
+        """Bucket indexes and rows for the `count` buckets ending at `end_index`"""
+        count = max(0, min(count, self.slots))
+        indexes = np.arange(end_index - count + 1, end_index + 1)
+        slots = indexes % self.slots
+        rows = self.values[slots]
+        rows[self.stamps[slots] != indexes] = 0.0
+        return indexes, rows
+
+
+class RollupEngine:
+    """Hourly and daily per-store counters, updated as each analysis completes"""
+
+    def __init__(self, daily_slots: int = 400, hourly_slots: int = 24 * 90):
+        self.daily_slots = daily_slots
+        self.hourly_slots = hourly_slots
+        self._daily = {}
+        self._hourly = {}
+
+    @property
+    def empty(self) -> bool:
+        return not self._daily
+
+    def stores(self) -> list:
+        return [store_id for store_id in self._daily if store_id != ALL_STORES]
+
+    def record(self, features: dict, analysis: dict):
+        """Fold one scored order into its store's hourly and daily buckets"""
+        day_index, hour_index = self._indexes(features)
+        row = self._row(features, analysis)
+        for target in self._targets(features):
+            self._ring(self._daily, target, self.daily_slots).add(day_index, row)
+            self._ring(self._hourly, target, self.hourly_slots).add(hour_index, row)
+
+    def retract(self, features: dict, analysis: dict):
+        """Undo an earlier record() of the same features and analysis"""
+        day_index, hour_index = self._indexes(features)
+        row = self._row(features, analysis)
+        for target in self._targets(features):
+            if target in self._daily:
+                self._daily[target].subtract(day_index, row)
+                self._hourly[target].subtract(hour_index, row)
+
+    def daily(self, days: int, store_id: Optional[str] = None, today: Optional[date] = None):
+        """(dates, rows) for the last `days` days, oldest first"""
+        end_index = (today or date.today()).toordinal()
+        ring = self._daily.get(_store_key(store_id))
+        if ring is None:
+            indexes = np.arange(end_index - days + 1, end_index + 1)
+            return [date.fromordinal(int(i)) for i in indexes], np.zeros((days, len(COLUMNS)))
+        indexes, rows = ring.window(end_index, days)
+        return [date.fromordinal(int(i)) for i in indexes], rows
+
+    def hourly(self, hours: int, store_id: Optional[str] = None, now: Optional[datetime] = None):
+        """(hour-of-day, weekday, rows) for the last `hours` hours, oldest first"""
+        now = now or datetime.now()
+        end_index = now.toordinal() * 24 + now.hour
+        ring = self._hourly.get(_store_key(store_id))
+        if ring is None:
+            indexes = np.arange(end_index - hours + 1, end_index + 1)
+            rows = np.zeros((hours, len(COLUMNS)))
+        else:
+            indexes, rows = ring.window(end_index, hours)
+        # date.fromordinal(1) is a Monday, so weekday 0 is Monday
+        return indexes % 24, (indexes // 24 - 1) % 7, rows
+
+    def totals(self, days: int, store_id: Optional[str] = None) -> dict:
+        """Column sums over the last `days` days"""
+        _, rows = self.daily(days, store_id)
+        return dict(zip(COLUMNS, rows.sum(axis=0).tolist()))
+
+    def active_stores(self, days: int) -> int:
+        """Stores with at least one order in the last `days` days"""
+        orders = COLUMN_INDEX["orders"]
+        return sum(1 for store_id in self.stores() if self.daily(days, store_id)[1][:, orders].any())
+
+    @staticmethod
+    def _indexes(features: dict):
+        ordered_at = datetime.fromtimestamp(features.get("created_at") or time.time())
+        day_index = ordered_at.toordinal()
+        return day_index, day_index * 24 + ordered_at.hour
+
+    @staticmethod
+    def _targets(features: dict) -> list:
+        store_id = features.get("store_id")
+        return [ALL_STORES] if store_id is None else [ALL_STORES, str(store_id)]
+
+    @staticmethod
+    def _ring(rings: dict, store_id: str, slots: int) -> BucketRing:
+        ring = rings.get(store_id)
+        if ring is None:
+            ring = rings[store_id] = BucketRing(slots)
+        return ring
+
+    @staticmethod
+    def _row(features: dict, analysis: dict) -> np.ndarray:
+        row = np.zeros(len(COLUMNS))
+        order_value = float(features.get("order_value", 0) or 0)
+        recommendation = analysis.get("recommendation")
+
+        row[COLUMN_INDEX["orders"]] = 1
+        row[COLUMN_INDEX["revenue"]] = order_value
+        # Anything not allowed outright is a fraud attempt; it was either blocked
+        # or sent to manual review
+        if recommendation in ("block", "review"):
+            row[COLUMN_INDEX["fraud_attempts"]] = 1
+            if recommendation == "block":
+                row[COLUMN_INDEX["blocked"]] = 1
+                row[COLUMN_INDEX["blocked_revenue"]] = order_value
+            else:
+                row[COLUMN_INDEX["reviewed"]] = 1
+
+        risk_level = analysis.get("risk_level")
+        if risk_level in ("low", "medium", "high"):
+            row[COLUMN_INDEX[f"{risk_level}_risk"]] = 1
+
+        if order_value < LOW_VALUE_LIMIT:
+            row[COLUMN_INDEX["low_value"]] = 1
+        elif order_value < MEDIUM_VALUE_LIMIT:
+            row[COLUMN_INDEX["medium_value"]] = 1
+        else:
+            row[COLUMN_INDEX["high_value"]] = 1
+
+        fraud_type = analysis.get("fraud_type")
+        if recommendation != "allow" and fraud_type in COLUMN_INDEX:
+            row[COLUMN_INDEX[fraud_type]] = 1
+
+        for feature, column in (
+            ("rapid_ordering", "rapid_orders"),
+            ("multiple_addresses", "multiple_addresses"),
+            ("unusual_timing", "unusual_timing")
+        ):
+            if features.get(feature):
+                row[COLUMN_INDEX[column]] = 1
+        return row
+
+
+def _store_key(store_id: Optional[str]) -> str:
+    return ALL_STORES if store_id is None else str(store_id)
+
+
+rollups = RollupEngine(
+    daily_slots=int(os.getenv("ROLLUP_DAILY_DAYS", 400)),
+    hourly_slots=24 * int(os.getenv("ROLLUP_HOURLY_DAYS", 90))
+)
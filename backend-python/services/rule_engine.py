@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from typing import List, Optional
+
+ACTIONS = ("allow", "review", "block")
+NUMERIC_OPERATORS = (">", ">=", "<", "<=")
+EQUALITY_OPERATORS = ("==", "!=", "in", "not_in")
+OPERATORS = NUMERIC_OPERATORS + EQUALITY_OPERATORS
+
+logger = logging.getLogger(__name__)
+
+
+class PatternError(ValueError):
+    """Raised when a fraud pattern definition cannot be compiled"""
+
+
+class Rule:
+    """One compiled pattern: a predicate bitmask plus what to do when it matches"""
+
+    __slots__ = ("pattern_id", "name", "mask", "match_any", "risk_score", "action")
+
+    def __init__(self, pattern_id: str, name: str, mask: int, match_any: bool, risk_score: float, action: str):
+        self.pattern_id = pattern_id
+        self.name = name
+        self.mask = mask
+        self.match_any = match_any
+        self.risk_score = risk_score
+        self.action = action
+
+
+class _FeaturePlan:
+    """All predicates on one feature, laid out so a single value lookup resolves them"""
+
+    def __init__(self):
+        self.thresholds = {op: [] for op in NUMERIC_OPERATORS}
+        self.equals = {}
+        self.not_equals = {}
+        self.not_equals_all = 0
+
+    def add(self, op: str, value, bit: int):
+        if op in NUMERIC_OPERATORS:
+            self.thresholds[op].append((float(value), bit))
+        elif op in ("==", "in"):
+            for v in (value if op == "in" else [value]):
+                self.equals[_hashable(v)] = self.equals.get(_hashable(v), 0) | bit
+        else:
+            for v in (value if op == "not_in" else [value]):
+                self.not_equals[_hashable(v)] = self.not_equals.get(_hashable(v), 0) | bit
+            self.not_equals_all |= bit
+
+    def finalize(self):
+        """Sort thresholds and precompute prefix/suffix masks for bisection"""
+        self.numeric = {}
+        for op, entries in self.thresholds.items():
+            if not entries:
+                continue
+            entries.sort()
+            values = [v for v, _ in entries]
+            prefix = [0]
+            for _, bit in entries:
+                prefix.append(prefix[-1] | bit)
+            suffix = [0]
+            for _, bit in reversed(entries):
+                suffix.append(suffix[-1] | bit)
+            suffix.reverse()
+            self.numeric[op] = (values, prefix, suffix)
+        del self.thresholds
+
+    def satisfied(self, value) -> int:
+        mask = 0
+        try:
+            key = _hashable(value)
+            mask |= self.equals.get(key, 0)
+            if self.not_equals_all:
+                mask |= self.not_equals_all & ~self.not_equals.get(key, 0)
+        except TypeError:
+            pass
+        if self.numeric and not isinstance(value, str):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return mask
+            for op, (values, prefix, suffix) in self.numeric.items():
+                if op == ">":
+                    mask |= prefix[bisect_left(values, number)]
+                elif op == ">=":
+                    mask |= prefix[bisect_right(values, number)]
+                elif op == "<":
+                    mask |= suffix[bisect_right(values, number)]
+                else:
+                    mask |= suffix[bisect_left(values, number)]
+        return mask
+
+
+class CompiledRuleSet:
+    """Evaluation plan for a set of patterns
+
+    Identical predicates are interned and evaluated once per order, numeric
+    thresholds on a feature are resolved with one bisection, and each rule is
+    indexed under an anchor predicate so only rules that can match are checked.
+    """
+
+    def __init__(self, patterns: List[dict]):
+        predicate_bits = {}
+        self.features = {}
+        self.anchors = {}
+        self.rules = []
+
+        for pattern in patterns:
+            mask = 0
+            for condition in pattern["conditions"]:
+                key = (condition["feature"], condition["op"], _hashable(condition["value"]))
+                bit = predicate_bits.get(key)
+                if bit is None:
+                    bit = predicate_bits[key] = 1 << len(predicate_bits)
+                    plan = self.features.setdefault(condition["feature"], _FeaturePlan())
+                    plan.add(condition["op"], condition["value"], bit)
+                mask |= bit
+
+            rule = Rule(
+                pattern["pattern_id"],
+                pattern.get("name", pattern["pattern_id"]),
+                mask,
+                pattern.get("match", "all") == "any",
+                float(pattern.get("risk_score", 0.0)),
+                pattern.get("action", "review")
+            )
+            self.rules.append(rule)
+            # AND rules need every predicate, so any one of them works as the anchor
+            anchor_bits = [mask & -mask] if not rule.match_any else _bits(mask)
+            for bit in anchor_bits:
+                self.anchors.setdefault(bit, []).append(rule)
+
+        for plan in self.features.values():
+            plan.finalize()
+        self.predicate_count = len(predicate_bits)
+
+    def evaluate(self, features: dict) -> List[Rule]:
+        """Rules matched by an order's features"""
+        satisfied = 0
+        for feature, plan in self.features.items():
+            value = features.get(feature)
+            if value is not None:
+                satisfied |= plan.satisfied(value)
+        if not satisfied:
+            return []
+
+        matched = []
+        seen = set()
+        for bit in _bits(satisfied):
+            for rule in self.anchors.get(bit, ()):
+                if rule.match_any:
+                    if rule.pattern_id not in seen:
+                        seen.add(rule.pattern_id)
+                        matched.append(rule)
+                elif rule.mask & satisfied == rule.mask:
+                    matched.append(rule)
+        return matched
+
+
+class PatternRegistry:
+    """Merchant fraud patterns persisted in SQLite and compiled per store"""
+
+    def __init__(self, db_path: str):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fraud_patterns ("
+            "pattern_id TEXT PRIMARY KEY, store_id TEXT, created_at REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._compiled = {}
+        # Bumped on every change so callers can key caches on the active pattern set
+        self.generation = 0
+        self._load()
+
+    def refresh(self) -> bool:
+        """Reload if another worker changed the stored patterns; True if reloaded"""
+        with self._lock:
+            if self._table_signature() == self._signature:
+                return False
+            self._load()
+            self._compiled.clear()
+            self.generation += 1
+        return True
+
+    def _load(self):
+        self._patterns = {}
+        for pattern_id, payload in self._conn.execute("SELECT pattern_id, payload FROM fraud_patterns ORDER BY created_at"):
+            pattern = json.loads(payload)
+            # Stored before values were validated; one bad pattern must not break scoring
+            try:
+                CompiledRuleSet([validate_pattern(pattern)])
+            except (TypeError, ValueError) as e:
+                logger.warning("Skipping fraud pattern %s that cannot be compiled: %s", pattern_id, e)
+                continue
+            self._patterns[pattern_id] = pattern
+        self._signature = self._table_signature()
+
+    def _table_signature(self) -> tuple:
+        # Writes replace created_at with the current time and deletes lower the count
+        return self._conn.execute("SELECT COUNT(*), MAX(created_at) FROM fraud_patterns").fetchone()
+
+    def add(self, pattern: dict) -> dict:
+        """Validate, persist and compile a new pattern"""
+        pattern = validate_pattern(pattern)
+        pattern["pattern_id"] = pattern.get("pattern_id") or f"pattern_{uuid.uuid4().hex[:12]}"
+        pattern["created_at"] = time.time()
+        # Compile it on its own first: a pattern that cannot be evaluated must never be stored
+        try:
+            CompiledRuleSet([pattern])
+        except (TypeError, ValueError) as e:
+            raise PatternError(f"Pattern cannot be compiled: {e}")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fraud_patterns (pattern_id, store_id, created_at, payload) VALUES (?, ?, ?, ?)",
+                (pattern["pattern_id"], pattern.get("store_id"), pattern["created_at"], json.dumps(pattern))
+            )
+            self._patterns[pattern["pattern_id"]] = pattern
+            self._signature = self._table_signature()
+            self._compiled.clear()
+            self.generation += 1
+        return pattern
+
+    def remove(self, pattern_id: str) -> bool:
+        with self._lock:
+            removed = self._patterns.pop(pattern_id, None) is not None
+            self._conn.execute("DELETE FROM fraud_patterns WHERE pattern_id = ?", (pattern_id,))
+            self._signature = self._table_signature()
+            self._compiled.clear()
+            self.generation += 1
+        return removed
+
+    def list(self, store_id: Optional[str] = None) -> List[dict]:
+        return [
+            p for p in self._patterns.values()
+            if store_id is None or p.get("store_id") in (None, store_id)
+        ]
+
+    def ruleset(self, store_id: Optional[str] = None) -> CompiledRuleSet:
+        """Compiled plan of global patterns plus those of `store_id`"""
+        key = None if store_id is None else str(store_id)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            patterns = [p for p in self._patterns.values() if p.get("store_id") in (None, key)]
+            compiled = self._compiled[key] = CompiledRuleSet(patterns)
+        return compiled
+
+    def features_used(self, store_id: Optional[str] = None) -> List[str]:
+        """Feature names referenced by the patterns that apply to `store_id`"""
+        if not self._patterns:
+            return []
+        return list(self.ruleset(store_id).features)
+
+    def evaluate(self, features: dict) -> List[Rule]:
+        if not self._patterns:
+            return []
+        return self.ruleset(features.get("store_id")).evaluate(features)
+
+
+def validate_pattern(pattern: dict) -> dict:
+    """Check a pattern definition and normalize its fields"""
+    conditions = pattern.get("conditions")
+    if not isinstance(conditions, list) or not conditions:
+        raise PatternError("Pattern needs a non-empty 'conditions' list")
+    for condition in conditions:
+        if not isinstance(condition, dict) or not {"feature", "op", "value"} <= set(condition):
+            raise PatternError("Each condition needs 'feature', 'op' and 'value'")
+        if condition["op"] not in OPERATORS:
+            raise PatternError(f"Unsupported operator {condition['op']!r}; use one of {', '.join(OPERATORS)}")
+        if condition["op"] in NUMERIC_OPERATORS and not _is_number(condition["value"]):
+            raise PatternError(f"Operator {condition['op']!r} needs a numeric value")
+        if condition["op"] in ("in", "not_in") and not isinstance(condition["value"], list):
+            raise PatternError(f"Operator {condition['op']!r} needs a list value")
+        values = condition["value"] if isinstance(condition["value"], list) else [condition["value"]]
+        if not all(_is_scalar(v) for v in values):
+            raise PatternError("Condition values must be a string, number, boolean or null, or a list of them")
+    if pattern.get("match", "all") not in ("all", "any"):
+        raise PatternError("'match' must be 'all' or 'any'")
+    if pattern.get("action", "review") not in ACTIONS:
+        raise PatternError(f"'action' must be one of {', '.join(ACTIONS)}")
+    risk_score = pattern.get("risk_score", 0.0)
+    if not _is_number(risk_score) or not 0 <= float(risk_score) <= 1:
+        raise PatternError("'risk_score' must be a number between 0 and 1")
+    return dict(pattern)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low
+        mask ^= low
+
+
+pattern_registry = PatternRegistry(os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"))
@@ -0,0 +1,142 @@
+import asyncio
+import inspect
+import logging
+import math
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the scoring queue is at capacity"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ScoringQueue:
+    """Bounded in-process work queue drained by a fixed pool of async workers"""
+
+    def __init__(self, maxsize: int = 1000, workers: int = 4, latency_window: int = 1024):
+        self.maxsize = maxsize
+        self.num_workers = workers
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._workers = []
+        self._in_flight = 0
+        self._high_water_mark = 0
+        self._enqueued = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_ms = deque(maxlen=latency_window)
+        self._run_ms = deque(maxlen=latency_window)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Spawn the worker pool on the running event loop"""
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"scoring-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued jobs a chance to finish, then cancel the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Scoring queue stopped with %d jobs still queued", self.depth)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, func, *args):
+        """Enqueue a job without waiting, raising QueueFullError when at capacity"""
+        if not self._workers:
+            self.start()
+        try:
+            self._queue.put_nowait((func, args, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise QueueFullError(
+                f"Scoring queue is full ({self.maxsize} jobs pending)",
+                retry_after=self._estimate_retry_after()
+            )
+        self._enqueued += 1
+        self._high_water_mark = max(self._high_water_mark, self.depth)
+
+    def _estimate_retry_after(self) -> int:
+        """Seconds until roughly one worker-slot's worth of the backlog has drained"""
+        if not self._run_ms:
+            return 1
+        avg_run_s = sum(self._run_ms) / len(self._run_ms) / 1000
+        return max(1, math.ceil(self.depth * avg_run_s / self.num_workers))
+
+    async def _worker(self, worker_id: int):
+        while True:
+            func, args, enqueued_at = await self._queue.get()
+            started_at = time.perf_counter()
+            self._wait_ms.append((started_at - enqueued_at) * 1000)
+            self._in_flight += 1
+            try:
+                result = func(*args)
+                if inspect.isawaitable(result):
+                    await result
+                self._completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._failed += 1
+                logger.exception("Scoring worker %d failed running %s", worker_id, getattr(func, "__name__", func))
+            finally:
+                self._in_flight -= 1
+                self._run_ms.append((time.perf_counter() - started_at) * 1000)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """Queue depth, throughput counters and latency percentiles"""
+        wait_ms = sorted(self._wait_ms)
+        run_ms = sorted(self._run_ms)
+        return {
+            "depth": self.depth,
+            "capacity": self.maxsize,
+            "utilization": round(self.depth / self.maxsize, 3) if self.maxsize else 0.0,
+            "high_water_mark": self._high_water_mark,
+            "workers": len(self._workers),
+            "in_flight": self._in_flight,
+            "enqueued_total": self._enqueued,
+            "completed_total": self._completed,
+            "failed_total": self._failed,
+            "rejected_total": self._rejected,
+            "wait_ms": {
+                "p50": round(_percentile(wait_ms, 50), 3),
+                "p95": round(_percentile(wait_ms, 95), 3),
+                "p99": round(_percentile(wait_ms, 99), 3)
+            },
+            "run_ms": {
+                "p50": round(_percentile(run_ms, 50), 3),
+                "p95": round(_percentile(run_ms, 95), 3),
+                "p99": round(_percentile(run_ms, 99), 3)
+            }
+        }
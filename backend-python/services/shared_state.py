@@ -0,0 +1,210 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+
+class LocalState:
+    """Counters and expiring keys in this process only (single-worker serving)
+
+    Every backend exposes the same coroutine methods, so callers await them
+    the same way whether or not the state is shared.
+    """
+
+    backend = "local"
+    shared = False
+
+    def __init__(self):
+        self._counters = {}
+        self._keys = {}
+        self._purged_at = time.monotonic()
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        value = self._counters[key] = self._counters.get(key, 0) + amount
+        return value
+
+    async def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def counters(self, prefix: str) -> Dict[str, int]:
+        return {key[len(prefix):]: value for key, value in self._counters.items() if key.startswith(prefix)}
+
+    async def add(self, key: str, ttl: float) -> bool:
+        """Set `key` unless it is already set and unexpired; True if it was set"""
+        now = time.monotonic()
+        expires_at = self._keys.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+        self._keys[key] = now + ttl
+        if now - self._purged_at > 60:
+            self._keys = {k: e for k, e in self._keys.items() if e > now}
+            self._purged_at = now
+        return True
+
+    async def delete(self, key: str):
+        self._keys.pop(key, None)
+
+    async def stats(self) -> dict:
+        return {"backend": self.backend, "pid": os.getpid(), "keys": len(self._keys), "counters": len(self._counters)}
+
+
+class SQLiteState:
+    """Counters and expiring keys in a SQLite file shared by all workers on the host
+
+    The sqlite3 calls block, so each one runs on a dedicated thread and the
+    event loop only awaits it.
+    """
+
+    backend = "sqlite"
+    shared = True
+
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, db_path: str):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS shared_counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS shared_keys (key TEXT PRIMARY KEY, expires_at REAL NOT NULL) WITHOUT ROWID;
+            """
+        )
+        self._lock = threading.Lock()
+        self._purged_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self._run(self._incr, key, amount)
+
+    async def counter(self, key: str) -> int:
+        return await self._run(self._counter, key)
+
+    async def counters(self, prefix: str) -> Dict[str, int]:
+        return await self._run(self._counters, prefix)
+
+    async def add(self, key: str, ttl: float) -> bool:
+        """Set `key` unless it is already set and unexpired; True if it was set"""
+        return await self._run(self._add, key, ttl)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def stats(self) -> dict:
+        return await self._run(self._stats)
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO shared_counters (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + excluded.value RETURNING value",
+                (key, amount)
+            ).fetchone()[0]
+
+    def _counter(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM shared_counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _counters(self, prefix: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM shared_counters WHERE key >= ? AND key < ?",
+                (prefix, prefix + "\uffff")
+            ).fetchall()
+        return {key[len(prefix):]: value for key, value in rows}
+
+    def _add(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # A single upsert, so two workers racing on the same key cannot both win
+            added = self._conn.execute(
+                "INSERT INTO shared_keys (key, expires_at) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET expires_at = excluded.expires_at WHERE expires_at <= ?",
+                (key, now + ttl, now)
+            ).rowcount > 0
+            if now - self._purged_at > self.PURGE_INTERVAL_SECONDS:
+                self._conn.execute("DELETE FROM shared_keys WHERE expires_at <= ?", (now,))
+                self._purged_at = now
+        return added
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_keys WHERE key = ?", (key,))
+
+    def _stats(self) -> dict:
+        with self._lock:
+            keys = self._conn.execute("SELECT COUNT(*) FROM shared_keys").fetchone()[0]
+            counters = self._conn.execute("SELECT COUNT(*) FROM shared_counters").fetchone()[0]
+        return {"backend": self.backend, "pid": os.getpid(), "keys": keys, "counters": counters}
+
+
+class RedisState:
+    """Counters and expiring keys in Redis, for workers spread over several hosts"""
+
+    backend = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "darkshepherd:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_BACKEND=redis requires the redis package") from e
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self._redis.incrby(self._prefix + key, amount)
+
+    async def counter(self, key: str) -> int:
+        value = await self._redis.get(self._prefix + key)
+        return int(value) if value is not None else 0
+
+    async def counters(self, prefix: str) -> Dict[str, int]:
+        keys = [key async for key in self._redis.scan_iter(match=f"{self._prefix}{prefix}*", count=500)]
+        if not keys:
+            return {}
+        start = len(self._prefix) + len(prefix)
+        return {
+            key.decode()[start:]: int(value)
+            for key, value in zip(keys, await self._redis.mget(keys))
+            if value is not None
+        }
+
+    async def add(self, key: str, ttl: float) -> bool:
+        """Set `key` unless it is already set and unexpired; True if it was set"""
+        return bool(await self._redis.set(self._prefix + key, 1, nx=True, px=max(1, int(ttl * 1000))))
+
+    async def delete(self, key: str):
+        await self._redis.delete(self._prefix + key)
+
+    async def stats(self) -> dict:
+        return {"backend": self.backend, "pid": os.getpid(), "keys": await self._redis.dbsize()}
+
+
+def web_concurrency() -> int:
+    """Number of uvicorn worker processes this deployment runs"""
+    return max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+
+
+def create_shared_state(backend: Optional[str] = None):
+    """State backend from SHARED_STATE_BACKEND; defaults to sqlite when serving with several workers"""
+    backend = backend or os.getenv("SHARED_STATE_BACKEND") or ("sqlite" if web_concurrency() > 1 else "local")
+    if backend == "local":
+        return LocalState()
+    if backend == "sqlite":
+        return SQLiteState(os.getenv("SHARED_STATE_DB_PATH") or os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"))
+    if backend == "redis":
+        return RedisState(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+
+
+shared_state = create_shared_state()
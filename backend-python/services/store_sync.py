@@ -0,0 +1,488 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ("orders", "customers")
+PAGE_SIZE = 250
+MAX_RETRIES = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_syncs (
+    sync_id TEXT PRIMARY KEY,
+    store_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_store_syncs_store ON store_syncs (store_id, created_at);
+
+CREATE TABLE IF NOT EXISTS store_sync_cursors (
+    sync_id TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sync_id, resource, window_start)
+);
+"""
+
+# Columns added after the first release; created on startup when missing
+MIGRATIONS = (
+    ("store_syncs", "owner", "TEXT"),
+    ("store_syncs", "heartbeat_at", "REAL"),
+)
+
+ACTIVE = ("queued", "running")
+
+
+class SyncError(Exception):
+    """Raised when a sync cannot be started or resumed"""
+
+
+class CallLimitPacer:
+    """Client-side model of Shopify's leaky-bucket REST call limit
+
+    Requests wait for bucket room before they are sent, and the model is
+    corrected from each response's X-Shopify-Shop-Api-Call-Limit header.
+    """
+
+    def __init__(self, bucket_size: int = 40, leak_rate: float = 2.0, headroom: int = 2):
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.headroom = headroom
+        self._level = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            self._leak()
+            excess = self._level + 1 - (self.bucket_size - self.headroom)
+            if excess > 0:
+                delay = excess / self.leak_rate
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._leak()
+            self._level += 1
+
+    def observe(self, header: Optional[str]):
+        """Sync the bucket level with the server's `used/size` report"""
+        if not header or "/" not in header:
+            return
+        used, size = header.split("/", 1)
+        try:
+            self._leak()
+            self._level = max(self._level, float(used))
+            self.bucket_size = int(size)
+        except ValueError:
+            pass
+
+    async def backoff(self, seconds: float):
+        """Pause every request after a 429"""
+        async with self._lock:
+            self.waited_seconds += seconds
+            await asyncio.sleep(seconds)
+            self._level = float(self.bucket_size)
+            self._updated = time.monotonic()
+
+    def _leak(self):
+        now = time.monotonic()
+        self._level = max(0.0, self._level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+
+
+class StoreSyncEngine:
+    """Pulls a store's orders and customers from the Shopify Admin REST API
+
+    The sync range is split into created_at windows that are fetched
+    concurrently, each paginated with a `since_id` cursor. Cursors and progress
+    are persisted after every page, so an interrupted sync resumes where it
+    stopped. Fetched pages are passed to the handler registered per resource.
+
+    Each queued or running sync is owned by the worker running it, which
+    refreshes the row's heartbeat every `heartbeat_seconds`. Only syncs whose
+    heartbeat has gone stale are treated as interrupted, so a worker starting
+    up or resuming never takes over a sync another live worker is running.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        api_version: str = "2023-10",
+        base_url: Optional[str] = None,
+        concurrency: int = 4,
+        window_days: int = 30,
+        bucket_size: int = 40,
+        leak_rate: float = 2.0,
+        heartbeat_seconds: float = 10.0
+    ):
+        self.api_version = api_version
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.window_days = window_days
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.heartbeat_seconds = heartbeat_seconds
+        self._handlers = {}
+        self._tasks = {}
+        self._credentials = {}
+        self._token = uuid.uuid4().hex
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._reclaim_stale()
+
+    @property
+    def owner(self) -> str:
+        """Tag for syncs this process runs; the pid tells apart workers forked after import"""
+        return f"{self._token}:{os.getpid()}"
+
+    def register_handler(self, resource: str, handler):
+        """`await handler(store_id, records)` is called with every fetched page"""
+        self._handlers[resource] = handler
+
+    def start(
+        self,
+        store_id: str,
+        shop_domain: str,
+        access_token: str,
+        resources: List[str] = RESOURCES,
+        since_days: int = 365
+    ) -> dict:
+        """Create a sync for the last `since_days` days and start it"""
+        unknown = set(resources) - set(RESOURCES)
+        if unknown:
+            raise SyncError(f"Unknown resources: {', '.join(sorted(unknown))}")
+        self._reclaim_stale()
+        running = self._conn.execute(
+            "SELECT sync_id FROM store_syncs WHERE store_id = ? AND status IN (?, ?)",
+            (store_id, *ACTIVE)
+        ).fetchone()
+        if running:
+            raise SyncError(f"Store {store_id} already has sync {running[0]} running")
+
+        sync_id = f"sync_{uuid.uuid4().hex[:12]}"
+        now = time.time()
+        windows = _windows(datetime.now(timezone.utc) - timedelta(days=since_days), self.window_days)
+        payload = {
+            "shop_domain": shop_domain,
+            "resources": list(resources),
+            "since_days": since_days,
+            "progress": {resource: {"fetched": 0, "expected": None, "pages": 0} for resource in resources},
+            "windows_total": len(windows) * len(resources),
+            "windows_done": 0,
+            "elapsed_seconds": 0.0,
+            "throttled_seconds": 0.0,
+            "errors": []
+        }
+        self._conn.execute("BEGIN")
+        self._conn.execute(
+            "INSERT INTO store_syncs (sync_id, store_id, status, created_at, updated_at, payload, owner, heartbeat_at) "
+            "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+            (sync_id, store_id, now, now, json.dumps(payload), self.owner, now)
+        )
+        self._conn.executemany(
+            "INSERT INTO store_sync_cursors (sync_id, resource, window_start, window_end) VALUES (?, ?, ?, ?)",
+            [(sync_id, resource, start, end) for resource in resources for start, end in windows]
+        )
+        self._conn.execute("COMMIT")
+
+        self._launch(sync_id, store_id, shop_domain, access_token)
+        return self.get(sync_id)
+
+    def resume(self, sync_id: str, access_token: Optional[str] = None) -> dict:
+        """Continue an interrupted or failed sync from its stored cursors"""
+        job = self.get(sync_id)
+        if job is None:
+            raise SyncError(f"Sync {sync_id} not found")
+        if job["status"] == "completed":
+            raise SyncError(f"Sync {sync_id} already completed")
+        task = self._tasks.get(sync_id)
+        if task is not None and not task.done():
+            return job
+        access_token = access_token or self._credentials.get(sync_id)
+        if not access_token:
+            raise SyncError("An access token is required to resume this sync")
+        self._reclaim_stale()
+        # Claimed in one statement, so two workers resuming the same sync cannot both win
+        claimed = self._conn.execute(
+            "UPDATE store_syncs SET status = 'queued', owner = ?, heartbeat_at = ?, updated_at = ? "
+            "WHERE sync_id = ? AND status NOT IN ('completed', ?, ?)",
+            (self.owner, time.time(), time.time(), sync_id, *ACTIVE)
+        ).rowcount
+        if not claimed:
+            raise SyncError(f"Sync {sync_id} is being run by another worker")
+        self._launch(sync_id, job["store_id"], job["shop_domain"], access_token)
+        return self.get(sync_id)
+
+    def get(self, sync_id: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT sync_id, store_id, status, created_at, updated_at, payload FROM store_syncs WHERE sync_id = ?",
+            (sync_id,)
+        ).fetchone()
+        return _sync_record(row) if row else None
+
+    def list(self, store_id: str, limit: int = 20) -> List[dict]:
+        rows = self._conn.execute(
+            "SELECT sync_id, store_id, status, created_at, updated_at, payload FROM store_syncs "
+            "WHERE store_id = ? ORDER BY created_at DESC LIMIT ?",
+            (store_id, limit)
+        ).fetchall()
+        return [_sync_record(row) for row in rows]
+
+    async def shutdown(self):
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Covers syncs cancelled before they started running
+        self._conn.execute(
+            "UPDATE store_syncs SET status = 'interrupted', owner = NULL WHERE owner = ? AND status IN (?, ?)",
+            (self.owner, *ACTIVE)
+        )
+
+    def _launch(self, sync_id: str, store_id: str, shop_domain: str, access_token: str):
+        self._credentials[sync_id] = access_token
+        self._tasks[sync_id] = asyncio.ensure_future(self._run(sync_id, store_id, shop_domain, access_token))
+
+    async def _run(self, sync_id: str, store_id: str, shop_domain: str, access_token: str):
+        self._set_status(sync_id, "running")
+        heartbeat = asyncio.ensure_future(self._heartbeat(sync_id))
+        try:
+            await self._fetch(sync_id, store_id, shop_domain, access_token)
+        finally:
+            heartbeat.cancel()
+            self._conn.execute(
+                "UPDATE store_syncs SET owner = NULL WHERE sync_id = ? AND owner = ?",
+                (sync_id, self.owner)
+            )
+
+    async def _heartbeat(self, sync_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self._conn.execute(
+                "UPDATE store_syncs SET heartbeat_at = ? WHERE sync_id = ? AND owner = ?",
+                (time.time(), sync_id, self.owner)
+            )
+
+    async def _fetch(self, sync_id: str, store_id: str, shop_domain: str, access_token: str):
+        pacer = CallLimitPacer(self.bucket_size, self.leak_rate)
+        started = time.monotonic()
+        previous = self.get(sync_id)
+
+        def stamp(p):
+            p["elapsed_seconds"] = round(previous["elapsed_seconds"] + time.monotonic() - started, 3)
+            p["throttled_seconds"] = round(previous["throttled_seconds"] + pacer.waited_seconds, 3)
+
+        async with httpx.AsyncClient(
+            base_url=self._api_base(shop_domain),
+            headers={"X-Shopify-Access-Token": access_token, "Accept": "application/json"},
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            timeout=httpx.Timeout(30.0)
+        ) as client:
+            try:
+                job = self.get(sync_id)
+                for resource in job["resources"]:
+                    if job["progress"][resource]["expected"] is None:
+                        expected = await self._count(client, pacer, resource, job["since_days"])
+                        self._update(sync_id, lambda p: p["progress"][resource].update(expected=expected))
+
+                pending = self._conn.execute(
+                    "SELECT resource, window_start, window_end, last_id FROM store_sync_cursors "
+                    "WHERE sync_id = ? AND done = 0 ORDER BY window_start DESC",
+                    (sync_id,)
+                ).fetchall()
+                semaphore = asyncio.Semaphore(self.concurrency)
+
+                async def run_window(cursor):
+                    async with semaphore:
+                        await self._sync_window(client, pacer, sync_id, store_id, stamp, *cursor)
+
+                # A failing window cancels the rest; their cursors are already saved
+                async with asyncio.TaskGroup() as group:
+                    for cursor in pending:
+                        group.create_task(run_window(cursor))
+                self._update(sync_id, stamp)
+                self._set_status(sync_id, "completed")
+                self._credentials.pop(sync_id, None)
+            except asyncio.CancelledError:
+                self._set_status(sync_id, "interrupted")
+                raise
+            except Exception as e:
+                logger.exception("Store sync %s failed", sync_id)
+                errors = e.exceptions if isinstance(e, BaseExceptionGroup) else [e]
+                self._update(sync_id, lambda p: p["errors"].extend(str(error) for error in errors))
+                self._set_status(sync_id, "failed")
+
+    async def _sync_window(self, client, pacer, sync_id, store_id, stamp, resource, window_start, window_end, last_id):
+        handler = self._handlers.get(resource)
+        params = {
+            "limit": PAGE_SIZE,
+            "created_at_min": window_start,
+            "created_at_max": window_end
+        }
+        if resource == "orders":
+            params["status"] = "any"
+
+        while True:
+            response = await self._get(client, pacer, f"/{resource}.json", dict(params, since_id=last_id))
+            records = response.json().get(resource, [])
+            if records:
+                if handler is not None:
+                    await handler(store_id, records)
+                last_id = max(record["id"] for record in records)
+            done = len(records) < PAGE_SIZE
+
+            self._conn.execute(
+                "UPDATE store_sync_cursors SET last_id = ?, fetched = fetched + ?, done = ? "
+                "WHERE sync_id = ? AND resource = ? AND window_start = ?",
+                (last_id, len(records), int(done), sync_id, resource, window_start)
+            )
+
+            def advance(p, count=len(records)):
+                p["progress"][resource]["fetched"] += count
+                p["progress"][resource]["pages"] += 1
+                p["windows_done"] += int(done)
+                stamp(p)
+            self._update(sync_id, advance)
+            if done:
+                return
+
+    async def _count(self, client, pacer, resource: str, since_days: int) -> Optional[int]:
+        params = {"created_at_min": (datetime.now(timezone.utc) - timedelta(days=since_days)).isoformat()}
+        if resource == "orders":
+            params["status"] = "any"
+        try:
+            return (await self._get(client, pacer, f"/{resource}/count.json", params)).json().get("count")
+        except httpx.HTTPError:
+            return None
+
+    async def _get(self, client, pacer, path: str, params: dict) -> httpx.Response:
+        """GET with call-limit pacing and retries on 429, 5xx and transport errors"""
+        for attempt in range(MAX_RETRIES + 1):
+            await pacer.acquire()
+            try:
+                response = await client.get(path, params=params)
+            except httpx.TransportError:
+                if attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            pacer.observe(response.headers.get("X-Shopify-Shop-Api-Call-Limit"))
+            if response.status_code == 429:
+                await pacer.backoff(float(response.headers.get("Retry-After", 2)))
+                continue
+            if response.status_code >= 500 and attempt < MAX_RETRIES:
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            response.raise_for_status()
+            return response
+        raise SyncError(f"Gave up on {path} after {MAX_RETRIES} retries")
+
+    def _api_base(self, shop_domain: str) -> str:
+        base = self.base_url or f"https://{shop_domain}"
+        return f"{base.rstrip('/')}/admin/api/{self.api_version}"
+
+    def _migrate(self):
+        for table, column, column_type in MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _reclaim_stale(self):
+        """Mark syncs whose owner stopped heartbeating (a crash or restart) as interrupted"""
+        self._conn.execute(
+            "UPDATE store_syncs SET status = 'interrupted', owner = NULL "
+            "WHERE status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (*ACTIVE, time.time() - 3 * self.heartbeat_seconds)
+        )
+
+    def _set_status(self, sync_id: str, status: str):
+        self._conn.execute(
+            "UPDATE store_syncs SET status = ?, updated_at = ? WHERE sync_id = ?",
+            (status, time.time(), sync_id)
+        )
+
+    def _update(self, sync_id: str, mutate):
+        """Read-modify-write a sync's progress payload"""
+        row = self._conn.execute("SELECT payload FROM store_syncs WHERE sync_id = ?", (sync_id,)).fetchone()
+        payload = json.loads(row[0])
+        mutate(payload)
+        self._conn.execute(
+            "UPDATE store_syncs SET payload = ?, updated_at = ? WHERE sync_id = ?",
+            (json.dumps(payload), time.time(), sync_id)
+        )
+
+
+def _windows(since: datetime, window_days: int) -> List[tuple]:
+    """[start, end) created_at windows from `since` to now, as ISO strings"""
+    windows = []
+    end = datetime.now(timezone.utc) + timedelta(minutes=5)
+    start = since
+    while start < end:
+        window_end = min(start + timedelta(days=window_days), end)
+        windows.append((start.isoformat(), window_end.isoformat()))
+        start = window_end
+    return windows
+
+
+def _backoff(attempt: int) -> float:
+    return min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _sync_record(row) -> dict:
+    sync_id, store_id, status, created_at, updated_at, payload = row
+    record = {
+        "sync_id": sync_id,
+        "store_id": store_id,
+        "status": status,
+        "created_at": datetime.fromtimestamp(created_at).isoformat(),
+        "updated_at": datetime.fromtimestamp(updated_at).isoformat()
+    }
+    record.update(json.loads(payload))
+    fetched = sum(p["fetched"] for p in record["progress"].values())
+    expected = [p["expected"] for p in record["progress"].values()]
+    if expected and all(e is not None for e in expected) and sum(expected):
+        record["percent_complete"] = round(min(100.0, 100 * fetched / sum(expected)), 1)
+    else:
+        record["percent_complete"] = round(100 * record["windows_done"] / max(1, record["windows_total"]), 1)
+    return record
+
+
+def shop_domain_from_env() -> Optional[str]:
+    shop = os.getenv("SHOPIFY_SHOP_NAME")
+    if not shop:
+        return None
+    return shop if "." in shop else f"{shop}.myshopify.com"
+
+
+store_sync = StoreSyncEngine(
+    db_path=os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"),
+    api_version=os.getenv("SHOPIFY_API_VERSION", "2023-10"),
+    base_url=os.getenv("SHOPIFY_API_BASE_URL") or None,
+    concurrency=int(os.getenv("SYNC_CONCURRENCY", 4)),
+    window_days=int(os.getenv("SYNC_WINDOW_DAYS", 30)),
+    bucket_size=int(os.getenv("SHOPIFY_CALL_LIMIT", 40)),
+    leak_rate=float(os.getenv("SHOPIFY_LEAK_RATE", 2.0)),
+    heartbeat_seconds=float(os.getenv("SYNC_HEARTBEAT_SECONDS", 10))
+)
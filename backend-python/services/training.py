@@ -0,0 +1,394 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from services.model_registry import FRAUD_MODEL, MODEL_FEATURES, latest_artifact
+
+logger = logging.getLogger(__name__)
+
+# Factor labels written by the scoring pipeline, mapped back to model features
+FACTOR_FEATURES = {
+    "high_order_value": "high_value",
+    "new_customer_account": "new_customer",
+    "international_shipping": "international_shipping",
+    "multiple_payment_methods": "multiple_payment_methods",
+    "multiple_shipping_addresses": "multiple_addresses",
+    "unusual_order_timing": "unusual_timing",
+    "rapid_order_placement": "rapid_ordering"
+}
+
+# Fewer confirmed outcomes than this and a job fails instead of training
+MIN_LABELLED_ANALYSES = int(os.getenv("TRAINING_MIN_LABELS", 100))
+READ_CHUNK_SIZE = 50_000
+TRAINING_EPOCHS = 5
+MINI_BATCH_SIZE = 10_000
+HOLDOUT_EVERY = 10
+# A queued or running job whose worker has not heartbeated for 3 intervals is abandoned
+HEARTBEAT_SECONDS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS training_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_training_jobs_created ON training_jobs (created_at);
+
+-- One row per written artifact, so two jobs can never claim the same version
+CREATE TABLE IF NOT EXISTS model_versions (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (name, version)
+);
+"""
+
+# Columns added after the first release; created on startup when missing
+MIGRATIONS = (
+    ("training_jobs", "heartbeat_at", "REAL"),
+)
+
+ACTIVE = ("queued", "running")
+
+
+class TrainingBusyError(Exception):
+    """Raised when a training job is already queued or running"""
+
+    def __init__(self, job: dict):
+        super().__init__(f"Training job {job['job_id']} is already {job['status']}")
+        self.job = job
+
+
+class TrainingJobRunner:
+    """Trains models in a separate process and hot-swaps them into the registry
+
+    Job records live in SQLite so progress written by the training process can
+    be polled from any API worker. A job is claimed in a single transaction
+    that fails while another worker's job is queued or running, and the
+    claiming worker heartbeats it until it finishes; jobs left behind by a
+    worker that died are marked failed.
+    """
+
+    def __init__(self, db_path: str, model_dir: str, max_samples: int = 2_000_000, niceness: int = 10):
+        self.db_path = db_path
+        self.model_dir = model_dir
+        self.max_samples = max_samples
+        self.niceness = niceness
+        self._pool = None
+        self._tasks = {}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._reclaim_stale()
+        self._conn.execute("COMMIT")
+
+    def start(self, registry) -> dict:
+        """Queue a training job and return its record"""
+        job_id = f"train_{uuid.uuid4().hex[:12]}"
+        while not self._claim(job_id):
+            active = self._active_job()
+            if active is not None:
+                raise TrainingBusyError(active)
+
+        if self._pool is None:
+            # spawn rather than fork: the API process holds threads and SQLite handles
+            self._pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(self.niceness,)
+            )
+        future = self._pool.submit(run_training_job, job_id, self.db_path, self.model_dir, self.max_samples)
+        self._tasks[job_id] = asyncio.ensure_future(self._finish(job_id, asyncio.wrap_future(future), registry))
+        return self.get(job_id)
+
+    async def _finish(self, job_id: str, future, registry):
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            trained = await future
+            loop = asyncio.get_running_loop()
+            for name, artifact in trained.items():
+                await loop.run_in_executor(None, registry.activate, name, artifact["path"])
+            _update_job(self._conn, job_id, status="completed", stage="deployed", progress=1.0, models=trained)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._pool = None
+            logger.exception("Training job %s failed", job_id)
+            _update_job(self._conn, job_id, status="failed", stage="failed", error=str(e))
+        finally:
+            heartbeat.cancel()
+            self._tasks.pop(job_id, None)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            self._conn.execute("UPDATE training_jobs SET heartbeat_at = ? WHERE job_id = ?", (time.time(), job_id))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT job_id, status, stage, progress, created_at, updated_at, payload FROM training_jobs WHERE job_id = ?",
+            (job_id,)
+        ).fetchone()
+        return _job_record(row) if row else None
+
+    def list(self, limit: int = 20) -> List[dict]:
+        rows = self._conn.execute(
+            "SELECT job_id, status, stage, progress, created_at, updated_at, payload FROM training_jobs "
+            "ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [_job_record(row) for row in rows]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        for job_id in list(self._tasks):
+            _update_job(self._conn, job_id, status="failed", stage="interrupted", error="Worker shut down")
+
+    def _active_job(self) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT job_id, status, stage, progress, created_at, updated_at, payload FROM training_jobs "
+            "WHERE status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+            ACTIVE
+        ).fetchone()
+        return _job_record(row) if row else None
+
+    def _claim(self, job_id: str) -> bool:
+        """Insert `job_id` as queued unless another job is queued or running, in one transaction"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._reclaim_stale()
+            return self._conn.execute(
+                "INSERT INTO training_jobs (job_id, status, stage, progress, created_at, updated_at, heartbeat_at) "
+                "SELECT ?, 'queued', 'queued', 0, ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM training_jobs WHERE status IN (?, ?))",
+                (job_id, now, now, now, *ACTIVE)
+            ).rowcount > 0
+        finally:
+            self._conn.execute("COMMIT")
+
+    def _migrate(self):
+        for table, column, column_type in MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _reclaim_stale(self):
+        """Fail jobs whose worker stopped heartbeating (a crash or restart)"""
+        self._conn.execute(
+            "UPDATE training_jobs SET status = 'failed', stage = 'interrupted', updated_at = ?, "
+            "payload = json_set(payload, '$.error', 'Interrupted by a worker restart') "
+            "WHERE status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (time.time(), *ACTIVE, time.time() - 3 * HEARTBEAT_SECONDS)
+        )
+
+
+def _job_record(row) -> dict:
+    job_id, status, stage, progress, created_at, updated_at, payload = row
+    record = {
+        "job_id": job_id,
+        "status": status,
+        "stage": stage,
+        "progress": round(progress, 3),
+        "created_at": datetime.fromtimestamp(created_at).isoformat(),
+        "updated_at": datetime.fromtimestamp(updated_at).isoformat()
+    }
+    record.update(json.loads(payload))
+    return record
+
+
+def _update_job(conn, job_id: str, status: Optional[str] = None, stage: Optional[str] = None,
+                progress: Optional[float] = None, **details):
+    row = conn.execute("SELECT status, stage, progress, payload FROM training_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return
+    payload = json.loads(row[3])
+    payload.update(details)
+    conn.execute(
+        "UPDATE training_jobs SET status = ?, stage = ?, progress = ?, updated_at = ?, payload = ? WHERE job_id = ?",
+        (
+            status or row[0],
+            stage or row[1],
+            row[2] if progress is None else progress,
+            time.time(),
+            json.dumps(payload),
+            job_id
+        )
+    )
+
+
+def _lower_priority(niceness: int):
+    """Keep training from competing with the API process for CPU"""
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+# ----------------------------------------------------------------------
+# Runs in the training process
+# ----------------------------------------------------------------------
+
+def run_training_job(job_id: str, db_path: str, model_dir: str, max_samples: int) -> dict:
+    """Train the fraud model from labelled analyses and write its artifact"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        _update_job(conn, job_id, status="running", stage="loading", progress=0.0)
+        features, fraud_labels = load_training_data(
+            conn, max_samples, lambda fraction: _update_job(conn, job_id, progress=0.4 * fraction)
+        )
+        if len(fraud_labels) < MIN_LABELLED_ANALYSES:
+            raise ValueError(
+                f"Only {len(fraud_labels)} analyses have a confirmed label; at least {MIN_LABELLED_ANALYSES} are needed"
+            )
+
+        _update_job(conn, job_id, stage=f"training {FRAUD_MODEL}", progress=0.4)
+        model, accuracy = train_classifier(
+            features, fraud_labels, lambda fraction: _update_job(conn, job_id, progress=0.4 + 0.55 * fraction)
+        )
+        trained = {FRAUD_MODEL: save_artifact(conn, job_id, model_dir, FRAUD_MODEL, model, accuracy, len(fraud_labels))}
+
+        _update_job(conn, job_id, stage="deploying", progress=1.0, models=trained)
+        return trained
+    finally:
+        conn.close()
+
+
+def load_training_data(conn, max_samples: int, report_progress):
+    """Feature matrix and labels for the most recent `max_samples` labelled order analyses
+
+    Only analyses with a confirmed `label` are used; the pipeline's own
+    recommendation would just teach the model to copy itself.
+    """
+    labelled = "WHERE json_extract(payload, '$.label') IS NOT NULL"
+    total = min(max_samples, conn.execute(f"SELECT COUNT(*) FROM order_analyses {labelled}").fetchone()[0])
+    features = np.zeros((total, len(MODEL_FEATURES)), dtype=np.float32)
+    fraud_labels = np.zeros(total, dtype=np.int8)
+    columns = {feature: i for i, feature in enumerate(MODEL_FEATURES)}
+
+    cursor = conn.execute(f"SELECT payload FROM order_analyses {labelled} ORDER BY created_at DESC LIMIT ?", (total,))
+    row = 0
+    while row < total:
+        chunk = cursor.fetchmany(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        for (payload,) in chunk:
+            analysis = json.loads(payload)
+            features[row, columns["order_value"]] = float(analysis.get("order_value") or 0)
+            for factor in analysis.get("factors", ()):
+                feature = FACTOR_FEATURES.get(factor)
+                if feature is not None:
+                    features[row, columns[feature]] = 1.0
+            fraud_labels[row] = bool(analysis["label"])
+            row += 1
+        report_progress(row / total)
+    return features[:row], fraud_labels[:row]
+
+
+def train_classifier(features: np.ndarray, labels: np.ndarray, report_progress):
+    """Fit a scaled logistic model with mini-batch SGD; returns (pipeline, holdout accuracy)"""
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if len(labels) < 100 or len(np.unique(labels)) < 2:
+        raise ValueError(f"Not enough labelled analyses to train ({len(labels)} rows, {len(np.unique(labels))} classes)")
+
+    holdout = np.arange(len(labels)) % HOLDOUT_EVERY == 0
+    train_x, train_y = features[~holdout], labels[~holdout]
+    scaler = StandardScaler().fit(train_x)
+    train_x = scaler.transform(train_x)
+    classifier = SGDClassifier(loss="log_loss", random_state=0)
+
+    rng = np.random.default_rng(0)
+    for epoch in range(TRAINING_EPOCHS):
+        order = rng.permutation(len(train_y))
+        for start in range(0, len(order), MINI_BATCH_SIZE):
+            batch = order[start:start + MINI_BATCH_SIZE]
+            classifier.partial_fit(train_x[batch], train_y[batch], classes=np.array([0, 1]))
+        report_progress((epoch + 1) / TRAINING_EPOCHS)
+
+    model = Pipeline([("scale", scaler), ("classifier", classifier)])
+    accuracy = float((model.predict(features[holdout]) == labels[holdout]).mean())
+    return model, round(accuracy, 4)
+
+
+def save_artifact(conn, job_id: str, model_dir: str, name: str, model, accuracy: float, samples: int) -> dict:
+    """Write the next `v<N>.joblib` for a model atomically (temp file + rename)"""
+    import joblib
+
+    directory = os.path.join(model_dir, name)
+    os.makedirs(directory, exist_ok=True)
+    version = claim_version(conn, job_id, directory, name)
+    path = os.path.join(directory, f"v{version}.joblib")
+
+    artifact = {
+        "model": model,
+        "version": str(version),
+        "features": list(MODEL_FEATURES),
+        "accuracy": accuracy,
+        "training_samples": samples,
+        "trained_at": datetime.now().isoformat()
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump(artifact, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {"version": str(version), "path": path, "accuracy": accuracy, "training_samples": samples}
+
+
+def claim_version(conn, job_id: str, directory: str, name: str) -> int:
+    """Reserve the next artifact version; the (name, version) key makes each one single-use"""
+    latest = latest_artifact(directory)
+    on_disk = int(os.path.basename(latest)[1:].split(".")[0]) if latest else 0
+    while True:
+        try:
+            conn.execute(
+                "INSERT INTO model_versions (name, version, job_id, created_at) "
+                "SELECT ?, MAX(?, IFNULL(MAX(version), 0)) + 1, ?, ? FROM model_versions WHERE name = ?",
+                (name, on_disk, job_id, time.time(), name)
+            )
+        except sqlite3.IntegrityError:
+            continue
+        return conn.execute(
+            "SELECT version FROM model_versions WHERE name = ? AND job_id = ? ORDER BY version DESC LIMIT 1",
+            (name, job_id)
+        ).fetchone()[0]
+
+
+training_runner = TrainingJobRunner(
+    db_path=os.getenv("ANALYSIS_DB_PATH", "./data/analyses.db"),
+    model_dir=os.getenv("MODEL_DIR", "./models"),
+    max_samples=int(os.getenv("TRAINING_MAX_SAMPLES", 2_000_000)),
+    niceness=int(os.getenv("TRAINING_NICENESS", 10))
+)
@@ -0,0 +1,195 @@
+import os
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+RAPID_ORDERING_WINDOW_SECONDS = int(os.getenv("RAPID_ORDERING_WINDOW_SECONDS", 600))
+RAPID_ORDERING_THRESHOLD = int(os.getenv("RAPID_ORDERING_THRESHOLD", 3))
+PAYMENT_METHODS_WINDOW_SECONDS = int(os.getenv("PAYMENT_METHODS_WINDOW_SECONDS", 3600))
+PAYMENT_METHODS_THRESHOLD = int(os.getenv("PAYMENT_METHODS_THRESHOLD", 2))
+# Orders older than this no longer affect any velocity signal
+MAX_WINDOW_SECONDS = max(RAPID_ORDERING_WINDOW_SECONDS, PAYMENT_METHODS_WINDOW_SECONDS)
+
+
+class _Ring:
+    """Last N event timestamps (and optional value hashes) for one key"""
+
+    __slots__ = ("times", "values", "head", "size", "touched")
+
+    def __init__(self, capacity: int, track_values: bool):
+        self.times = array("I", bytes(4 * capacity))
+        self.values = array("I", bytes(4 * capacity)) if track_values else None
+        self.head = 0
+        self.size = 0
+        self.touched = 0.0
+
+
+class SlidingWindowCounter:
+    """Per-key event counts over sliding time windows with a fixed memory ceiling
+
+    Each key keeps a ring of its last `capacity` event times, so counts saturate
+    at `capacity` (well above any alerting threshold). Keys are held in LRU order
+    and evicted past `max_keys` or after `idle_seconds` without events.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        max_keys: int = 250_000,
+        idle_seconds: int = 86400,
+        track_values: bool = False
+    ):
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        self.track_values = track_values
+        self._rings = OrderedDict()
+        self.evictions = 0
+
+    def add(self, key: str, timestamp: Optional[float] = None, value=None):
+        """Record one event for a key"""
+        wall = time.time()
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = _Ring(self.capacity, self.track_values)
+            ring.touched = wall
+            self._rings[key] = ring
+            self._evict(wall)
+        else:
+            self._rings.move_to_end(key)
+
+        ring.times[ring.head] = int(timestamp if timestamp is not None else wall)
+        if ring.values is not None:
+            ring.values[ring.head] = zlib.crc32(str(value).encode("utf-8")) if value is not None else 0
+        ring.head = (ring.head + 1) % self.capacity
+        ring.size = min(ring.size + 1, self.capacity)
+        ring.touched = wall
+
+    def count(self, key: str, seconds: int, now: Optional[float] = None) -> int:
+        """Number of events for a key in the `seconds` leading up to `now`"""
+        ring = self._rings.get(key)
+        if ring is None:
+            return 0
+        end = int(now if now is not None else time.time())
+        start = end - seconds
+        return sum(1 for t in self._recent_times(ring) if start <= t <= end)
+
+    def distinct(self, key: str, seconds: int, now: Optional[float] = None) -> int:
+        """Number of distinct values recorded for a key in the window"""
+        ring = self._rings.get(key)
+        if ring is None or ring.values is None:
+            return 0
+        end = int(now if now is not None else time.time())
+        start = end - seconds
+        seen = set()
+        for i in self._recent_indexes(ring):
+            if start <= ring.times[i] <= end and ring.values[i]:
+                seen.add(ring.values[i])
+        return len(seen)
+
+    def _recent_indexes(self, ring: _Ring):
+        for offset in range(1, ring.size + 1):
+            yield (ring.head - offset) % self.capacity
+
+    def _recent_times(self, ring: _Ring):
+        times = ring.times
+        for i in self._recent_indexes(ring):
+            yield times[i]
+
+    def _evict(self, wall: float):
+        """Drop the least recently used keys while over capacity or idle"""
+        horizon = wall - self.idle_seconds
+        while self._rings:
+            oldest_key = next(iter(self._rings))
+            oldest = self._rings[oldest_key]
+            if len(self._rings) <= self.max_keys and oldest.touched >= horizon:
+                break
+            del self._rings[oldest_key]
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    def stats(self) -> dict:
+        bytes_per_key = self.capacity * 4 * (2 if self.track_values else 1)
+        return {
+            "keys": len(self._rings),
+            "max_keys": self.max_keys,
+            "evictions": self.evictions,
+            "ring_capacity": self.capacity,
+            "approx_buffer_bytes": len(self._rings) * bytes_per_key
+        }
+
+
+class VelocityDetector:
+    """Order velocity by customer, IP, card fingerprint and shipping address"""
+
+    DIMENSIONS = ("customer", "ip", "card", "address")
+
+    def __init__(self, max_keys: int = 250_000, capacity: int = 32):
+        # customer -> payment methods, card -> addresses, address -> customers
+        self.counters = {
+            "customer": SlidingWindowCounter(capacity, max_keys, track_values=True),
+            "ip": SlidingWindowCounter(capacity, max_keys),
+            "card": SlidingWindowCounter(capacity, max_keys, track_values=True),
+            "address": SlidingWindowCounter(capacity, max_keys, track_values=True)
+        }
+
+    def record_order(self, features: dict) -> dict:
+        """Record an order's identities and return the velocity signals including it"""
+        now = features.get("created_at") or time.time()
+        customer_id = _key(features.get("customer_id"))
+        ip = _key(features.get("customer_ip"))
+        card = _key(features.get("card_fingerprint"))
+        address = _key(features.get("shipping_address"))
+
+        if customer_id:
+            self.counters["customer"].add(customer_id, now, features.get("payment_method"))
+        if ip:
+            self.counters["ip"].add(ip, now)
+        if card:
+            self.counters["card"].add(card, now, features.get("shipping_address"))
+        if address:
+            self.counters["address"].add(address, now, customer_id)
+
+        window = RAPID_ORDERING_WINDOW_SECONDS
+        signals = {
+            "window_seconds": window,
+            "customer_orders": self.count("customer", customer_id, window, now),
+            "ip_orders": self.count("ip", ip, window, now),
+            "card_orders": self.count("card", card, window, now),
+            "address_orders": self.count("address", address, window, now),
+            "customer_payment_methods": self.distinct("customer", customer_id, PAYMENT_METHODS_WINDOW_SECONDS, now),
+            "card_addresses": self.distinct("card", card, PAYMENT_METHODS_WINDOW_SECONDS, now),
+            "address_customers": self.distinct("address", address, PAYMENT_METHODS_WINDOW_SECONDS, now)
+        }
+        signals["rapid_ordering"] = max(
+            signals["customer_orders"], signals["ip_orders"], signals["card_orders"]
+        ) >= RAPID_ORDERING_THRESHOLD
+        signals["multiple_payment_methods"] = signals["customer_payment_methods"] >= PAYMENT_METHODS_THRESHOLD
+        return signals
+
+    def count(self, dimension: str, key: Optional[str], seconds: int, now: Optional[float] = None) -> int:
+        if not key:
+            return 0
+        return self.counters[dimension].count(key, seconds, now)
+
+    def distinct(self, dimension: str, key: Optional[str], seconds: int, now: Optional[float] = None) -> int:
+        if not key:
+            return 0
+        return self.counters[dimension].distinct(key, seconds, now)
+
+    def stats(self) -> dict:
+        return {dimension: counter.stats() for dimension, counter in self.counters.items()}
+
+
+def _key(value) -> Optional[str]:
+    return None if value is None or value == "" else str(value)
+
+
+velocity_detector = VelocityDetector(
+    max_keys=int(os.getenv("VELOCITY_MAX_KEYS", 250_000)),
+    capacity=int(os.getenv("VELOCITY_RING_SIZE", 32))
+)
@@ -146,6 +146,7 @@ router.post("/webhooks/orders/create", async (req, res) => {
       await axios.post(`${process.env.PYTHON_SERVICE_URL}/analyze-order`, {
         order_id: order.id,
         order_data: order,
+        webhook_id: req.get("X-Shopify-Webhook-Id"),
       });
     } catch (pythonError) {
       console.error("Error sending to Python service:", pythonError);